@@ -0,0 +1,122 @@
+"""
+Shared helpers for the benchmark scripts: timing summaries, environment info and the
+machine-readable results files that baselines are saved as and compared against.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from importlib import metadata
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+BASELINES_DIR = os.path.join(BENCHMARKS_DIR, "baselines")
+
+# Package versions recorded with every result, since they are what usually moves the numbers
+TRACKED_PACKAGES = ["numpy", "scipy", "fitter", "pandas", "fastapi", "pydantic", "uvicorn"]
+
+
+def summarize_timings(seconds):
+    # Latency summary in milliseconds
+    ms = np.asarray(seconds, dtype=float) * 1000
+    if ms.size == 0:
+        return {"n": 0}
+    return {
+        "n": int(ms.size),
+        "mean_ms": float(ms.mean()),
+        "min_ms": float(ms.min()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def environment_info():
+    versions = {}
+    for package in TRACKED_PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+        "packages": versions,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save_results(results, output=None, baseline=None):
+    """
+    Write a results document to output and/or to baselines/<kind>-<baseline>.json.
+    Returns the paths written.
+    """
+    paths = []
+    if output:
+        paths.append(output)
+    if baseline:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        paths.append(os.path.join(BASELINES_DIR, f"{results['kind']}-{baseline}.json"))
+    for path in paths:
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+    return paths
+
+
+def load_results(path_or_name, kind):
+    # A results file path, or the name of a saved baseline
+    path = path_or_name
+    if not os.path.exists(path):
+        path = os.path.join(BASELINES_DIR, f"{kind}-{path_or_name}.json")
+    with open(path) as f:
+        return json.load(f)
+
+
+# Metrics compared per case; throughput regresses when it goes down, latencies when they go up
+COMPARED_METRICS = {
+    "micro": ["p50_ms", "min_ms"],
+    "replay": ["p50_ms", "p95_ms", "p99_ms", "throughput_rps", "peak_rss_mb"],
+}
+HIGHER_IS_BETTER = {"throughput_rps"}
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """
+    Compare current results with a baseline case by case. Returns rows of
+    (case, metric, baseline value, current value, relative change, regressed).
+    """
+    rows = []
+    metrics = COMPARED_METRICS[current["kind"]]
+    for case, current_case in current["results"].items():
+        baseline_case = baseline["results"].get(case)
+        if baseline_case is None:
+            continue
+        for metric in metrics:
+            before, after = baseline_case.get(metric), current_case.get(metric)
+            if before is None or after is None or before == 0:
+                continue
+            change = (after - before) / before
+            regressed = -change > threshold if metric in HIGHER_IS_BETTER else change > threshold
+            rows.append((case, metric, before, after, change, regressed))
+    return rows
+
+
+def print_comparison(rows):
+    width = max([len(case) for case, *_ in rows] + [4])
+    for case, metric, before, after, change, regressed in rows:
+        flag = "REGRESSED" if regressed else ""
+        print(f"{case:<{width}}  {metric:<15} {before:>11.2f} -> {after:>11.2f}  {change:+7.1%}  {flag}")
+    return sum(regressed for *_, regressed in rows)
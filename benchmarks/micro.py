@@ -0,0 +1,140 @@
+"""
+Micro-benchmarks of the compute functions behind /translate and /check, run in this process
+(without the fitting pool) so the numbers track numpy, scipy and fitter rather than scheduling.
+
+    python benchmarks/micro.py                      # full grid
+    python benchmarks/micro.py --quick              # smallest case of each benchmark
+    python benchmarks/micro.py -k check --save-baseline main
+    python benchmarks/micro.py --compare main       # exit status 1 on a regression
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+from common import REPO_DIR, compare_results, environment_info, load_results, print_comparison, \
+    save_results, summarize_timings
+
+sys.path.insert(0, REPO_DIR)
+os.environ.setdefault("RECORD_STORE", "memory")  # records are not touched; avoids configuring MongoDB
+import numpy as np  # noqa: E402
+import main  # noqa: E402
+
+SEED = 0
+
+
+def make_variables(num_predictors):
+    predictors = [{"name": f"x{i}", "type": "predictor", "min": 0, "max": 10} for i in range(num_predictors)]
+    return predictors, {"name": "y", "type": "response", "min": -50, "max": 150}
+
+
+def make_entities(num_entities, predictors, response, missing=0.0):
+    # Entities with a linear relationship plus noise; a share of them missing the response
+    rng = np.random.default_rng(SEED)
+    X = rng.uniform(0, 10, size=(num_entities, len(predictors)))
+    y = X @ np.linspace(1, 2, len(predictors)) + 3 + rng.normal(0, 2, size=num_entities)
+    entities = [{"id": str(i), **{p["name"]: float(v) for p, v in zip(predictors, row)}, response["name"]: float(r)}
+                for i, (row, r) in enumerate(zip(X, y))]
+    for entity in entities[:int(missing * num_entities)]:
+        entity[response["name"]] = None
+    return entities
+
+
+def make_priors(num_predictors):
+    return [{"name": "norm", "params": {"loc": 1.5, "scale": 0.5}} for _ in range(num_predictors)] + \
+        [{"name": "norm", "params": {"loc": 3, "scale": 1}}]
+
+
+def bench_bootstrap(entities, predictors, bootstrap_size, num_bootstrap_samples=100):
+    predictors_vars, response = make_variables(predictors)
+    rows = make_entities(entities, predictors_vars, response)
+    parameters = {p["name"]: f"b_{p['name']}" for p in predictors_vars}
+    return lambda: main.bootstrap_fit_linear_model(rows, predictors_vars, response, parameters,
+                                                   num_samples=num_bootstrap_samples,
+                                                   n_records=bootstrap_size, seed=SEED)
+
+
+def bench_fit(num_samples):
+    samples = np.random.default_rng(SEED).normal(1.5, 0.5, size=num_samples)
+    return lambda: main.fit_samples_to_distributions(samples)
+
+
+def bench_check(entities, predictors, num_checks, num_samples, level="distributional"):
+    predictors_vars, response = make_variables(predictors)
+    rows = make_entities(entities, predictors_vars, response, missing=0.2)
+    priors = make_priors(predictors)
+    return lambda: main.new_predictive_check(rows, predictors_vars, response, priors, num_checks=num_checks,
+                                             num_samples=num_samples, seed=SEED, levels=(level,))
+
+
+# name -> (setup function, parameter grid); the first value of each parameter is the --quick case
+BENCHMARKS = {
+    "bootstrap_fit_linear_model": (bench_bootstrap, {
+        "entities": [50, 500, 5000],
+        "predictors": [1, 3, 6],
+        "bootstrap_size": [50, 200],
+    }),
+    "fit_samples_to_distributions": (bench_fit, {
+        "num_samples": [100, 1000],
+    }),
+    "new_predictive_check": (bench_check, {
+        "entities": [50, 500],
+        "predictors": [1, 3],
+        "num_checks": [10, 50],
+        "num_samples": [100, 1000],
+        "level": ["distributional", "relational", "uniform"],
+    }),
+}
+
+
+def iter_cases(pattern=None, quick=False):
+    for name, (setup, grid) in BENCHMARKS.items():
+        values = [v[:1] if quick else v for v in grid.values()]
+        for combination in itertools.product(*values):
+            params = dict(zip(grid, combination))
+            case = name + "[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]"
+            if pattern is None or pattern in case:
+                yield case, setup, params
+
+
+def time_case(func, repeat, min_time):
+    # One warm-up call (lazy imports, caches), then at least repeat calls and min_time seconds
+    func()
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < repeat or time.perf_counter() - started < min_time:
+        call_started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - call_started)
+    return timings
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="pattern", help="Only run cases whose id contains this pattern")
+    parser.add_argument("--quick", action="store_true", help="Only the smallest case of each benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="Minimum timed calls per case")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Minimum timed seconds per case")
+    parser.add_argument("--output", help="Write the results to this file")
+    parser.add_argument("--save-baseline", metavar="NAME", help="Save the results as baselines/micro-NAME.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="Baseline name or results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown counted as a regression")
+    args = parser.parse_args()
+
+    results = {"kind": "micro", "environment": environment_info(), "results": {}}
+    for case, setup, params in iter_cases(args.pattern, args.quick):
+        summary = summarize_timings(time_case(setup(**params), args.repeat, args.min_time))
+        results["results"][case] = {"params": params, **summary}
+        print(f"{case:<95} p50 {summary['p50_ms']:9.2f} ms  min {summary['min_ms']:9.2f} ms  (n={summary['n']})",
+              flush=True)
+
+    for path in save_results(results, args.output, args.save_baseline):
+        print(f"Saved {path}")
+    if args.compare:
+        regressions = print_comparison(compare_results(load_results(args.compare, "micro"), results, args.threshold))
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,399 @@
+"""
+Load driver that replays elicitation sessions against a running backend. Every translate and
+check operation in a record's entityHistory becomes the /translate or /check request the
+frontend sent at that point, with the entities as they were at that step, and every fit in the
+parameter space becomes the /fitDistribution request for the roulette points drawn by then.
+Records with nothing to replay are skipped and counted in the report. Sessions run
+closed-loop, --concurrency at a time, and the report has p50/p95/p99 latency per endpoint,
+throughput and the peak RSS of the server and its worker processes.
+
+    python benchmarks/replay.py --start-server --synthetic 8 --concurrency 4
+    python benchmarks/replay.py --url http://localhost:8000 --from-server --task-id income
+    python benchmarks/replay.py --start-server --records .cache/records.jsonl --save-baseline main
+    python benchmarks/replay.py --start-server --synthetic 8 --compare main
+    python benchmarks/replay.py --start-server --synthetic 8 --synthetic-space parameter
+"""
+import argparse
+import http.client
+import json
+import os
+import queue
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from common import REPO_DIR, compare_results, environment_info, load_results, print_comparison, \
+    save_results, summarize_timings
+
+sys.path.insert(0, REPO_DIR)
+os.environ.setdefault("RECORD_STORE", "memory")  # the driver reads records itself; avoids configuring MongoDB
+from bson.json_util import loads  # noqa: E402
+import main  # noqa: E402
+
+
+# ================================ SESSIONS =================================
+def session_requests(record, allow_cache=False):
+    """
+    The (endpoint, body) requests a record's session sent, in order. Unless allow_cache, each
+    translate and check body gets its own seed so the replay measures computing results rather
+    than the result cache; fits have no seed, so --start-server runs without a result cache.
+    """
+    variables = list((record.get("variablesDict") or {}).values())
+    parameters = list((record.get("parametersDict") or {}).values())
+    variable_names = [variable["name"] for variable in variables]
+    history = record.get("entityHistory") or []
+    if not main.is_delta_encoded(history):
+        history = main.encode_entity_history(history)
+
+    # Roulette points of each parameter, as of the last update step that changed them
+    roulette_points = {parameter["name"]: parameter.get("roulettePoints") or [] for parameter in parameters}
+
+    requests = []
+    priors = None
+    for _, step, state in main.iter_entity_states(history):
+        entities = list(state.values())
+        parameter_name = parameter_step_name(step)
+        if step.get("operation") == "update" and parameter_name is not None and isinstance(step.get("data"), list):
+            roulette_points[parameter_name] = step["data"]
+        elif step.get("operation") == "fit" and parameter_name is not None:
+            # A fit with no points drawn failed in the frontend too
+            if roulette_points.get(parameter_name):
+                requests.append(("/fitDistribution", {"samples": roulette_points[parameter_name]}))
+        elif step.get("operation") == "translate":
+            body = {
+                "entities": [entity for entity in entities
+                             if all(entity.get(name) is not None for name in variable_names)],
+                "variables": variables,
+                "parameters": parameters,
+            }
+            requests.append(("/translate", body))
+            # The check that follows a translation uses the top-ranked fit of each parameter
+            if isinstance(step.get("data"), dict):
+                priors = [distributions[0] for distributions in step["data"].values() if distributions]
+        elif step.get("operation") == "check":
+            body = {
+                "entities": entities,
+                "variables": variables,
+                "priors": priors or selected_priors(parameters),
+            }
+            requests.append(("/check", body))
+
+    if not allow_cache:
+        for endpoint, body in requests:
+            if endpoint != "/fitDistribution":
+                body["seed"] = random.randrange(2 ** 32)
+    return requests
+
+
+def parameter_step_name(step):
+    # Roulette updates and fits are recorded with "parameter <name>" as their source
+    source = step.get("source")
+    if isinstance(source, str) and source.startswith("parameter "):
+        return source[len("parameter "):]
+    return None
+
+
+def selected_priors(parameters):
+    return [parameter["distributions"][parameter.get("selectedDistributionIdx") or 0]
+            for parameter in parameters if parameter.get("distributions")]
+
+
+def synthetic_record(index, rounds=4, entities_per_round=15):
+    """
+    A session of the income task: each round adds entities, translates and checks. Entity values
+    follow a noisy linear relationship so the bootstrap fits are realistic.
+    """
+    rng = random.Random(index)
+    variables = {
+        "age": {"name": "age", "type": "predictor", "min": 25, "max": 75},
+        "education": {"name": "education", "type": "predictor", "min": 0, "max": 25},
+        "income": {"name": "income", "type": "response", "min": 0, "max": 200},
+    }
+    parameters = {
+        name: {"name": name, "relatedVar": related, "selectedDistributionIdx": 0,
+               "distributions": [{"name": "norm", "params": {"loc": loc, "scale": scale}}]}
+        for name, related, loc, scale in [("b_age", "age", 0.5, 0.2), ("b_education", "education", 2, 0.5),
+                                          ("intercept", "intercept", 10, 5)]
+    }
+
+    history = [{"operation": "initial", "previousState": {}}]
+    state = {}
+    for round_index in range(rounds):
+        for _ in range(entities_per_round):
+            age, education = rng.uniform(25, 75), rng.uniform(0, 25)
+            entity_id = f"{index}-{len(state)}"
+            state = {**state, entity_id: {"id": entity_id, "age": age, "education": education,
+                                          "income": 0.5 * age + 2 * education + 10 + rng.gauss(0, 8)}}
+        history.append({"operation": "add", "entitiesAffected": [], "previousState": state})
+        history.append({"operation": "translate", "data": None, "previousState": state})
+        history.append({"operation": "check", "data": None, "previousState": state})
+
+    return {"name": f"synthetic-{index}", "variablesDict": variables, "parametersDict": parameters,
+            "entityHistory": history}
+
+
+def synthetic_parameter_record(index, rounds=3, points_per_round=10):
+    """
+    A session of the income task in the parameter space: each round draws roulette points for
+    every parameter, one update at a time, and fits a distribution to all its points so far.
+    """
+    rng = random.Random(index)
+    record = synthetic_record(index, rounds=0)
+    history = record["entityHistory"]
+    points_by_name = {name: [] for name in record["parametersDict"]}
+    for _ in range(rounds):
+        for name, parameter in record["parametersDict"].items():
+            params = parameter["distributions"][0]["params"]
+            for _ in range(points_per_round):
+                points = points_by_name[name] = points_by_name[name] + [rng.gauss(params["loc"], params["scale"])]
+                history.append({"operation": "update", "source": f"parameter {name}", "data": points,
+                                "description": "add", "previousState": {}})
+            history.append({"operation": "fit", "source": f"parameter {name}", "data": None, "previousState": {}})
+    return {**record, "name": f"synthetic-parameter-{index}", "space": "parameter"}
+
+
+def load_records_file(path):
+    # JSON lines of stored records, e.g. the disk record store
+    with open(path) as f:
+        return [loads(line) for line in f if line.strip()]
+
+
+def load_server_records(client, task_id=None, limit=None):
+    records = []
+    cursor = None
+    while limit is None or len(records) < limit:
+        params = {"limit": 1000, **({"cursor": cursor} if cursor else {}), **({"taskId": task_id} if task_id else {})}
+        page = json.loads(client.request("GET", "/getRecords?" + urlencode(params))[1])
+        for summary in page["records"]:
+            query = urlencode({"record_name": summary["name"], "history": "delta",
+                               "fields": "variablesDict,parametersDict,entityHistory"})
+            records.append(loads(client.request("GET", "/getRecord?" + query)[1]))
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    return records[:limit]
+
+
+# ================================ DRIVER =================================
+class Client:
+    """One keep-alive HTTP connection, reopened after errors."""
+
+    def __init__(self, url, timeout=300):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            self.connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+
+
+def run_sessions(url, sessions, concurrency):
+    """Replay the sessions on concurrency threads; returns [(endpoint, seconds, ok)] and the wall time."""
+    pending = queue.Queue()
+    for session in sessions:
+        pending.put(session)
+    samples = []
+    lock = threading.Lock()
+
+    def worker():
+        client = Client(url)
+        while True:
+            try:
+                requests = pending.get_nowait()
+            except queue.Empty:
+                return
+            for endpoint, body in requests:
+                started = time.perf_counter()
+                try:
+                    status, _ = client.request("POST", endpoint, body)
+                    ok = status == 200
+                except (OSError, http.client.HTTPException):
+                    ok = False
+                with lock:
+                    samples.append((endpoint, time.perf_counter() - started, ok))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+class RssSampler(threading.Thread):
+    """Peak resident memory of a process and all its descendants, read from /proc."""
+
+    def __init__(self, pid, interval=0.1):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_bytes = 0
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.peak_bytes = max(self.peak_bytes, process_tree_rss(self.pid))
+            self.stopping.wait(self.interval)
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+        return self.peak_bytes / (1024 * 1024)
+
+
+def process_tree_rss(pid):
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name is in parentheses and may contain spaces; the parent pid follows it
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total
+
+
+def start_server(port, log_path=None, allow_cache=False):
+    # A backend on the local port with in-memory records, so a replay never touches MongoDB
+    env = {"RECORD_STORE": "memory", **({} if allow_cache else {"RESULT_CACHE": "none"}), **os.environ}
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                               "--log-level", "warning"], cwd=REPO_DIR, env=env, stdout=log, stderr=log)
+    client = Client(f"http://127.0.0.1:{port}")
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with status {server.returncode}")
+        try:
+            if client.request("GET", "/admin/startup")[0] == 200:
+                return server
+        except OSError:
+            time.sleep(0.25)
+    server.terminate()
+    raise RuntimeError("Server did not start in time")
+
+
+def build_report(samples, wall_seconds, peak_rss_mb):
+    results = {}
+    for endpoint in sorted({endpoint for endpoint, _, _ in samples}) + ["all"]:
+        selected = [(seconds, ok) for e, seconds, ok in samples if endpoint in ("all", e)]
+        results[endpoint] = {
+            **summarize_timings([seconds for seconds, ok in selected if ok]),
+            "errors": sum(not ok for _, ok in selected),
+            "throughput_rps": len(selected) / wall_seconds if wall_seconds else None,
+        }
+    results["all"]["peak_rss_mb"] = peak_rss_mb
+    results["all"]["wall_seconds"] = wall_seconds
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Backend to replay against")
+    parser.add_argument("--start-server", action="store_true", help="Start a local backend for the replay")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --start-server")
+    parser.add_argument("--server-log", help="File for the output of --start-server")
+    parser.add_argument("--server-pid", type=int, help="Sample the RSS of this running backend")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--records", help="JSON lines file of stored records to replay")
+    source.add_argument("--from-server", action="store_true", help="Replay the records stored on the backend")
+    source.add_argument("--synthetic", type=int, default=4, help="Number of generated sessions (default)")
+    parser.add_argument("--synthetic-space", choices=["observable", "parameter"], default="observable",
+                        help="Elicitation space of the generated sessions")
+    parser.add_argument("--task-id", help="Only replay records of this task (--from-server)")
+    parser.add_argument("--limit", type=int, help="Replay at most this many records")
+    parser.add_argument("--concurrency", type=int, default=4, help="Sessions replayed at the same time")
+    parser.add_argument("--repeat", type=int, default=1, help="Times each session is replayed")
+    parser.add_argument("--allow-cache", action="store_true", help="Keep the recorded seeds so results can be cached")
+    parser.add_argument("--output", help="Write the results to this file")
+    parser.add_argument("--save-baseline", metavar="NAME", help="Save the results as baselines/replay-NAME.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="Baseline name or results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.server_log, args.allow_cache) if args.start_server else None
+    url = f"http://127.0.0.1:{args.port}" if server else args.url
+    try:
+        if args.records:
+            records = load_records_file(args.records)[:args.limit]
+        elif args.from_server:
+            records = load_server_records(Client(url), args.task_id, args.limit)
+        elif args.synthetic_space == "parameter":
+            records = [synthetic_parameter_record(i) for i in range(args.synthetic)]
+        else:
+            records = [synthetic_record(i) for i in range(args.synthetic)]
+        sessions = [session_requests(record, args.allow_cache) for record in records for _ in range(args.repeat)]
+        skipped = sum(not session for session in sessions)
+        sessions = [session for session in sessions if session]
+        print(f"Replaying {len(sessions)} sessions ({sum(map(len, sessions))} requests) "
+              f"with concurrency {args.concurrency} against {url}", flush=True)
+        if skipped:
+            print(f"Skipped {skipped} sessions with no translate, check or fit requests", flush=True)
+
+        pid = server.pid if server else args.server_pid
+        sampler = RssSampler(pid) if pid and os.path.exists("/proc") else None
+        if sampler:
+            sampler.start()
+        samples, wall_seconds = run_sessions(url, sessions, args.concurrency)
+        peak_rss_mb = sampler.stop() if sampler else None
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+
+    results = {
+        "kind": "replay",
+        "environment": environment_info(),
+        "replay": {"url": url, "sessions": len(sessions), "skipped_sessions": skipped, "concurrency": args.concurrency,
+                   "source": args.records or ("server" if args.from_server else f"synthetic:{args.synthetic}"),
+                   **({} if args.records or args.from_server else {"space": args.synthetic_space})},
+        "results": build_report(samples, wall_seconds, peak_rss_mb),
+    }
+    for endpoint, summary in results["results"].items():
+        if summary["n"]:
+            print(f"{endpoint:<12} n={summary['n']:<5} errors={summary['errors']:<3} p50 {summary['p50_ms']:9.1f} ms  "
+                  f"p95 {summary['p95_ms']:9.1f} ms  p99 {summary['p99_ms']:9.1f} ms  "
+                  f"{summary['throughput_rps']:7.2f} req/s")
+    if peak_rss_mb is not None:
+        print(f"Peak server RSS: {peak_rss_mb:.1f} MB")
+
+    for path in save_results(results, args.output, args.save_baseline):
+        print(f"Saved {path}")
+    if args.compare:
+        regressions = print_comparison(compare_results(load_results(args.compare, "replay"), results, args.threshold))
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,35 +1,501 @@
-from fastapi import FastAPI, Body, BackgroundTasks
+import time
+module_load_started = time.perf_counter()  # for the startup report
+
+from fastapi import FastAPI, Body, BackgroundTasks, Request, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.datastructures import MutableHeaders
+from concurrent.futures import as_completed, TimeoutError as FuturesTimeoutError
 from concurrent.futures.process import ProcessPoolExecutor
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Dict, Any, Optional, Union
 from enum import Enum
+from collections import OrderedDict
 import json
+import copy
+import hashlib
+import pickle
+import threading
+import asyncio
+import uuid
+import multiprocessing
+import importlib
+import queue
+import logging
+import contextlib
+import contextvars
+import bisect
+import cProfile
+import io
+import pstats
+import functools
+import hmac
+import random
 
 import numpy as np
 import re
-import scipy.stats as stats
-from fitter import Fitter
-
-import pandas as pd
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.linear_model import LinearRegression
 
 import os
 from dotenv import load_dotenv
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-from bson.json_util import dumps
+from bson import ObjectId
+from bson.json_util import dumps, loads
+
+try:
+    import msgpack
+except ImportError:  # MessagePack responses are only available when msgpack is installed
+    msgpack = None
+
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access, so the heavy numeric
+    libraries are only loaded by the first request that needs them. The import runs once under
+    a lock: concurrent first requests wait for it instead of seeing a half-initialised module
+    (importlib's LazyLoader is not thread-safe before Python 3.12.3).
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def _load(self):
+        if self._module is None:
+            with lazy_import_lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+
+lazy_import_lock = threading.RLock()
+# The fitting pool forks workers from request threads: a fork waits for an import in progress,
+# so a worker never starts with the lock held by a thread it does not have
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=lazy_import_lock.acquire, after_in_parent=lazy_import_lock.release,
+                        after_in_child=lazy_import_lock.release)
+
+stats = LazyModule("scipy.stats")
+special = LazyModule("scipy.special")
+optimize = LazyModule("scipy.optimize")
 
 if os.getenv("K_SERVICE") is None:  # check if running locally
     load_dotenv()
 
+# ================================ LOGGING =================================
+class StructuredLogFormatter(logging.Formatter):
+    """
+    Log lines with the fields passed in extra=...: one JSON object per line (with the severity
+    key Cloud Logging reads), or the message followed by key=value pairs.
+    """
+
+    STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+    def __init__(self, json_output=False):
+        super().__init__()
+        self.json_output = json_output
+
+    def format(self, record):
+        fields = {key: value for key, value in vars(record).items() if key not in self.STANDARD_ATTRIBUTES}
+        if record.exc_info:
+            fields["exception"] = self.formatException(record.exc_info)
+        if self.json_output:
+            return json.dumps({"time": self.formatTime(record), "severity": record.levelname,
+                               "logger": record.name, "message": record.getMessage(), **fields}, default=str)
+        return " ".join([self.formatTime(record), record.levelname, record.getMessage()] +
+                        [f"{key}={value}" for key, value in fields.items()])
+
+
+def configure_logging():
+    """
+    Configured with environment variables:
+    - LOG_LEVEL: DEBUG for a line per fitted distribution, WARNING to only log problems (default INFO)
+    - LOG_FORMAT: "json" (the default on Cloud Run) or "text"
+    """
+    log_format = os.getenv("LOG_FORMAT", "text" if os.getenv("K_SERVICE") is None else "json")
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredLogFormatter(json_output=log_format == "json"))
+    logger = logging.getLogger("prior_weaver")
+    logger.handlers[:] = [handler]
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+    return logger
+
+
+logger = configure_logging()
+
+
+# ================================ INSTRUMENTATION =================================
+# With INSTRUMENTATION=0 spans are a shared no-op and requests are not timed
+INSTRUMENTATION = os.getenv("INSTRUMENTATION", "1") == "1"
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Metrics:
+    """
+    Process-local counters, gauges and histograms rendered in the Prometheus text format.
+    Collectors are called at scrape time for values kept elsewhere (queue depths, cache hits)
+    and return (name, labels, value) samples. With several uvicorn workers, each reports its own.
+    """
+
+    def __init__(self, prefix="prior_weaver"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.descriptions = {}  # name -> (type, help)
+        self.values = {}  # (name, labels) -> counter or gauge value
+        self.histograms = {}  # (name, labels) -> [count per bucket..., sum]
+        self.collectors = []
+
+    def describe(self, name, metric_type, help_text):
+        self.descriptions[name] = (metric_type, help_text)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(LATENCY_BUCKETS, value)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            histogram[index] += 1
+            histogram[-1] += value
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        with self.lock:
+            samples = [(name, dict(labels), value) for (name, labels), value in self.values.items()]
+            histograms = [(name, dict(labels), list(histogram)) for (name, labels), histogram in self.histograms.items()]
+        for collector in self.collectors:
+            samples.extend(collector())
+
+        lines = {}
+        for name, labels, value in samples:
+            lines.setdefault(name, []).append(f"{self.prefix}_{name}{format_labels(labels)} {value}")
+        for name, labels, histogram in histograms:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram[:-1]):
+                cumulative += count
+                lines.setdefault(name, []).append(
+                    f"{self.prefix}_{name}_bucket{format_labels({**labels, 'le': bound})} {cumulative}")
+            lines[name].append(f"{self.prefix}_{name}_sum{format_labels(labels)} {histogram[-1]}")
+            lines[name].append(f"{self.prefix}_{name}_count{format_labels(labels)} {cumulative}")
+
+        output = []
+        for name, metric_lines in lines.items():
+            metric_type, help_text = self.descriptions.get(name, ("untyped", ""))
+            output += [f"# HELP {self.prefix}_{name} {help_text}", f"# TYPE {self.prefix}_{name} {metric_type}"]
+            output += metric_lines
+        return "\n".join(output) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = {key: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for key, value in labels.items()}
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped.items()) + "}"
+
+
+app_metrics = Metrics()
+app_metrics.describe("http_request_duration_seconds", "histogram", "Request latency by route and status")
+app_metrics.describe("stage_duration_seconds", "histogram", "Time spent in each pipeline stage")
+app_metrics.describe("fit_failures_total", "counter", "Distribution fits that gave no usable result, by family")
+app_metrics.describe("fits_pending", "gauge", "Fits submitted to the fitting pool and not finished")
+
+# Spans of the request being handled, as (name, seconds); None outside a request
+request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+class Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_span(self.name, time.perf_counter() - self.start)
+
+
+NULL_SPAN = contextlib.nullcontext()
+
+
+def span(name):
+    # Time a block as a pipeline stage: with span("bootstrap"): ...
+    return Span(name) if INSTRUMENTATION else NULL_SPAN
+
+
+def record_span(name, seconds):
+    # Also used for stages timed elsewhere, e.g. fits timed inside the fitting pool
+    if not INSTRUMENTATION:
+        return
+    app_metrics.observe("stage_duration_seconds", seconds, stage=name)
+    spans = request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+def format_server_timing(spans, total_seconds):
+    # Spans with the same name (one per parameter, say) are summed
+    durations = {}
+    for name, seconds in spans:
+        durations[name] = durations.get(name, 0.0) + seconds
+    durations["total"] = total_seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items())
+
+
+class RequestTimingMiddleware:
+    """
+    ASGI middleware that collects the spans recorded while a request is handled and sends
+    them with the total in a Server-Timing header. Spans recorded once a streamed response has
+    started only go to the metrics.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not INSTRUMENTATION:
+            await self.app(scope, receive, send)
+            return
+
+        spans = []
+        token = request_spans.set(spans)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", format_server_timing(spans, time.perf_counter() - start))
+                headers.append("Timing-Allow-Origin", "*")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_spans.reset(token)
+            # The route template, not the path, so job ids do not make new series
+            route = getattr(scope.get("route"), "path", "unmatched")
+            app_metrics.observe("http_request_duration_seconds", time.perf_counter() - start,
+                            method=scope["method"], route=route, status=status)
+
+
+# ================================ PROFILING =================================
+# Set while a request is profiled: fits and chunks run in the request thread, where cProfile
+# sees them, instead of on the fitting pool, and the result cache is bypassed
+profiling_request = contextvars.ContextVar("profiling_request", default=False)
+
+# Requests are profiled when they carry X-Profile-Token: <PROFILE_TOKEN>, or at random at this rate
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+
+
+class ProfileStore:
+    """
+    Saved request profiles: <id>.prof (pstats) next to <id>.json with the route, the exact
+    request payload and the timing. Only the newest max_profiles are kept.
+    """
+
+    def __init__(self, directory, max_profiles=50):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def save(self, profile_id, profiler, metadata):
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.directory, f"{profile_id}.prof"))
+        with open(os.path.join(self.directory, f"{profile_id}.json"), "w") as f:
+            json.dump(metadata, f, default=str)
+        self._prune()
+
+    def list_profiles(self):
+        # Newest first, without the payloads
+        profiles = []
+        for profile_id in self._profile_ids():
+            metadata = self.load_metadata(profile_id)
+            if metadata is not None:
+                profiles.append({key: value for key, value in metadata.items() if key != "payload"})
+        return profiles
+
+    def load_metadata(self, profile_id):
+        try:
+            with open(self.metadata_path(profile_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def metadata_path(self, profile_id):
+        return os.path.join(self.directory, f"{os.path.basename(profile_id)}.json")
+
+    def stats_path(self, profile_id):
+        return os.path.join(self.directory, f"{os.path.basename(profile_id)}.prof")
+
+    def _profile_ids(self):
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+        # Ids start with a sortable timestamp
+        return sorted((name[:-len(".json")] for name in names), reverse=True)
+
+    def _prune(self):
+        for profile_id in self._profile_ids()[self.max_profiles:]:
+            for path in (self.metadata_path(profile_id), self.stats_path(profile_id)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+profile_store = ProfileStore(os.getenv("PROFILE_DIR", ".cache/profiles"),
+                             max_profiles=int(os.getenv("PROFILE_MAX_FILES", 50)))
+# cProfile can only run one profile at a time, so concurrent candidates are not profiled
+profile_lock = threading.Lock()
+
+
+def get_profile_reason(request):
+    token = request.headers.get("x-profile-token")
+    if token is not None and PROFILE_TOKEN and hmac.compare_digest(token, PROFILE_TOKEN):
+        return "header"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def profiled(kind):
+    """
+    Decorator for compute endpoints taking request and data: a request picked by
+    get_profile_reason runs under cProfile, and the profile is saved with the request payload
+    for `python main.py profile <id>`. The response carries the id in X-Profile-Id.
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            reason = get_profile_reason(kwargs["request"])
+            if reason is None or not profile_lock.acquire(blocking=False):
+                return endpoint(*args, **kwargs)
+
+            request, data = kwargs["request"], kwargs["data"]
+            now = time.time()
+            profile_id = (time.strftime("%Y%m%dT%H%M%S", time.localtime(now)) +
+                          f"{int(now * 1000) % 1000:03d}-{kind}-{uuid.uuid4().hex[:8]}")
+            profiler = cProfile.Profile()
+            token = profiling_request.set(True)
+            start = time.perf_counter()
+            status = "error"
+            try:
+                profiler.enable()
+                try:
+                    response = endpoint(*args, **kwargs)
+                finally:
+                    profiler.disable()
+                status = "ok"
+            finally:
+                seconds = time.perf_counter() - start
+                profiling_request.reset(token)
+                profile_lock.release()
+                profile_store.save(profile_id, profiler, {
+                    "id": profile_id,
+                    "kind": kind,
+                    "route": request.url.path,
+                    "query": dict(request.query_params),
+                    "reason": reason,
+                    "status": status,
+                    "seconds": seconds,
+                    "time": time.time(),
+                    "payload": jsonable_encoder(data)
+                })
+                logger.info("Request profiled", extra={"profile_id": profile_id, "kind": kind,
+                                                       "reason": reason, "seconds": round(seconds, 3)})
+
+            if isinstance(response, Response):
+                response.headers["X-Profile-Id"] = profile_id
+            return response
+        return wrapper
+    return decorator
+
+
+def replay_profile(profile_id_or_path, distributions=None, repeat=1, sort="cumulative", limit=30, output=None):
+    """
+    Run a saved payload offline under cProfile: fitDistribution payloads (single or batch) through
+    fit_samples_to_distributions, translate payloads through the bootstrap and then
+    fit_samples_to_distributions per parameter, check payloads through new_predictive_check.
+    distributions limits the families fitted. Prints the top of the profile.
+    """
+    path = profile_id_or_path
+    if not os.path.exists(path):
+        path = profile_store.metadata_path(profile_id_or_path)
+    with open(path) as f:
+        metadata = json.load(f)
+    kind = metadata["kind"]
+    families = distributions or FIT_DISTRIBUTIONS
+
+    if kind == "fitDistribution":
+        data = FitDistributionData(**metadata["payload"])
+        run = lambda: fit_samples_to_distributions(np.array(data.samples, dtype=float), families, data.curve_points)
+    elif kind == "translate":
+        data = TranslationData(**metadata["payload"])
+
+        def run():
+            return {name: fit_samples_to_distributions(samples, families, data.curve_points)
+                    for name, samples in sample_translation_parameters(data).items()}
+    elif kind == "fitDistributionBatch":
+        data = FitDistributionBatchData(**metadata["payload"])
+
+        def run():
+            return {name: fit_samples_to_distributions(
+                        np.array(sample_set.samples, dtype=float),
+                        distributions or sample_set.distributions or data.distributions or FIT_DISTRIBUTIONS,
+                        data.curve_points)
+                    for name, sample_set in data.sample_sets.items()}
+    elif kind == "check":
+        data = PredictiveCheckData(**metadata["payload"])
+        run = lambda: compute_predictive_check(data)
+    else:
+        raise ValueError(f"Cannot replay {kind} profiles")
+
+    load_fit_modules()  # keep the lazy imports out of the profile
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    for _ in range(repeat):
+        run()
+    profiler.disable()
+    print(f"Replayed {kind} profile {metadata['id']} {repeat}x in {time.perf_counter() - start:.3f}s "
+          f"(recorded request: {metadata['seconds']:.3f}s)")
+    if output:
+        profiler.dump_stats(output)
+    pstats.Stats(profiler).sort_stats(sort).print_stats(limit)
+
+
+# With LAZY_STARTUP=1 (the default on Cloud Run) the database connection and the numeric
+# libraries are set up on first use instead of before the first request is served
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "0" if os.getenv("K_SERVICE") is None else "1") == "1"
+
 uri = f"mongodb+srv://{os.getenv('DB_USERNAME')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_CLUSTER')}"
 client = None
 db = None
 collection = None
+db_lock = threading.Lock()
+
+# App-lifetime worker pool for distribution fitting
+fit_executor = None
 
 app = FastAPI()
 app.add_middleware(
@@ -38,28 +504,175 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(RequestTimingMiddleware)
+
+
+@app.get('/metrics')
+def get_metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(app_metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get('/admin/profiles')
+def list_profiles():
+    return {"profiles": profile_store.list_profiles()}
+
+
+@app.get('/admin/profiles/{profile_id}')
+def get_profile(profile_id: str, sort: str = "cumulative", limit: int = 40):
+    # The top of a saved profile as pstats text
+    if profile_store.load_metadata(profile_id) is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    output = io.StringIO()
+    pstats.Stats(profile_store.stats_path(profile_id), stream=output).sort_stats(sort).print_stats(limit)
+    return PlainTextResponse(output.getvalue())
 
 
 @app.on_event("startup")
 async def startup_db_client():
+    if not LAZY_STARTUP:
+        connect_db()
+        load_fit_modules()
+
+
+def connect_db():
+    # Connect on first use; a failed attempt is retried by the next caller
     global client, db, collection
-    try:
-        client = MongoClient(uri, server_api=ServerApi('1'))
-        client.admin.command('ping')
-        db = client["prior_weaver"]
-        collection = db["records"]
-        print("Connected to MongoDB!")
-    except Exception as e:
-        print(f"Error connecting to MongoDB: {e}")
+    from pymongo.mongo_client import MongoClient
+    from pymongo.server_api import ServerApi
+    with db_lock:
+        if collection is not None:
+            return collection
+        try:
+            client = MongoClient(uri, server_api=ServerApi('1'),
+                                 maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", 10)),
+                                 minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", 0)))
+            client.admin.command('ping')
+            db = client["prior_weaver"]
+            collection = db["records"]
+            logger.info("Connected to MongoDB")
+        except Exception as e:
+            logger.error("Error connecting to MongoDB", extra={"error": str(e)})
+        return collection
+
+
+def get_collection():
+    records = connect_db()
+    if records is None:
+        raise HTTPException(status_code=503, detail="Database is not available")
+    return records
+
+
+def load_fit_modules():
+    # Resolve the lazily imported modules; fitter pulls in pandas and matplotlib
+    import fitter
+    return stats.norm, special.digamma, optimize.minimize, fitter.Fitter
+
+
+class FitPool:
+    """
+    Process pool for fits whose overrunning tasks can be stopped. A running task cannot be
+    interrupted inside a ProcessPoolExecutor, so abandon() retires the executor instead: new work
+    goes to a fresh one straight away, and the retired one's processes are terminated as soon as
+    nothing but abandoned tasks is left on it.
+    """
 
-    print("Backend is ready")
+    def __init__(self, num_workers):
+        self.num_workers = num_workers
+        self.executor = ProcessPoolExecutor(max_workers=num_workers)
+        self.futures = {}  # unfinished future -> the executor running it
+        self.abandoned = set()
+        self.retired = {}  # retired executor -> its worker processes
+        self.lock = threading.Lock()
+
+    def submit(self, func, *args):
+        with self.lock:
+            future = self.executor.submit(func, *args)
+            self.futures[future] = self.executor
+        future.add_done_callback(self._finished)
+        return future
+
+    def map(self, func, *iterables):
+        futures = [self.submit(func, *args) for args in zip(*iterables)]
+        return (future.result() for future in futures)
+
+    def abandon(self, futures):
+        # Stop the given futures: queued ones are cancelled, and the executors running any of
+        # them are retired. Terminating a pool fails its queued futures too, so those are left
+        # for that instead of being cancelled, which the executor does not expect.
+        unfinished = [future for future in futures if not future.done()]
+        if not unfinished:
+            return
+        retired = None
+        with self.lock:
+            running = {self.futures.get(future) for future in unfinished if future.running()} - {None}
+            if self.executor in running:
+                retired = self.executor
+                # The executor forgets its processes on shutdown, so keep them to terminate later
+                self.retired[retired] = list(retired._processes.values())
+                self.executor = ProcessPoolExecutor(max_workers=self.num_workers)
+            stopping = running | set(self.retired)
+            to_cancel = [future for future in unfinished if self.futures.get(future) not in stopping]
+            self.abandoned.update(future for future in unfinished if self.futures.get(future) in stopping)
+        if retired is not None:
+            retired.shutdown(wait=False)
+            app_metrics.increment("fit_pool_recycles_total")
+            logger.info("Fitting pool recycled", extra={"abandoned_fits": len(unfinished)})
+
+        # A fit may start between the check above and its cancellation
+        started = [future for future in to_cancel if not future.cancel() and not future.done()]
+        if started:
+            self.abandon(started)
+        self._terminate_idle_retired()
+
+    def shutdown(self, cancel_futures=False):
+        self.executor.shutdown(cancel_futures=cancel_futures)
+        with self.lock:
+            processes = [process for retired in self.retired.values() for process in retired]
+            self.retired.clear()
+        for process in processes:
+            process.terminate()
+
+    def _finished(self, future):
+        with self.lock:
+            self.futures.pop(future, None)
+            self.abandoned.discard(future)
+        self._terminate_idle_retired()
+
+    def _terminate_idle_retired(self):
+        with self.lock:
+            busy = {executor for future, executor in self.futures.items() if future not in self.abandoned}
+            idle = [executor for executor in self.retired if executor not in busy]
+            processes = [process for executor in idle for process in self.retired.pop(executor)]
+        for process in processes:
+            process.terminate()
+
+
+app_metrics.describe("fit_pool_recycles_total", "counter",
+                     "Fitting pools replaced to stop fits their request no longer waits for")
+
+
+@app.on_event("startup")
+def startup_fit_executor():
+    global fit_executor
+    num_workers = int(os.getenv("FIT_WORKERS", os.cpu_count() or 1))
+    fit_executor = FitPool(num_workers)
+    logger.info("Fitting pool started", extra={"workers": num_workers})
 
 
 @app.on_event("shutdown")
 def shutdown_db_client():
-    client.close()
-    print("Backend is shut down")
+    if client is not None:
+        client.close()
+    logger.info("Backend is shut down")
+
+
+@app.on_event("shutdown")
+def shutdown_fit_executor():
+    if fit_executor is not None:
+        fit_executor.shutdown(cancel_futures=True)
 
 
 @app.get('/')
@@ -67,6 +680,275 @@ def root():
     return {"message": "Hello World!"}
 
 
+# ================================ STATE STORE =================================
+# Expected version that matches whatever is stored, for unconditional writes
+ANY_VERSION = object()
+
+
+class MemoryStateBackend:
+    """State in process memory: only consistent with a single worker process."""
+
+    def __init__(self):
+        self.namespaces = {}  # namespace -> OrderedDict of key -> (version, value), least recently written first
+        self.lock = threading.Lock()
+
+    def version(self, namespace, key):
+        with self.lock:
+            entry = self.namespaces.get(namespace, {}).get(key)
+        return entry[0] if entry is not None else None
+
+    def get(self, namespace, key):
+        with self.lock:
+            return self.namespaces.get(namespace, {}).get(key)
+
+    def put(self, namespace, key, value, expected_version=ANY_VERSION):
+        with self.lock:
+            entries = self.namespaces.setdefault(namespace, OrderedDict())
+            entry = entries.get(key)
+            if expected_version is not ANY_VERSION and (entry[0] if entry is not None else None) != expected_version:
+                return None
+            version = uuid.uuid4().hex
+            entries[key] = (version, value)
+            entries.move_to_end(key)
+            return version
+
+    def delete(self, namespace, key):
+        with self.lock:
+            self.namespaces.get(namespace, {}).pop(key, None)
+
+    def prune(self, namespace, keep):
+        with self.lock:
+            entries = self.namespaces.get(namespace, {})
+            while len(entries) > keep:
+                entries.popitem(last=False)
+
+
+class SQLiteStateBackend:
+    """
+    State in a SQLite database (WAL mode) shared by every worker on the machine. Values are
+    pickled; each write gets a new version, so a worker can check its cached copy with one
+    indexed lookup and only unpickle values that changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()  # one connection per thread
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            import sqlite3
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS state (namespace TEXT, key TEXT, version TEXT, "
+                               "value BLOB, updated_at REAL, PRIMARY KEY (namespace, key))")
+            connection.execute("CREATE INDEX IF NOT EXISTS state_updated ON state (namespace, updated_at)")
+            self.local.connection = connection
+        return connection
+
+    def version(self, namespace, key):
+        row = self.connection().execute("SELECT version FROM state WHERE namespace = ? AND key = ?",
+                                        (namespace, key)).fetchone()
+        return row[0] if row is not None else None
+
+    def get(self, namespace, key):
+        row = self.connection().execute("SELECT version, value FROM state WHERE namespace = ? AND key = ?",
+                                        (namespace, key)).fetchone()
+        return (row[0], pickle.loads(row[1])) if row is not None else None
+
+    def put(self, namespace, key, value, expected_version=ANY_VERSION):
+        version = uuid.uuid4().hex
+        row = (version, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time(), namespace, key)
+        connection = self.connection()
+        if expected_version is ANY_VERSION:
+            cursor = connection.execute(
+                "INSERT INTO state (version, value, updated_at, namespace, key) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET version = excluded.version, value = excluded.value, "
+                "updated_at = excluded.updated_at", row)
+        elif expected_version is None:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO state (version, value, updated_at, namespace, key) VALUES (?, ?, ?, ?, ?)", row)
+        else:
+            cursor = connection.execute(
+                "UPDATE state SET version = ?, value = ?, updated_at = ? WHERE namespace = ? AND key = ? "
+                "AND version = ?", row + (expected_version,))
+        return version if cursor.rowcount == 1 else None
+
+    def delete(self, namespace, key):
+        self.connection().execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def prune(self, namespace, keep):
+        self.connection().execute(
+            "DELETE FROM state WHERE namespace = ? AND key NOT IN "
+            "(SELECT key FROM state WHERE namespace = ? ORDER BY updated_at DESC LIMIT ?)",
+            (namespace, namespace, keep))
+
+
+class MongoStateBackend:
+    """State in the MongoDB database, shared by every instance of the service."""
+
+    def __init__(self):
+        self.indexed = False
+
+    def collection(self):
+        state = get_collection().database["state"]
+        if not self.indexed:
+            state.create_index([("namespace", 1), ("updated_at", -1)])
+            self.indexed = True
+        return state
+
+    def version(self, namespace, key):
+        document = self.collection().find_one({"_id": f"{namespace}:{key}"}, projection=["version"])
+        return document["version"] if document is not None else None
+
+    def get(self, namespace, key):
+        document = self.collection().find_one({"_id": f"{namespace}:{key}"})
+        return (document["version"], pickle.loads(document["value"])) if document is not None else None
+
+    def put(self, namespace, key, value, expected_version=ANY_VERSION):
+        from pymongo.errors import DuplicateKeyError
+        version = uuid.uuid4().hex
+        document = {"namespace": namespace, "version": version, "updated_at": time.time(),
+                    "value": pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)}
+        query = {"_id": f"{namespace}:{key}"}
+        if expected_version is not None and expected_version is not ANY_VERSION:
+            query["version"] = expected_version
+        try:
+            if expected_version is None:
+                self.collection().insert_one({**query, **document})
+                return version
+            result = self.collection().update_one(query, {"$set": document},
+                                                  upsert=expected_version is ANY_VERSION)
+        except DuplicateKeyError:
+            return None
+        return version if result.matched_count or result.upserted_id is not None else None
+
+    def delete(self, namespace, key):
+        self.collection().delete_one({"_id": f"{namespace}:{key}"})
+
+    def prune(self, namespace, keep):
+        stale = self.collection().find({"namespace": namespace}, projection=["_id"]).sort("updated_at", -1).skip(keep)
+        ids = [document["_id"] for document in stale]
+        if ids:
+            self.collection().delete_many({"_id": {"$in": ids}})
+
+
+class StateStore:
+    """
+    Versioned key-value state (study settings, translation sessions) in a backend that may be
+    shared by several workers. Each worker keeps the values it read with their version and only
+    fetches a value again once its version changed, checked at most every max_staleness seconds.
+    Listeners of a namespace are called with (key, value) whenever this worker sees a new version.
+
+    Writes take the version they were based on; put returns None instead of writing if the
+    stored version has moved on since, so concurrent updates from other workers are never lost.
+    """
+
+    def __init__(self, backend, max_staleness=0.0, max_cached=1000):
+        self.backend = backend
+        self.max_staleness = max_staleness
+        self.max_cached = max_cached
+        self.cache = OrderedDict()  # (namespace, key) -> (version, value, checked_at)
+        self.listeners = {}  # namespace -> callbacks
+        self.lock = threading.Lock()
+
+    def get(self, namespace, key, default=None):
+        _, value = self.get_versioned(namespace, key)
+        return default if value is None else value
+
+    def get_versioned(self, namespace, key):
+        # (version, value), or (None, None) for a missing key
+        with self.lock:
+            cached = self.cache.get((namespace, key))
+        now = time.monotonic()
+        if cached is not None and now - cached[2] <= self.max_staleness:
+            return cached[:2]
+
+        version = self.backend.version(namespace, key)
+        if cached is not None and version == cached[0]:
+            self._remember(namespace, key, version, cached[1])
+            return cached[:2]
+
+        entry = self.backend.get(namespace, key) if version is not None else None
+        if entry is None:
+            self.invalidate(namespace, key)
+            return None, None
+        self._remember(namespace, key, *entry)
+        return entry
+
+    def put(self, namespace, key, value, expected_version=ANY_VERSION):
+        """Returns the new version, or None if expected_version is no longer the stored version."""
+        version = self.backend.put(namespace, key, value, expected_version)
+        if version is None:
+            self.invalidate(namespace, key)
+        else:
+            self._remember(namespace, key, version, value)
+        return version
+
+    def update(self, namespace, key, func, default=None, retries=10):
+        # Read-modify-write: func gets the current value and returns the new one
+        for _ in range(retries):
+            version, value = self.get_versioned(namespace, key)
+            value = func(default if value is None else value)
+            if self.put(namespace, key, value, expected_version=version) is not None:
+                return value
+        raise RuntimeError(f"State {namespace}:{key} kept changing while it was updated")
+
+    def delete(self, namespace, key):
+        self.backend.delete(namespace, key)
+        self.invalidate(namespace, key)
+
+    def prune(self, namespace, keep):
+        # Drop all but the keep most recently written keys of the namespace
+        self.backend.prune(namespace, keep)
+
+    def invalidate(self, namespace, key):
+        with self.lock:
+            self.cache.pop((namespace, key), None)
+
+    def subscribe(self, namespace, callback):
+        self.listeners.setdefault(namespace, []).append(callback)
+
+    def _remember(self, namespace, key, version, value):
+        with self.lock:
+            previous = self.cache.pop((namespace, key), None)
+            self.cache[(namespace, key)] = (version, value, time.monotonic())
+            while len(self.cache) > self.max_cached:
+                self.cache.popitem(last=False)
+        if previous is None or previous[0] != version:
+            for callback in self.listeners.get(namespace, []):
+                callback(key, value)
+
+
+def create_state_store():
+    """
+    Configured with environment variables:
+    - STATE_STORE: "memory" (default; one worker only), "sqlite" to share state between the
+      workers on a machine, or "mongo" to share it between instances
+    - STATE_STORE_PATH: database file for the sqlite backend
+    - STATE_MAX_STALENESS: seconds a worker may serve a cached value without checking its version (default 0)
+    - STATE_CACHE_ENTRIES: values each worker keeps cached (default 1000)
+    """
+    store_name = os.getenv("STATE_STORE", "memory")
+    if store_name == "memory":
+        backend = MemoryStateBackend()
+    elif store_name == "sqlite":
+        backend = SQLiteStateBackend(os.getenv("STATE_STORE_PATH", ".cache/state.sqlite3"))
+    elif store_name == "mongo":
+        backend = MongoStateBackend()
+    else:
+        raise ValueError(f"Invalid state store: {store_name}")
+
+    return StateStore(backend,
+                      max_staleness=float(os.getenv("STATE_MAX_STALENESS", 0)),
+                      max_cached=int(os.getenv("STATE_CACHE_ENTRIES", 1000)))
+
+
+state_store = create_state_store()
+
+
 # ================================ ADMIN ENDPOINTS =================================
 class ElicitationSpace(str, Enum):
     PARAMETER = "parameter"
@@ -84,8 +966,9 @@ class TaskIDs(str, Enum):
     WEIGHT = "weight"
 
 
-# Store current study settings
-current_study_settings = {
+# Study settings until an admin changes them; the current ones live in the state store so every
+# worker serves the same settings
+DEFAULT_STUDY_SETTINGS = {
     "user_name": "admin",
     "task_id": TaskIDs.INCOME,
     "elicitation_space": ElicitationSpace.OBSERVABLE,
@@ -104,33 +987,1198 @@ class AdminUpdateSettings(BaseModel):
     record_name: Optional[str]
 
 
+state_store.subscribe("study_settings", lambda key, settings: logger.info("Study settings changed", extra=settings))
+
+
 @app.get('/study-settings')
 def get_study_settings():
-    return current_study_settings
+    return state_store.get("study_settings", "current", DEFAULT_STUDY_SETTINGS)
 
 
 @app.post('/admin/study-settings')
 def update_study_settings(settings: AdminUpdateSettings):
     # Simple API key validation - you should implement proper authentication
-    if settings.user_name is not None:
-        current_study_settings["user_name"] = settings.user_name
+    changes = settings.model_dump(mode="json", exclude_none=True)
+    return state_store.update("study_settings", "current", lambda current: jsonable_encoder({**current, **changes}),
+                              default=DEFAULT_STUDY_SETTINGS)
+
+
+# ================================ RESPONSE FORMATS =================================
+class ResponseFormat(str, Enum):
+    JSON = "json"            # row-oriented JSON consumed by the frontend
+    COLUMNAR = "columnar"    # columnar JSON arrays
+    MSGPACK = "msgpack"      # columnar MessagePack with little-endian float32 blobs
+
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.prior-weaver.columnar+json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def get_response_format(request, response_format=None):
+    # An explicit ?format= wins over the Accept header
+    if response_format is None:
+        accept = request.headers.get("accept", "")
+        if any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES):
+            response_format = ResponseFormat.MSGPACK
+        elif COLUMNAR_MEDIA_TYPE in accept:
+            response_format = ResponseFormat.COLUMNAR
+        else:
+            response_format = ResponseFormat.JSON
+
+    if response_format == ResponseFormat.MSGPACK and msgpack is None:
+        raise HTTPException(status_code=406, detail="MessagePack responses are not available")
+
+    return response_format
+
+
+def format_response(content, response_format):
+    # Numeric payloads are already plain lists/floats, so skip jsonable_encoder's per-element walk
+    with span("encode"):
+        if response_format == ResponseFormat.MSGPACK:
+            return Response(content=msgpack.packb(content, use_bin_type=True),
+                            media_type=MSGPACK_MEDIA_TYPES[0])
+        if response_format == ResponseFormat.COLUMNAR:
+            return JSONResponse(content=content, media_type=COLUMNAR_MEDIA_TYPE)
+        return JSONResponse(content=content)
+
+
+def encode_array(values, response_format):
+    values = np.asarray(values, dtype=float)
+    if response_format == ResponseFormat.MSGPACK:
+        return {
+            'dtype': '<f4',
+            'shape': list(values.shape),
+            'data': values.astype('<f4').tobytes()
+        }
+    return values.tolist()
+
+
+def serialize_fitted_distributions(fit_dists, response_format):
+    if response_format == ResponseFormat.JSON:
+        return [{**dist, 'x': dist['x'].tolist(), 'p': dist['p'].tolist()} for dist in fit_dists]
+
+    # Each family's curve has its own x points, so the columns are per distribution;
+    # callers nest the list the same way for every format
+    return [{
+        'name': dist['name'],
+        'params': dist['params'],
+        'x': encode_array(dist['x'], response_format),
+        'p': encode_array(dist['p'], response_format),
+        'metrics': dist['metrics']
+    } for dist in fit_dists]
+
+
+def serialize_check_results(results, predictors, response_var, response_format):
+    serialized = {
+        'min_response_val': float(results['min_response_val']),
+        'max_response_val': float(results['max_response_val']),
+        'max_density_val': float(results['max_density_val']),
+    }
+
+    if response_format == ResponseFormat.JSON:
+        serialized['simulated_results'] = build_simulated_results(results, predictors, response_var)
+        serialized['avg_kde_result'] = kde_points(results['x_values'], results['avg_kde'])
+        return serialized
+
+    # Predictor columns are (num_samples,) when shared by all checks, else (num_checks, num_samples);
+    # the response column and kde rows are always per check
+    predictor_samples = results['predictor_samples']
+    dataset = {predictor['name']: encode_array(predictor_samples[..., i], response_format)
+               for i, predictor in enumerate(predictors)}
+    dataset[response_var['name']] = encode_array(results['response_values'], response_format)
+
+    serialized.update({
+        'x_values': encode_array(results['x_values'], response_format),
+        'params': encode_array(results['parameter_samples'], response_format),
+        'dataset': dataset,
+        'kde': encode_array(results['density_values'], response_format),
+        'avg_kde': encode_array(results['avg_kde'], response_format)
+    })
+    return serialized
+
+
+def event_stream_response(request, events):
+    # Server-sent events when the client asks for text/event-stream, NDJSON otherwise
+    if "text/event-stream" in request.headers.get("accept", ""):
+        body = (f"event: {event}\ndata: {json.dumps(data)}\n\n" for event, data in events)
+        return StreamingResponse(body, media_type="text/event-stream")
+
+    body = (json.dumps({"event": event, **data}) + "\n" for event, data in events)
+    return StreamingResponse(body, media_type="application/x-ndjson")
+
+
+def build_simulated_results(results, predictors, response_var):
+    """
+    Build the per-check {'params', 'dataset', 'kde'} records sent to the frontend, where each
+    dataset row is a {variable name: value} dict.
+    """
+    names = [predictor['name'] for predictor in predictors] + [response_var['name']]
+    response_values = results['response_values']
+    num_checks = response_values.shape[0]
+    predictor_samples = results['predictor_samples']
+    if predictor_samples.ndim == 2:
+        predictor_samples = np.broadcast_to(predictor_samples, (num_checks,) + predictor_samples.shape)
+
+    simulated_results = []
+    for check_index in range(num_checks):
+        rows = np.column_stack([predictor_samples[check_index], response_values[check_index]])
+        simulated_results.append({
+            'params': results['parameter_samples'][check_index].tolist(),
+            'dataset': [dict(zip(names, row)) for row in rows.tolist()],
+            'kde': kde_points(results['x_values'], results['density_values'][check_index])
+        })
+
+    return simulated_results
+
+
+def kde_points(x_values, density_values):
+    return [{'x': x, 'density': density}
+            for x, density in zip(x_values.tolist(), density_values.tolist())]
+
+
+# ================================ RESULT CACHE =================================
+class MemoryCacheBackend:
+    """In-process LRU store bounded by the estimated size of the cached values."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (expires_at, size, value)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, size, value = entry
+            if expires_at is not None and expires_at < time.time():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (expires_at, size, value)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.total_bytes -= size
+
+
+class DiskCacheBackend:
+    """
+    On-disk LRU store shared by every worker on the machine; one pickle file per key,
+    with the file's mtime as the recency used for eviction.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, "rb") as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at is not None and expires_at < time.time():
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value, expires_at):
+        path = os.path.join(self.directory, key)
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((expires_at, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            self._remove(entry.path)
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove(path)
+            total_bytes -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ResultCache:
+    """
+    Content-addressed cache for compute results: the key is a hash of the endpoint name
+    and the canonical JSON of the request body (including its seed, if any).
+    """
+
+    # Request fields that change how long we work on a request, not what a full result looks like
+    KEY_EXCLUDED_FIELDS = {"time_budget"}
+
+    def __init__(self, backend, ttl=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, namespace, request_data):
+        canonical = json.dumps(jsonable_encoder(request_data, exclude=self.KEY_EXCLUDED_FIELDS),
+                               sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(f"{namespace}:{canonical}".encode()).hexdigest()
+
+    def get(self, namespace, request_data):
+        if self.backend is None or profiling_request.get():
+            return None
+        value = self.backend.get(self.make_key(namespace, request_data))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, namespace, request_data, value):
+        if self.backend is None:
+            return
+        expires_at = time.time() + self.ttl if self.ttl else None
+        self.backend.set(self.make_key(namespace, request_data), value, expires_at)
+
+    def get_or_compute(self, namespace, request_data, compute):
+        value = self.get(namespace, request_data)
+        if value is None:
+            value = compute()
+            self.set(namespace, request_data, value)
+        return value
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+def estimate_size(value):
+    # Rough in-memory size of a cached result, dominated by its numpy arrays
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value) + 8 * len(value)
+    return 64
+
+
+def create_result_cache():
+    """
+    Configured with environment variables:
+    - RESULT_CACHE: "memory" (default), "disk" to share entries across workers, or "none"
+    - RESULT_CACHE_MAX_MB: size bound before LRU eviction (default 256)
+    - RESULT_CACHE_TTL: optional time-to-live in seconds
+    - RESULT_CACHE_DIR: directory for the disk backend
+    """
+    backend_name = os.getenv("RESULT_CACHE", "memory")
+    max_bytes = int(float(os.getenv("RESULT_CACHE_MAX_MB", 256)) * 1024 * 1024)
+    ttl = float(os.getenv("RESULT_CACHE_TTL")) if os.getenv("RESULT_CACHE_TTL") else None
+
+    if backend_name == "memory":
+        backend = MemoryCacheBackend(max_bytes)
+    elif backend_name == "disk":
+        backend = DiskCacheBackend(os.getenv("RESULT_CACHE_DIR", ".cache/results"), max_bytes)
+    elif backend_name == "none":
+        backend = None
+    else:
+        raise ValueError(f"Invalid result cache backend: {backend_name}")
+
+    return ResultCache(backend, ttl)
+
+
+result_cache = create_result_cache()
+app_metrics.describe("result_cache_hits_total", "counter", "Result cache lookups that found a result")
+app_metrics.describe("result_cache_misses_total", "counter", "Result cache lookups that did not")
+app_metrics.add_collector(lambda: [("result_cache_hits_total", {}, result_cache.hits),
+                               ("result_cache_misses_total", {}, result_cache.misses)])
+
+
+@app.get('/admin/cache')
+def get_cache_stats():
+    return result_cache.stats()
+
+
+@app.delete('/admin/cache')
+def clear_cache():
+    if result_cache.backend is not None:
+        result_cache.backend.clear()
+    return result_cache.stats()
+
+
+# ================================ ENTITY HISTORY =================================
+class HistoryEncoding(str, Enum):
+    FULL = "full"  # every step carries the whole entity state in previousState
+    DELTA = "delta"  # keyframes plus per-step diffs
+
+
+# Steps between full entity states in a delta-encoded history
+HISTORY_KEYFRAME_INTERVAL = int(os.getenv("HISTORY_KEYFRAME_INTERVAL", 50))
+
+
+def diff_entity_states(previous, current):
+    # Entity states map entity id -> entity
+    return {
+        "upserts": {entity_id: entity for entity_id, entity in current.items()
+                    if previous.get(entity_id) != entity},
+        "deletes": [entity_id for entity_id in previous if entity_id not in current]
+    }
+
+
+def encode_entity_history(history, keyframe_interval=HISTORY_KEYFRAME_INTERVAL):
+    """
+    Delta-encode an entity history whose steps each carry the full entity state in previousState:
+    every keyframe_interval-th step keeps its state, the others only the change from the step before.
+    """
+    steps = []
+    previous_state = {}
+    for index, entry in enumerate(history):
+        state = entry.get("previousState") or {}
+        step = {key: value for key, value in entry.items() if key != "previousState"}
+        if index % keyframe_interval == 0:
+            step["state"] = state
+        else:
+            step["diff"] = diff_entity_states(previous_state, state)
+        steps.append(step)
+        previous_state = state
+
+    return {"encoding": HistoryEncoding.DELTA.value, "keyframe_interval": keyframe_interval, "steps": steps}
+
+
+def iter_entity_states(encoded_history, start=0):
+    """
+    Yield (step index, step, entity state) from the last keyframe at or before start onwards.
+    The state is updated in place from step to step, so copy it to keep it.
+    """
+    steps = encoded_history["steps"]
+    keyframe = min(start, len(steps) - 1) if steps else 0
+    while keyframe > 0 and "state" not in steps[keyframe]:
+        keyframe -= 1
+
+    state = {}
+    for index in range(keyframe, len(steps)):
+        step = steps[index]
+        if "state" in step:
+            state = dict(step["state"])
+        else:
+            for entity_id in step["diff"]["deletes"]:
+                state.pop(entity_id, None)
+            state.update(step["diff"]["upserts"])
+        yield index, step, state
+
+
+def decode_entity_history(encoded_history):
+    # Back to the full form, one entity state per step; full histories pass through
+    if not is_delta_encoded(encoded_history):
+        return encoded_history
+    return [{**{key: value for key, value in step.items() if key not in ("state", "diff")},
+             "previousState": dict(state)}
+            for _, step, state in iter_entity_states(encoded_history)]
+
+
+def entity_state_at(encoded_history, step_index):
+    # Rebuilt from the nearest keyframe, so the cost is bounded by the keyframe interval
+    if not 0 <= step_index < len(encoded_history["steps"]):
+        raise IndexError(f"History has no step {step_index}")
+    for index, step, state in iter_entity_states(encoded_history, start=step_index):
+        if index == step_index:
+            return step, state
+
+
+def is_delta_encoded(history):
+    return isinstance(history, dict) and history.get("encoding") == HistoryEncoding.DELTA.value
+
+
+def check_entity_history(history):
+    """
+    Raise ValueError unless history is a full entity history (a list of steps, each with an
+    optional previousState object) or a delta-encoded one as made by encode_entity_history.
+    """
+    if isinstance(history, list):
+        for index, entry in enumerate(history):
+            if not isinstance(entry, dict):
+                raise ValueError(f"Entity history step {index} is not an object")
+            if not isinstance(entry.get("previousState") or {}, dict):
+                raise ValueError(f"Entity history step {index} has a previousState that is not an object")
+        return
+    if not is_delta_encoded(history):
+        raise ValueError("Entity history must be a list of steps or a delta-encoded history")
+    interval, steps = history.get("keyframe_interval"), history.get("steps")
+    if not isinstance(interval, int) or isinstance(interval, bool) or interval < 1:
+        raise ValueError("Delta-encoded entity history needs a positive keyframe_interval")
+    if not isinstance(steps, list):
+        raise ValueError("Delta-encoded entity history needs a list of steps")
+    for index, step in enumerate(steps):
+        if not isinstance(step, dict):
+            raise ValueError(f"Entity history step {index} is not an object")
+        if "state" in step:
+            if not isinstance(step["state"], dict):
+                raise ValueError(f"Entity history step {index} has a state that is not an object")
+            continue
+        diff = step.get("diff")
+        if index == 0 or not isinstance(diff, dict) or not isinstance(diff.get("upserts"), dict) \
+                or not isinstance(diff.get("deletes"), list):
+            raise ValueError(f"Entity history step {index} needs a state or a diff with upserts and deletes")
+
+
+def prepare_record(record):
+    """
+    Store entity histories delta-encoded: full ones are encoded, and delta ones sent with a
+    different keyframe interval get their keyframes redone. A history that cannot be encoded
+    is stored as it was sent rather than losing the record.
+    """
+    history = record.get("entityHistory")
+    try:
+        if isinstance(history, list):
+            return {**record, "entityHistory": encode_entity_history(history)}
+        if is_delta_encoded(history) and history.get("keyframe_interval") != HISTORY_KEYFRAME_INTERVAL:
+            return {**record, "entityHistory": encode_entity_history(decode_entity_history(history))}
+    except Exception:
+        logger.warning("Storing entity history unencoded", exc_info=True,
+                       extra={"record": record.get("name")})
+    return record
+
+
+# ================================ RECORD STORAGE =================================
+# Fields listed on the Admin page
+RECORD_SUMMARY_FIELDS = ("name", "taskId", "space", "feedback")
+
+
+def project_record(record, fields=None):
+    # Keep only the given fields (and _id, like a MongoDB projection)
+    if fields is None:
+        return record
+    return {key: record[key] for key in ("_id", *fields) if key in record}
+
+
+def match_record(record, filters=None):
+    return all(record.get(key) == value for key, value in (filters or {}).items())
+
+
+def page_records(records, filters=None, fields=None, after=None, limit=None):
+    """
+    One page of records ordered by _id: those matching filters with an _id after the cursor,
+    projected onto fields.
+    """
+    page = sorted((record for record in records
+                   if match_record(record, filters) and (after is None or record["_id"] > after)),
+                  key=lambda record: record["_id"])
+    if limit is not None:
+        page = page[:limit]
+    return [project_record(record, fields) for record in page]
+
+
+def iter_record_json(record, history=HistoryEncoding.FULL, chunk_size=64 * 1024):
+    """
+    Serialize a record as one JSON document in chunks of about chunk_size characters, with its
+    entity history in the requested encoding. A full history is rebuilt one step at a time while
+    it is written, so it is never held in memory as a whole.
+    """
+    def pieces():
+        yield "{"
+        for index, (key, value) in enumerate(record.items()):
+            yield ("," if index else "") + json.dumps(key) + ":"
+            if key == "entityHistory" and history == HistoryEncoding.FULL and is_delta_encoded(value):
+                yield "["
+                for step_index, step, state in iter_entity_states(value):
+                    entry = {k: v for k, v in step.items() if k not in ("state", "diff")}
+                    yield ("," if step_index else "") + dumps({**entry, "previousState": state})
+                yield "]"
+            elif key == "entityHistory" and history == HistoryEncoding.DELTA and isinstance(value, list):
+                yield dumps(encode_entity_history(value))
+            else:
+                yield dumps(value)
+        yield "}"
+
+    buffer, buffered = [], 0
+    for piece in pieces():
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= chunk_size:
+            yield "".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+class MongoRecordRepository:
+    """Records in the MongoDB collection, connected (and indexed) on first use."""
+
+    def __init__(self):
+        self.indexed = False
+
+    def collection(self):
+        records = get_collection()
+        if not self.indexed:
+            # name for single-record fetches, taskId plus _id for filtered pages in cursor order
+            records.create_index("name")
+            records.create_index([("taskId", 1), ("_id", 1)])
+            self.indexed = True
+        return records
+
+    def insert_many(self, records):
+        from pymongo.errors import BulkWriteError
+        try:
+            self.collection().insert_many(records, ordered=False)
+        except BulkWriteError as e:
+            # Records get their _id when queued, so a retried batch only fails on the
+            # records that already made it in
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+    def list_records(self, filters=None, fields=None, after=None, limit=None):
+        query = dict(filters or {})
+        if after is not None:
+            query["_id"] = {"$gt": after}
+        cursor = self.collection().find(query, projection=list(fields) if fields is not None else None)
+        cursor = cursor.sort("_id", 1)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def find_record(self, name, fields=None):
+        return self.collection().find_one({'name': name},
+                                          projection=list(fields) if fields is not None else None)
+
+
+class MemoryRecordRepository:
+    """Records kept in process memory, for running locally without Atlas."""
+
+    def __init__(self):
+        self.records = []
+        self.lock = threading.Lock()
+
+    def insert_many(self, records):
+        with self.lock:
+            self.records.extend(records)
+
+    def list_records(self, filters=None, fields=None, after=None, limit=None):
+        with self.lock:
+            records = list(self.records)
+        return page_records(records, filters, fields, after, limit)
+
+    def find_record(self, name, fields=None):
+        with self.lock:
+            record = next((record for record in self.records if record.get('name') == name), None)
+        return project_record(record, fields) if record is not None else None
+
+
+class DiskRecordRepository:
+    """
+    Records appended to a JSON lines file, so a local backend keeps them across restarts.
+    The file is scanned once for each record's summary fields and line offset; after that,
+    listings are served from the index and a single record is read with one seek.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.index = None  # one {**summary fields, "_id", "offset"} per line
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def insert_many(self, records):
+        with self.lock, open(self.path, "a") as f:
+            self._load_index()
+            offset = f.tell()
+            lines = []
+            for record in records:
+                line = dumps(record) + "\n"
+                self.index.append(self._index_entry(record, offset))
+                offset += len(line.encode())
+                lines.append(line)
+            f.write("".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def list_records(self, filters=None, fields=None, after=None, limit=None):
+        summary_only = fields is not None and set(fields) <= set(RECORD_SUMMARY_FIELDS)
+        if summary_only and set(filters or {}) <= set(RECORD_SUMMARY_FIELDS):
+            with self.lock:
+                self._load_index()
+                index = list(self.index)
+            return page_records(index, filters, fields, after, limit)
+
+        with self.lock:
+            records = [{**record, "_id": self._record_id(record, offset)}
+                       for offset, record in self._read_records()]
+        return page_records(records, filters, fields, after, limit)
+
+    def find_record(self, name, fields=None):
+        with self.lock:
+            self._load_index()
+            entry = next((entry for entry in self.index if entry.get('name') == name), None)
+            if entry is None:
+                return None
+            with open(self.path, "rb") as f:
+                f.seek(entry["offset"])
+                record = loads(f.readline())
+        return project_record(record, fields)
+
+    def _load_index(self):
+        if self.index is not None:
+            return
+        self.index = [self._index_entry(record, offset) for offset, record in self._read_records()]
+
+    def _read_records(self):
+        # (line offset, record) for each line of the file
+        try:
+            with open(self.path, "rb") as f:
+                offset = 0
+                for line in f:
+                    if line.strip():
+                        yield offset, loads(line)
+                    offset += len(line)
+        except FileNotFoundError:
+            return
+
+    @classmethod
+    def _index_entry(cls, record, offset):
+        entry = {key: record[key] for key in RECORD_SUMMARY_FIELDS if key in record}
+        entry["_id"] = cls._record_id(record, offset)
+        entry["offset"] = offset
+        return entry
+
+    @staticmethod
+    def _record_id(record, offset):
+        # Records written before they were given an _id on save get one from their offset
+        return record.get("_id") or ObjectId(f"{offset:024x}")
+
+
+class RecordWriter:
+    """
+    Write-behind queue in front of a record repository. Saves are acknowledged once queued;
+    a background thread prepares them (prepare(record) -> stored record) and stores them in
+    batches with insert_many, retrying a failed batch with exponential backoff. A batch still
+    failing after max_attempts is split in halves to isolate the records the repository rejects.
+    Records that cannot be prepared, or that fail on their own, are appended to the dead-letter
+    file (JSON lines with the stage, the error and the record) so they can be replayed.
+    Records still waiting are visible to readers.
+    """
+
+    def __init__(self, repository, max_queued=1000, batch_size=50, max_backoff=30.0, prepare=None,
+                 max_attempts=5, dead_letter_path=None):
+        self.repository = repository
+        self.prepare = prepare
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path
+        self.writing = []  # batch being inserted
+        self.lock = threading.Lock()
+        self.thread = None
+        self.saved = 0
+        self.failed_attempts = 0
+        self.dead_lettered = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        # Flush what is queued, giving up after the timeout if the repository stays down
+        if self.thread is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+        unsaved = len(self.unsaved_records())
+        if unsaved:
+            logger.warning("Records were not saved", extra={"records": unsaved})
+
+    def save(self, record):
+        # Raises queue.Full when the writer is too far behind. The _id is set here so records
+        # page in save order whether or not they are written yet
+        record.setdefault("_id", ObjectId())
+        self.queue.put_nowait(record)
+
+    def unsaved_records(self):
+        with self.lock, self.queue.mutex:
+            return self.writing + [record for record in self.queue.queue if record is not None]
+
+    def list_records(self, filters=None, fields=None, after=None, limit=None):
+        """
+        One page of stored and unsaved records matching filters, ordered by _id, starting
+        after the _id given as the cursor and projected onto fields (all fields if None).
+        """
+        stored = self.repository.list_records(filters, fields, after, limit)
+        unsaved = page_records(self.unsaved_records(), filters, fields, after, limit)
+        # A record can show up in both while its batch is being inserted
+        records = {record["_id"]: record for record in unsaved}
+        records.update((record["_id"], record) for record in stored)
+        page = sorted(records.values(), key=lambda record: record["_id"])
+        return page[:limit] if limit is not None else page
+
+    def find_record(self, name, fields=None):
+        record = self.repository.find_record(name, fields)
+        if record is None:
+            record = next((project_record(r, fields) for r in self.unsaved_records() if r.get('name') == name), None)
+        return record
+
+    def stats(self):
+        return {
+            "repository": type(self.repository).__name__,
+            "queued": self.queue.qsize(),
+            "saved": self.saved,
+            "failed_attempts": self.failed_attempts,
+            "dead_lettered": self.dead_lettered
+        }
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            record = self.queue.get()
+            if record is None:
+                return
+            batch = [record]
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            if self.prepare is not None:
+                batch = self._prepare(batch)
+            with self.lock:
+                self.writing = batch
+            if batch:
+                self._write(batch)
+            with self.lock:
+                self.writing = []
+
+    def _prepare(self, batch):
+        prepared = []
+        for record in batch:
+            try:
+                prepared.append(self.prepare(record))
+            except Exception as e:
+                self._dead_letter(record, "prepare", e)
+        return prepared
+
+    def _write(self, batch):
+        backoff = min(0.5, self.max_backoff)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self.repository.insert_many(batch)
+                self.saved += len(batch)
+                return
+            except Exception as e:
+                self.failed_attempts += 1
+                error = e
+                if attempt == self.max_attempts:
+                    break
+                logger.warning("Saving records failed, retrying",
+                               extra={"records": len(batch), "retry_seconds": backoff, "error": str(e)})
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+        # Write the halves separately, so only the records the repository keeps rejecting are left
+        if len(batch) > 1:
+            logger.warning("Saving records kept failing, splitting the batch",
+                           extra={"records": len(batch), "error": str(error)})
+            middle = len(batch) // 2
+            self._write(batch[:middle])
+            self._write(batch[middle:])
+        else:
+            self._dead_letter(batch[0], "insert", error)
+
+    def _dead_letter(self, record, stage, error):
+        self.dead_lettered += 1
+        app_metrics.increment("records_dead_lettered_total", stage=stage)
+        logger.error("Record could not be saved, moved to the dead-letter file",
+                     extra={"stage": stage, "record_id": str(record.get("_id")), "error": str(error),
+                            "path": self.dead_letter_path})
+        if self.dead_letter_path is None:
+            return
+        try:
+            entry = dumps({"stage": stage, "error": repr(error), "failed_at": time.time(), "record": record})
+            os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+            with open(self.dead_letter_path, "a") as f:
+                f.write(entry + "\n")
+        except Exception as e:
+            logger.error("Writing the dead-letter file failed", extra={"error": str(e)})
+
+
+def create_record_writer():
+    """
+    Configured with environment variables:
+    - RECORD_STORE: "mongo" (default), "memory", or "disk" for a local JSON lines file
+    - RECORD_STORE_PATH: file for the disk backend
+    - RECORD_QUEUE_LIMIT: records waiting to be written before saves are refused (default 1000)
+    - RECORD_BATCH_SIZE: records per insert_many (default 50)
+    - RECORD_MAX_BACKOFF: longest wait in seconds between retries of a failed batch (default 30)
+    - RECORD_MAX_ATTEMPTS: tries of a batch before it is split to isolate bad records (default 5)
+    - RECORD_DEAD_LETTER_PATH: JSON lines file for records that cannot be saved
+    - MONGO_MAX_POOL_SIZE / MONGO_MIN_POOL_SIZE: MongoDB connection pool bounds
+    """
+    store_name = os.getenv("RECORD_STORE", "mongo")
+    if store_name == "mongo":
+        repository = MongoRecordRepository()
+    elif store_name == "memory":
+        repository = MemoryRecordRepository()
+    elif store_name == "disk":
+        repository = DiskRecordRepository(os.getenv("RECORD_STORE_PATH", ".cache/records.jsonl"))
+    else:
+        raise ValueError(f"Invalid record store: {store_name}")
+
+    return RecordWriter(repository,
+                        max_queued=int(os.getenv("RECORD_QUEUE_LIMIT", 1000)),
+                        batch_size=int(os.getenv("RECORD_BATCH_SIZE", 50)),
+                        max_backoff=float(os.getenv("RECORD_MAX_BACKOFF", 30)),
+                        prepare=prepare_record,
+                        max_attempts=int(os.getenv("RECORD_MAX_ATTEMPTS", 5)),
+                        dead_letter_path=os.getenv("RECORD_DEAD_LETTER_PATH", ".cache/dead_letter_records.jsonl"))
+
+
+record_writer = create_record_writer()
+app_metrics.describe("record_queue_depth", "gauge", "Records waiting to be written")
+app_metrics.describe("records_dead_lettered_total", "counter",
+                     "Records moved to the dead-letter file, by the stage that failed")
+app_metrics.add_collector(lambda: [("record_queue_depth", {}, record_writer.queue.qsize())])
+
+
+@app.on_event("startup")
+def startup_record_writer():
+    record_writer.start()
+
+
+@app.on_event("shutdown")
+def shutdown_record_writer():
+    record_writer.stop(timeout=float(os.getenv("RECORD_FLUSH_TIMEOUT", 10)))
+
+
+@app.get('/admin/records/queue')
+def get_record_queue_stats():
+    return record_writer.stats()
+
+
+# ================================ RECORD EXPORT =================================
+class ExportFormat(str, Enum):
+    PARQUET = "parquet"
+    ARROW = "arrow"  # Arrow IPC file
+
+
+def get_export_schemas():
+    # One table per flattened part of a record; fixed schemas so every chunk appends to the same file
+    import pyarrow as pa
+    record_key = [("record_id", pa.string()), ("name", pa.string())]
+    return {
+        "records": pa.schema(record_key + [
+            ("taskId", pa.string()), ("space", pa.string()), ("feedback", pa.string()),
+            ("model", pa.string()), ("startTimeStamp", pa.string()), ("finishTimeStamp", pa.string()),
+            ("translationTimes", pa.int64()), ("num_entities", pa.int64()), ("num_history_steps", pa.int64())
+        ]),
+        "entities": pa.schema(record_key + [
+            ("entity_id", pa.string()), ("variable", pa.string()), ("value", pa.float64())
+        ]),
+        "entity_history": pa.schema(record_key + [
+            ("step", pa.int64()), ("timestamp", pa.string()), ("operation", pa.string()),
+            ("source", pa.string()), ("description", pa.string()), ("version", pa.int64()),
+            ("entities_affected", pa.list_(pa.string())), ("num_upserts", pa.int64()),
+            ("num_deletes", pa.int64()), ("num_entities", pa.int64())
+        ]),
+        "fitted_distributions": pa.schema(record_key + [
+            ("parameter", pa.string()), ("rank", pa.int64()), ("selected", pa.bool_()),
+            ("distribution", pa.string()), ("params", pa.map_(pa.string(), pa.float64())),
+            ("metrics", pa.map_(pa.string(), pa.float64()))
+        ]),
+        "predictive_checks": pa.schema(record_key + [
+            ("translation", pa.int64()), ("level", pa.string()), ("check", pa.int64()),
+            ("params", pa.list_(pa.float64())), ("min_response_val", pa.float64()),
+            ("max_response_val", pa.float64()), ("max_density_val", pa.float64())
+        ]),
+        "predictive_check_samples": pa.schema(record_key + [
+            ("translation", pa.int64()), ("level", pa.string()), ("check", pa.int64()),
+            ("sample", pa.int64()), ("variable", pa.string()), ("value", pa.float64())
+        ]),
+    }
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def flatten_record(record):
+    """Rows of each export table for one stored record, as {table name: [row dict, ...]}."""
+    key = {"record_id": str(record["_id"]), "name": record.get("name")}
+    entities = record.get("entities") or {}
+    history = record.get("entityHistory") or []
+    if not is_delta_encoded(history):
+        history = encode_entity_history(history)
+
+    tables = {name: [] for name in get_export_schemas()}
+    tables["records"].append({
+        **key,
+        **{field: record.get(field) for field in ("taskId", "space", "feedback", "startTimeStamp", "finishTimeStamp")},
+        "model": record.get("model") if isinstance(record.get("model"), str) else None,
+        "translationTimes": to_int(record.get("translationTimes")),
+        "num_entities": len(entities),
+        "num_history_steps": len(history["steps"])
+    })
+
+    for entity_id, entity in entities.items():
+        tables["entities"].extend({**key, "entity_id": entity_id, "variable": variable, "value": to_float(value)}
+                                  for variable, value in entity.items() if variable != "id")
+
+    previous_state = {}
+    for index, step, state in iter_entity_states(history):
+        diff = step.get("diff") or diff_entity_states(previous_state, state)
+        tables["entity_history"].append({
+            **key,
+            "step": index,
+            **{field: step.get(field) for field in ("timestamp", "operation", "source")},
+            "description": None if step.get("description") is None else str(step["description"]),
+            "version": to_int(step.get("version")),
+            "entities_affected": [str(entity_id) for entity_id in step.get("entitiesAffected") or []],
+            "num_upserts": len(diff["upserts"]),
+            "num_deletes": len(diff["deletes"]),
+            "num_entities": len(state)
+        })
+        # Keyframes start a new state dict, so this one keeps the state a keyframe is diffed against
+        previous_state = state
+
+    for parameter_name, parameter in (record.get("parametersDict") or {}).items():
+        selected_index = parameter.get("selectedDistributionIdx")
+        for rank, distribution in enumerate(parameter.get("distributions") or []):
+            tables["fitted_distributions"].append({
+                **key,
+                "parameter": parameter_name,
+                "rank": rank,
+                "selected": rank == selected_index,
+                "distribution": distribution.get("name"),
+                "params": {k: to_float(v) for k, v in (distribution.get("params") or {}).items()},
+                "metrics": {k: to_float(v) for k, v in (distribution.get("metrics") or {}).items()}
+            })
+
+    for translation, check_results in enumerate(record.get("predictiveCheckResults") or []):
+        # Results saved before checks had levels are one distributional level
+        if "min_response_val" in check_results:
+            check_results = {CheckLevel.DISTRIBUTIONAL.value: check_results}
+        for level, results in check_results.items():
+            level_key = {**key, "translation": translation, "level": level}
+            for check_index, check in enumerate(results.get("simulated_results") or []):
+                tables["predictive_checks"].append({
+                    **level_key,
+                    "check": check_index,
+                    "params": [to_float(value) for value in check.get("params") or []],
+                    **{field: to_float(results.get(field))
+                       for field in ("min_response_val", "max_response_val", "max_density_val")}
+                })
+                for sample_index, row in enumerate(check.get("dataset") or []):
+                    tables["predictive_check_samples"].extend(
+                        {**level_key, "check": check_index, "sample": sample_index,
+                         "variable": variable, "value": to_float(value)}
+                        for variable, value in row.items())
+
+    return tables
+
+
+class RecordExporter:
+    """
+    Streams stored records into one Parquet or Arrow file per table and export run, batch_size
+    records at a time, so memory is bounded by a batch rather than the collection. Runs are
+    incremental: the last exported _id is kept in export_state.json and the next run starts
+    after it. Records younger than settle_seconds are left for the next run, so records still
+    being written by another worker are not skipped.
+
+    Files are laid out as <export_dir>/<table>/part-<run>.<format>, so each table directory
+    reads as one dataset (pandas.read_parquet, pyarrow.dataset).
+    """
+
+    def __init__(self, repository, export_dir, batch_size=50, settle_seconds=60.0):
+        self.repository = repository
+        self.export_dir = export_dir
+        self.batch_size = batch_size
+        self.settle_seconds = settle_seconds
+        self.lock = threading.Lock()
+
+    @property
+    def state_path(self):
+        return os.path.join(self.export_dir, "export_state.json")
+
+    def load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"last_id": None, "runs": []}
+
+    def export(self, file_format=ExportFormat.PARQUET, full=False):
+        # Raises RuntimeError if an export is already running
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError("An export is already running")
+        try:
+            return self._export(ExportFormat(file_format), full)
+        finally:
+            self.lock.release()
+
+    def _export(self, file_format, full):
+        started = time.perf_counter()
+        state = self.load_state()
+        after = None if full or state["last_id"] is None else ObjectId(state["last_id"])
+        cutoff = time.time() - self.settle_seconds
+        run_id = time.strftime("%Y%m%dT%H%M%S") + f"-{uuid.uuid4().hex[:6]}"
+
+        schemas = get_export_schemas()
+        writers = {}
+        rows = {name: 0 for name in schemas}
+        num_records = 0
+        try:
+            while True:
+                batch = self.repository.list_records(None, None, after, self.batch_size)
+                settled = [record for record in batch if record["_id"].generation_time.timestamp() <= cutoff]
+                if not settled:
+                    break
+
+                tables = {name: [] for name in schemas}
+                for record in settled:
+                    for name, table_rows in flatten_record(record).items():
+                        tables[name].extend(table_rows)
+                for name, table_rows in tables.items():
+                    if table_rows:
+                        self._write(writers, name, schemas[name], table_rows, file_format, run_id)
+                        rows[name] += len(table_rows)
+
+                num_records += len(settled)
+                after = settled[-1]["_id"]
+                if len(settled) < self.batch_size:
+                    break
+        except BaseException:
+            for writer, tmp_path, _ in writers.values():
+                writer.close()
+                os.remove(tmp_path)
+            raise
+
+        files = []
+        for writer, tmp_path, path in writers.values():
+            writer.close()
+            os.replace(tmp_path, path)
+            files.append(path)
+
+        run = {
+            "run": run_id,
+            "format": file_format.value,
+            "full": full,
+            "records": num_records,
+            "rows": rows,
+            "files": files,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+        if num_records:
+            state = {"last_id": str(after), "runs": (state["runs"] + [run])[-100:]}
+            tmp_state = self.state_path + ".tmp"
+            with open(tmp_state, "w") as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_state, self.state_path)
+        return run
+
+    def _write(self, writers, name, schema, table_rows, file_format, run_id):
+        import pyarrow as pa
+        if name not in writers:
+            table_dir = os.path.join(self.export_dir, name)
+            os.makedirs(table_dir, exist_ok=True)
+            path = os.path.join(table_dir, f"part-{run_id}.{file_format.value}")
+            tmp_path = path + ".tmp"
+            if file_format == ExportFormat.PARQUET:
+                import pyarrow.parquet as pq
+                writer = pq.ParquetWriter(tmp_path, schema)
+            else:
+                writer = pa.ipc.new_file(tmp_path, schema)
+            writers[name] = (writer, tmp_path, path)
+        # One row group / record batch per chunk of records
+        writers[name][0].write_table(pa.Table.from_pylist(table_rows, schema=schema))
+
+
+def create_record_exporter():
+    """
+    Configured with environment variables:
+    - RECORD_EXPORT_DIR: directory for exported tables and the incremental state (default exports)
+    - RECORD_EXPORT_BATCH_SIZE: records read and written per chunk (default 50)
+    - RECORD_EXPORT_SETTLE_SECONDS: age before a record is exported (default 60)
+    """
+    return RecordExporter(record_writer.repository,
+                          os.getenv("RECORD_EXPORT_DIR", "exports"),
+                          batch_size=int(os.getenv("RECORD_EXPORT_BATCH_SIZE", 50)),
+                          settle_seconds=float(os.getenv("RECORD_EXPORT_SETTLE_SECONDS", 60)))
 
-    if settings.task_id is not None:
-        current_study_settings["task_id"] = settings.task_id
 
-    if settings.elicitation_space is not None:
-        current_study_settings["elicitation_space"] = settings.elicitation_space
+record_exporter = create_record_exporter()
 
-    if settings.feedback_mode is not None:
-        current_study_settings["feedback_mode"] = settings.feedback_mode
 
-    if settings.load_record is not None:
-        current_study_settings["load_record"] = settings.load_record
+@app.post('/admin/records/export')
+def export_records(file_format: ExportFormat = Query(ExportFormat.PARQUET, alias="format"), full: bool = False):
+    # Records added since the last export, or all of them with full=true
+    try:
+        return record_exporter.export(file_format, full)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Exporting records requires pyarrow")
 
-    if settings.record_name is not None:
-        current_study_settings["record_name"] = settings.record_name
 
-    return current_study_settings
+@app.get('/admin/records/export')
+def get_export_state():
+    return record_exporter.load_state()
 
 
 # ================================ USER ENDPOINTS =================================
@@ -185,151 +2233,964 @@ def parse_glm_code(code):
     }
 
 
-def parse_stan_code(code):
-    block_patterns = {
-        "data": r"data\s*{([^}]*)}",
-        "parameters": r"parameters\s*{([^}]*)}",
-        "model": r"model\s*{([^}]*)}",
-    }
+def parse_stan_code(code):
+    block_patterns = {
+        "data": r"data\s*{([^}]*)}",
+        "parameters": r"parameters\s*{([^}]*)}",
+        "model": r"model\s*{([^}]*)}",
+    }
+
+    def parse_block(block):
+        """Parse a block and return detailed information for each variable."""
+        if not block:
+            return []
+        lines = block.strip().split("\n")
+        variables = []
+
+        for line in lines:
+            line = line.strip().replace(";", "")  # Remove semicolons
+            parts = re.split(r"\s+", line)
+            if len(parts) >= 2:
+                var_type = parts[0]  # First part is the type (e.g., real, int)
+                var_name = parts[-1]  # Last part is the variable name
+
+                variables.append({
+                    "name": var_name,
+                    "full_declaration": line
+                })
+
+        return variables
+
+    # Extract and parse each block
+    result = {}
+    for block_name, pattern in block_patterns.items():
+        match = re.search(pattern, code, re.DOTALL)
+        result[block_name] = parse_block(match.group(1)) if match else []
+
+    return result
+
+
+class EntityColumns(BaseModel):
+    """
+    Columnar alternative to a list of entity dicts: one array of values per variable name,
+    all of the same length. nulls[name] is true where that variable is missing (the value
+    in values[name] is then ignored); variables without missing values can be left out.
+    """
+    ids: Optional[List[str]] = None
+    values: Dict[str, List[float]]
+    nulls: Dict[str, List[bool]] = {}
+
+    @model_validator(mode="after")
+    def check_lengths(self):
+        lengths = {len(column) for column in self.values.values()}
+        lengths.update(len(mask) for mask in self.nulls.values())
+        if self.ids is not None:
+            lengths.add(len(self.ids))
+        if len(lengths) > 1:
+            raise ValueError("All columns, null masks and ids must have the same length")
+        return self
+
+    @property
+    def num_entities(self):
+        return len(next(iter(self.values.values()), []))
+
+    def to_array(self, variable_names):
+        # (num_entities, num_variables) float64 array, nan where missing
+        values = np.empty((len(variable_names), self.num_entities))
+        for index, name in enumerate(variable_names):
+            values[index] = self.values[name]
+            if name in self.nulls:
+                values[index, np.asarray(self.nulls[name], dtype=bool)] = np.nan
+        return values.T
+
+
+def get_entity_values(entities, variable_names):
+    """
+    The entities' values of the given variables as a (num_entities, num_variables) float64 array,
+    nan where missing. entities is either a list of entity dicts or an EntityColumns.
+    """
+    if isinstance(entities, EntityColumns):
+        return entities.to_array(variable_names)
+    return np.array([
+        [entity.get(name) for name in variable_names]
+        for entity in entities
+    ], dtype=float).reshape(len(entities), len(variable_names))
+
+
+def check_entity_values(entities, variables, complete_names=()):
+    """
+    Validate the entities of a request against its variables before any work is done: a columnar
+    request needs a column for every variable, and at least one entity must have all of
+    complete_names. Returns the entity values of the variables, as get_entity_values.
+    """
+    names = [var['name'] for var in variables]
+    if isinstance(entities, EntityColumns):
+        missing = [name for name in names if name not in entities.values]
+        if missing:
+            raise ValueError(f"Missing entity columns {missing}")
+    values = get_entity_values(entities, names)
+    complete_indices = [names.index(name) for name in complete_names]
+    if complete_indices and not (~np.isnan(values[:, complete_indices])).all(axis=1).any():
+        raise ValueError(f"No entity has values for all of {list(complete_names)}")
+    return values
+
+
+def split_variables(variables):
+    # (predictors, response variable) of a request
+    responses = [var for var in variables if var.get("type") == "response"]
+    if len(responses) != 1 or any("name" not in var for var in variables):
+        raise ValueError("Expected named variables with exactly one response")
+    return [var for var in variables if var["type"] == "predictor"], responses[0]
+
+
+# Upper bounds on the bootstrap, so one request cannot hold a worker for as long as it likes
+MAX_BOOTSTRAP_SAMPLES = 10000
+MAX_BOOTSTRAP_SIZE = 5000
+# Shortest time budget in seconds; shorter ones would stop (and restart) the fitting pool on every request
+MIN_TIME_BUDGET = 0.5
+# Bounds on the points in each fitted PDF curve; LTTB keeps the first, last and one point per bucket
+MIN_CURVE_POINTS = 3
+MAX_CURVE_POINTS = 2000
+
+
+class TranslationData(BaseModel):
+    entities: Union[List[dict], EntityColumns]
+    variables: List[dict]
+    parameters: List[dict]
+    num_bootstrap_samples: int = Field(100, ge=1, le=MAX_BOOTSTRAP_SAMPLES)
+    bootstrap_size: int = Field(50, ge=1, le=MAX_BOOTSTRAP_SIZE)
+    seed: Optional[int] = None
+    # Seconds to spend on the request; families not fitted by then are left out of the ranking
+    time_budget: Optional[float] = Field(None, ge=MIN_TIME_BUDGET)
+    # Maximum number of points in each fitted PDF curve
+    curve_points: int = Field(200, ge=MIN_CURVE_POINTS, le=MAX_CURVE_POINTS)
+
+    @model_validator(mode="after")
+    def check_entities(self):
+        predictors, response = split_variables(self.variables)
+        variables = predictors + [response]
+        check_entity_values(self.entities, variables, [var['name'] for var in variables])
+        return self
+
+
+@app.post('/translate')
+@profiled("translate")
+def translate(request: Request, data: TranslationData = Body(...),
+              response_format: Optional[ResponseFormat] = Query(None, alias="format")):
+    logger.info("Translation started", extra={"parameters": len(data.parameters)})
+    deadline = get_fit_deadline(data.time_budget)
+    response_format = get_response_format(request, response_format)
+
+    fitted_results = result_cache.get("translate", data)
+    partial = False
+    if fitted_results is None:
+        fitted_results, partial = compute_translation(data, deadline=deadline)
+        # A ranking cut short by the time budget is only good for this request
+        if not partial:
+            result_cache.set("translate", data, fitted_results)
+
+    with span("serialize"):
+        response = serialize_translation(fitted_results, response_format)
+    response["partial"] = partial
+    return format_response(response, response_format)
+
+
+def compute_translation(data, on_progress=None, deadline=None):
+    # Convert parameter samples to distributions, fitting all parameters in parallel
+    return fit_many_samples_before_deadline(sample_translation_parameters(data), deadline,
+                                            on_progress=on_progress, num_points=data.curve_points)
+
+
+def sample_translation_parameters(data):
+    entities = data.entities
+    variables = data.variables
+    parameters = data.parameters
+
+    predictors = [var for var in variables if var["type"] == "predictor"]
+    response = [var for var in variables if var["type"] == "response"][0]
+    parameters_dict = {param['relatedVar']: param['name']
+                       for param in parameters}
+
+    # Bootstrapping to fit linear model and get parameter samples
+    with span("bootstrap"):
+        return bootstrap_fit_linear_model(
+            entities, predictors, response, parameters_dict,
+            num_samples=data.num_bootstrap_samples, n_records=data.bootstrap_size, seed=data.seed)
+
+
+def serialize_translation(fitted_results, response_format):
+    priors_results = {}
+    for param_name, (fitted_dists, param_min, param_max) in fitted_results.items():
+        priors_results[param_name] = serialize_fitted_distributions(fitted_dists, response_format)
+
+    return {
+        "priors_results": priors_results
+    }
+
+
+@app.post('/translate/stream')
+def translate_stream(request: Request, data: TranslationData = Body(...)):
+    # Same as /translate, but each fitted distribution is sent as soon as it is ready
+    logger.info("Translation started", extra={"parameters": len(data.parameters), "stream": True})
+
+    def events():
+        deadline = get_fit_deadline(data.time_budget)
+        fitted_results = result_cache.get("translate", data)
+        if fitted_results is not None:
+            yield from replay_fitted_distributions(fitted_results)
+            return
+
+        yield from stream_fitted_distributions(
+            sample_translation_parameters(data), num_points=data.curve_points, deadline=deadline,
+            on_done=lambda results: result_cache.set("translate", data, results))
+
+    return event_stream_response(request, events())
+
+
+def replay_fitted_distributions(fitted_results):
+    # Stream cached results in the same event format as stream_fitted_distributions
+    for name, (fitted_dists, _, _) in fitted_results.items():
+        for fit_dist in serialize_fitted_distributions(fitted_dists, ResponseFormat.JSON):
+            yield "distribution", {"name": name, "distribution": fit_dist}
+    yield "ranking", {
+        "rankings": {name: [fit_dist['name'] for fit_dist in fitted_dists]
+                     for name, (fitted_dists, _, _) in fitted_results.items()},
+        "partial": False
+    }
+
+
+class CheckLevel(str, Enum):
+    RELATIONAL = "relational"
+    DISTRIBUTIONAL = "distributional"
+    UNIFORM = "uniform"
+
+
+# Upper bounds on the simulation: checks x samples responses are simulated and KDE'd per level
+MAX_PREDICTIVE_CHECKS = 1000
+MAX_CHECK_SAMPLES = 10000
+
+
+class PredictiveCheckData(BaseModel):
+    entities: Union[List[dict], EntityColumns]
+    variables: List[dict]
+    priors: List[dict]
+    num_checks: int = Field(10, ge=1, le=MAX_PREDICTIVE_CHECKS)
+    num_samples: int = Field(100, ge=1, le=MAX_CHECK_SAMPLES)
+    seed: Optional[int] = None
+    levels: List[CheckLevel] = Field([CheckLevel.DISTRIBUTIONAL], min_length=1)
+
+    @model_validator(mode="after")
+    def check_entities(self):
+        predictors, _ = split_variables(self.variables)
+        # Every level samples each predictor; the relational one whole rows of them
+        values = check_entity_values(self.entities, predictors)
+        if np.isnan(values).all(axis=0).any():
+            raise ValueError("Every predictor needs a value in at least one entity")
+        if CheckLevel.RELATIONAL in self.levels:
+            check_entity_values(self.entities, predictors, [var['name'] for var in predictors])
+        return self
+
+
+@app.post('/check')
+@profiled("check")
+def update_check_results(request: Request, data: PredictiveCheckData = Body(...),
+                         response_format: Optional[ResponseFormat] = Query(None, alias="format")):
+    response_format = get_response_format(request, response_format)
+
+    check_results = result_cache.get_or_compute("check", data, lambda: compute_predictive_check(data))
+
+    with span("serialize"):
+        response = serialize_predictive_check(check_results, data, response_format)
+    return format_response(response, response_format)
+
+
+def compute_predictive_check(data):
+    entities = data.entities
+    variables = data.variables
+    priors = data.priors
+
+    predictors = [var for var in variables if var["type"] == "predictor"]
+    response_var = [var for var in variables if var["type"] == "response"][0]
+
+    prior_distributions = [prior for prior in priors]
+    # check_results = prior_predictive_check(
+    #     predictors, response_var, prior_distributions)
+
+    levels = list(dict.fromkeys(level.value for level in data.levels))
+    return new_predictive_check(entities, predictors, response_var, prior_distributions,
+                                num_checks=data.num_checks, num_samples=data.num_samples, seed=data.seed,
+                                levels=levels)
+
+
+def serialize_predictive_check(check_results, data, response_format):
+    predictors = [var for var in data.variables if var["type"] == "predictor"]
+    response_var = [var for var in data.variables if var["type"] == "response"][0]
+
+    return {
+        "check_results": {l: serialize_check_results(results, predictors, response_var, response_format)
+                          for l, results in check_results.items()}
+    }
+
+
+def bootstrap_fit_linear_model(entities, predictors, response, parameters_dict, num_samples=100, n_records=50, seed=None):
+    sorted_variables = predictors + [response]
+
+    # Entities missing any of the variables take no part, as in IncrementalBootstrap
+    dataset = get_entity_values(entities, [var['name'] for var in sorted_variables])
+    dataset = dataset[~np.isnan(dataset).any(axis=1)]
+    X = dataset[:, :-1]
+    y = dataset[:, -1]
+
+    # Bootstrap sampling in chunks of replicates, each with its own random stream
+    chunk_results = run_chunks(bootstrap_chunk, [
+        (X, y, chunk_size, n_records, seed_sequence)
+        for chunk_size, seed_sequence in spawn_chunks(np.random.SeedSequence(seed), num_samples, BOOTSTRAP_CHUNK_SIZE)
+    ])
+    coefs = np.concatenate([chunk_coefs for chunk_coefs, _ in chunk_results])
+    intercepts = np.concatenate([chunk_intercepts for _, chunk_intercepts in chunk_results])
+
+    # Store parameter estimates
+    parameter_samples = {param_name: None for param_name in parameters_dict.values()}
+    for i, var in enumerate(predictors):
+        parameter_samples[parameters_dict[var['name']]] = coefs[:, i]
+    parameter_samples["intercept"] = intercepts
+
+    return parameter_samples
+
+
+def bootstrap_chunk(X, y, num_samples, n_records, seed_sequence):
+    # Sample n_records from the dataset with replacement, for all replicates of the chunk at once
+    rng = np.random.default_rng(seed_sequence)
+    indices = rng.integers(0, len(X), size=(num_samples, n_records))
+    return batched_least_squares(X[indices], y[indices])
+
+
+def batched_least_squares(X, y):
+    """
+    Fit one ordinary least squares model per replicate.
+    - X: (num_replicates, n_records, num_predictors)
+    - y: (num_replicates, n_records)
+    Returns coefficients of shape (num_replicates, num_predictors) and intercepts of shape (num_replicates,).
+    """
+    # Center each replicate so the intercept drops out of the normal equations
+    X_mean = X.mean(axis=1)
+    y_mean = y.mean(axis=1)
+    X_centered = X - X_mean[:, None, :]
+    y_centered = y - y_mean[:, None]
+
+    # Solve the stacked normal equations; the pseudo-inverse gives the minimum-norm
+    # solution (same as LinearRegression) when a resample is rank deficient
+    gram = np.einsum('bni,bnj->bij', X_centered, X_centered)
+    moment = np.einsum('bni,bn->bi', X_centered, y_centered)
+    coefs = np.einsum('bij,bj->bi', np.linalg.pinv(gram, hermitian=True), moment)
+    intercepts = y_mean - np.einsum('bi,bi->b', X_mean, coefs)
+
+    return coefs, intercepts
+
+
+# Number of bootstrap replicates / predictive checks drawn from one random stream
+BOOTSTRAP_CHUNK_SIZE = 1000
+CHECK_CHUNK_SIZE = 250
+
+
+def spawn_chunks(seed_sequence, num_items, chunk_size):
+    """
+    Split num_items into fixed-size chunks, each with an independent child seed sequence.
+    The split only depends on num_items and chunk_size, so the same seed gives the same
+    draws whether the chunks run serially or on different workers.
+    """
+    chunk_sizes = [min(chunk_size, num_items - start) for start in range(0, num_items, chunk_size)]
+    return list(zip(chunk_sizes, seed_sequence.spawn(len(chunk_sizes))))
+
+
+def use_fit_pool():
+    return fit_executor is not None and not profiling_request.get()
+
+
+def run_chunks(func, chunk_args):
+    # Run the chunks on the fitting pool when there is more than one, keeping their order
+    if not use_fit_pool() or len(chunk_args) <= 1:
+        return [func(*args) for args in chunk_args]
+    return list(fit_executor.map(func, *zip(*chunk_args)))
+
+
+FIT_DISTRIBUTIONS = ['uniform', 'norm', 't', 'gamma',
+                     'beta', 'skewnorm', 'lognorm', 'loggamma', 'expon']
+
+# Fitted PDF curves: start from a coarse grid and bisect where linear interpolation is off by
+# more than the tolerance (relative to the curve's peak), then cap the points with LTTB
+PDF_CURVE_POINTS = 200
+PDF_CURVE_INITIAL_POINTS = 33
+PDF_CURVE_MAX_DEPTH = 6
+PDF_CURVE_TOLERANCE = 2e-3
+
+
+def fit_single_distribution(samples, fit_name, initial_params=None):
+    """
+    Fit one candidate family to the samples; runs inside the fitting pool.
+    initial_params optionally holds a previous {param name: value} fit to start the optimizer from.
+    Returns the fitted parameters (None if the fit failed) and the Fitter error metrics.
+    """
+    guess = WARM_START_GUESSES.get(fit_name)
+    if guess is not None:
+        try:
+            param_names = get_param_names(fit_name)
+            fit_params = None
+            if initial_params is not None and all(key in initial_params for key in param_names):
+                fit_params = fit_maximum_likelihood(samples, fit_name, [initial_params[key] for key in param_names])
+            if fit_params is None:
+                fit_params = fit_maximum_likelihood(samples, fit_name, guess(samples))
+            if fit_params is not None:
+                return fit_params, get_fit_metrics(samples, fit_name, fit_params)
+            logger.debug("Warm-started fit rejected, falling back to Fitter", extra={"family": fit_name})
+        except Exception as e:
+            logger.warning("Warm-started fit failed, falling back to Fitter",
+                           extra={"family": fit_name, "error": str(e)})
+
+    # Generic numerical fit
+    from fitter import Fitter
+    f = Fitter(samples, distributions=[fit_name])
+    f.fit(max_workers=1)
+    fit_params = f.fitted_param.get(fit_name)
+    return fit_params, f.df_errors.loc[fit_name].to_dict()
+
+
+def fit_closed_form_distribution(samples, fit_name):
+    """
+    Fit the families whose MLE has a closed form without going through the optimizer.
+    Returns None when there is no analytic estimator for the family or the samples.
+    """
+    fitter = CLOSED_FORM_FITTERS.get(fit_name)
+    if fitter is None:
+        return None
+    fit_params = fitter(samples)
+    if fit_params is None or not np.all(np.isfinite(fit_params)):
+        return None
+    return fit_params, get_fit_metrics(samples, fit_name, fit_params)
+
+
+def get_fit_metrics(samples, fit_name, fit_params, bins=100):
+    # Same goodness-of-fit metrics Fitter reports, so fast-path fits rank alongside generic ones
+    dist = getattr(stats, fit_name)
+    y, bin_edges = np.histogram(samples, bins=bins, density=True)
+    x = (bin_edges[:-1] + bin_edges[1:]) / 2
+    pdf_fitted = dist.pdf(x, *fit_params)
+
+    log_lik = np.sum(dist.logpdf(samples, *fit_params))
+    k = len(fit_params)
+    n = len(samples)
+
+    # stats.kstest and stats.entropy without their per-call overhead; the same values
+    cdf = dist.cdf(np.sort(samples), *fit_params)
+    ranks = np.arange(1, n + 1) / n
+    ks_statistic = max(np.max(ranks - cdf), np.max(cdf - (ranks - 1 / n)))
+    p, q = pdf_fitted + 1e-10, y + 1e-10
+
+    return {
+        'sumsquare_error': np.sum((pdf_fitted - y) ** 2),
+        'aic': 2 * k - 2 * log_lik,
+        'bic': k * np.log(n) - 2 * log_lik,
+        'kl_div': np.sum(special.rel_entr(p / np.sum(p), q / np.sum(q))),
+        'ks_statistic': ks_statistic,
+        'ks_pvalue': np.clip(stats.kstwo.sf(ks_statistic, n), 0, 1)
+    }
+
+
+# Closed-form MLE, returned in scipy's (shapes..., loc, scale) order
+def fit_norm(samples):
+    return (np.mean(samples), np.std(samples))
+
+
+def fit_uniform(samples):
+    return (np.min(samples), np.ptp(samples))
+
+
+def fit_expon(samples):
+    loc = np.min(samples)
+    return (loc, np.mean(samples) - loc)
+
+
+CLOSED_FORM_FITTERS = {
+    'norm': fit_norm,
+    'uniform': fit_uniform,
+    'expon': fit_expon,
+}
+
+
+# Method-of-moments starting values for the optimizer, in (shapes..., loc, scale) order
+def guess_gamma(samples):
+    mean, std, skew = np.mean(samples), np.std(samples), stats.skew(samples)
+    if skew <= 0:
+        skew = 1.0
+    a = 4 / skew ** 2
+    # The support starts at loc, so keep it below the smallest sample (moving it keeps the mean)
+    loc = min(mean - a * std * skew / 2, np.min(samples) - 0.01 * np.ptp(samples))
+    return (a, loc, (mean - loc) / a)
+
+
+def guess_lognorm(samples):
+    loc = np.min(samples) - 0.1 * np.ptp(samples)
+    log_samples = np.log(samples - loc)
+    return (np.std(log_samples), loc, np.exp(np.mean(log_samples)))
+
+
+def guess_beta(samples):
+    padding = 0.01 * np.ptp(samples)
+    loc = np.min(samples) - padding
+    scale = np.ptp(samples) + 2 * padding
+    normalized = (samples - loc) / scale
+    mean, var = np.mean(normalized), np.var(normalized)
+    common = mean * (1 - mean) / var - 1
+    return (mean * common, (1 - mean) * common, loc, scale)
+
+
+def guess_t(samples):
+    kurtosis = stats.kurtosis(samples)
+    df = 6 / kurtosis + 4 if kurtosis > 0 else 30
+    return (df, np.median(samples), np.std(samples) * np.sqrt((df - 2) / df))
+
+
+def guess_skewnorm(samples):
+    # Invert the skewness formula for delta, clipped to the attainable range
+    skew = np.clip(stats.skew(samples), -0.99, 0.99)
+    abs_skew = np.abs(skew) ** (2 / 3)
+    delta = np.sign(skew) * np.sqrt(np.pi / 2 * abs_skew / (abs_skew + ((4 - np.pi) / 2) ** (2 / 3)))
+    a = delta / np.sqrt(1 - delta ** 2)
+    scale = np.std(samples) / np.sqrt(1 - 2 * delta ** 2 / np.pi)
+    loc = np.mean(samples) - scale * delta * np.sqrt(2 / np.pi)
+    return (a, loc, scale)
+
+
+def guess_loggamma(samples):
+    c = 1.0
+    scale = np.std(samples) / np.sqrt(special.polygamma(1, c))
+    return (c, np.mean(samples) - scale * special.digamma(c), scale)
+
+
+WARM_START_GUESSES = {
+    'gamma': guess_gamma,
+    'lognorm': guess_lognorm,
+    'beta': guess_beta,
+    't': guess_t,
+    'skewnorm': guess_skewnorm,
+    'loggamma': guess_loggamma,
+}
 
-    def parse_block(block):
-        """Parse a block and return detailed information for each variable."""
-        if not block:
-            return []
-        lines = block.strip().split("\n")
-        variables = []
 
-        for line in lines:
-            line = line.strip().replace(";", "")  # Remove semicolons
-            parts = re.split(r"\s+", line)
-            if len(parts) >= 2:
-                var_type = parts[0]  # First part is the type (e.g., real, int)
-                var_name = parts[-1]  # Last part is the variable name
+# Log-likelihoods of the warm-started families with their gradients, in (shapes..., loc, scale)
+# order; the same values as summing scipy's logpdf, without its per-call overhead
+HALF_LOG_2PI = 0.5 * np.log(2 * np.pi)
+
+
+def location_scale_gradient(dlogpdf_dz, z, scale):
+    # Gradient over loc and scale of sum(g(z)) - n log(scale), z = (x - loc) / scale, from g'(z)
+    return -np.sum(dlogpdf_dz) / scale, -(np.sum(dlogpdf_dz * z) + len(z)) / scale
+
+
+def loglik_gamma(params, samples):
+    a, loc, scale = params
+    z = (samples - loc) / scale
+    log_z = np.log(z)
+    n = len(samples)
+    log_lik = np.sum((a - 1) * log_z - z) - n * (special.gammaln(a) + np.log(scale))
+    return log_lik, (np.sum(log_z) - n * special.digamma(a),
+                     *location_scale_gradient((a - 1) / z - 1, z, scale))
+
+
+def loglik_lognorm(params, samples):
+    s, loc, scale = params
+    z = (samples - loc) / scale
+    log_z = np.log(z)
+    n = len(samples)
+    log_lik = -np.sum(log_z + log_z ** 2 / (2 * s ** 2)) - n * (np.log(s) + HALF_LOG_2PI + np.log(scale))
+    return log_lik, (np.sum(log_z ** 2) / s ** 3 - n / s,
+                     *location_scale_gradient(-(1 + log_z / s ** 2) / z, z, scale))
+
+
+def loglik_beta(params, samples):
+    a, b, loc, scale = params
+    z = (samples - loc) / scale
+    log_z, log_1mz = np.log(z), np.log1p(-z)
+    n = len(samples)
+    log_lik = np.sum((a - 1) * log_z + (b - 1) * log_1mz) - n * (special.betaln(a, b) + np.log(scale))
+    digamma_ab = special.digamma(a + b)
+    return log_lik, (np.sum(log_z) - n * (special.digamma(a) - digamma_ab),
+                     np.sum(log_1mz) - n * (special.digamma(b) - digamma_ab),
+                     *location_scale_gradient((a - 1) / z - (b - 1) / (1 - z), z, scale))
+
+
+def loglik_t(params, samples):
+    df, loc, scale = params
+    z = (samples - loc) / scale
+    z2 = z ** 2
+    log_terms = np.log1p(z2 / df)
+    n = len(samples)
+    log_lik = -(df + 1) / 2 * np.sum(log_terms) + n * (special.gammaln((df + 1) / 2) - special.gammaln(df / 2)
+                                                        - 0.5 * np.log(df * np.pi) - np.log(scale))
+    ddf = (-0.5 * np.sum(log_terms) + (df + 1) / 2 * np.sum(z2 / (df * (df + z2)))
+           + n / 2 * (special.digamma((df + 1) / 2) - special.digamma(df / 2) - 1 / df))
+    return log_lik, (ddf, *location_scale_gradient(-(df + 1) * z / (df + z2), z, scale))
+
+
+def loglik_skewnorm(params, samples):
+    a, loc, scale = params
+    z = (samples - loc) / scale
+    log_cdf = special.log_ndtr(a * z)
+    n = len(samples)
+    log_lik = np.sum(log_cdf - z ** 2 / 2) + n * (np.log(2) - HALF_LOG_2PI - np.log(scale))
+    mills_ratio = np.exp(-0.5 * (a * z) ** 2 - HALF_LOG_2PI - log_cdf)  # pdf / cdf at a * z
+    return log_lik, (np.sum(z * mills_ratio), *location_scale_gradient(a * mills_ratio - z, z, scale))
+
+
+def loglik_loggamma(params, samples):
+    c, loc, scale = params
+    z = (samples - loc) / scale
+    exp_z = np.exp(z)
+    n = len(samples)
+    log_lik = np.sum(c * z - exp_z) - n * (special.gammaln(c) + np.log(scale))
+    return log_lik, (np.sum(z) - n * special.digamma(c), *location_scale_gradient(c - exp_z, z, scale))
+
+
+LOG_LIKELIHOODS = {
+    'gamma': loglik_gamma,
+    'lognorm': loglik_lognorm,
+    'beta': loglik_beta,
+    't': loglik_t,
+    'skewnorm': loglik_skewnorm,
+    'loggamma': loglik_loggamma,
+}
 
-                variables.append({
-                    "name": var_name,
-                    "full_declaration": line
-                })
 
-        return variables
+# The optimizer works on unconstrained values: log for positive parameters, the log distance
+# to the samples for a support bound (loc below the smallest sample, loc + scale above the
+# largest), asinh for the skewnorm shape so that very skewed fits are reachable
+FREE_PARAMETERS = {
+    'gamma': ('log', 'below_min', 'log'),
+    'lognorm': ('log', 'below_min', 'log'),
+    'beta': ('log', 'log', 'below_min', 'above_max'),
+    't': ('log', 'identity', 'log'),
+    'skewnorm': ('asinh', 'identity', 'log'),
+}
 
-    # Extract and parse each block
-    result = {}
-    for block_name, pattern in block_patterns.items():
-        match = re.search(pattern, code, re.DOTALL)
-        result[block_name] = parse_block(match.group(1)) if match else []
 
-    return result
+def to_free_parameters(fit_name, params, samples):
+    if fit_name == 'loggamma':
+        # (log c, mean, log standard deviation): far better conditioned as c grows and the
+        # family approaches a normal, where loc and scale run off together
+        c, loc, scale = params
+        return np.array([np.log(c), loc + scale * special.digamma(c),
+                         np.log(scale * np.sqrt(special.polygamma(1, c)))])
+
+    free = []
+    for transform, value in zip(FREE_PARAMETERS[fit_name], params):
+        if transform == 'log':
+            free.append(np.log(value))
+        elif transform == 'asinh':
+            free.append(np.arcsinh(value))
+        elif transform == 'below_min':
+            free.append(np.log(np.min(samples) - value))
+        elif transform == 'above_max':
+            free.append(np.log(params[-2] + value - np.max(samples)))
+        else:
+            free.append(value)
+    return np.array(free)
+
+
+def from_free_parameters(fit_name, free, samples):
+    # The parameters and their Jacobian d params / d free
+    if fit_name == 'loggamma':
+        c = np.exp(free[0])
+        digamma, trigamma, tetragamma = special.digamma(c), special.polygamma(1, c), special.polygamma(2, c)
+        scale = np.exp(free[2]) / np.sqrt(trigamma)
+        dscale_dlogc = -scale / 2 * tetragamma / trigamma * c
+        jacobian = np.array([[c, 0, 0],
+                             [-dscale_dlogc * digamma - scale * trigamma * c, 1, -scale * digamma],
+                             [dscale_dlogc, 0, scale]])
+        return np.array([c, free[1] - scale * digamma, scale]), jacobian
+
+    params = np.empty(len(free))
+    jacobian = np.zeros((len(free), len(free)))
+    for i, (transform, value) in enumerate(zip(FREE_PARAMETERS[fit_name], free)):
+        if transform == 'log':
+            params[i] = jacobian[i, i] = np.exp(value)
+        elif transform == 'asinh':
+            params[i], jacobian[i, i] = np.sinh(value), np.cosh(value)
+        elif transform == 'below_min':
+            params[i] = np.min(samples) - np.exp(value)
+            jacobian[i, i] = -np.exp(value)
+        elif transform == 'above_max':
+            # scale = max - loc + exp(value), so it also moves with loc
+            params[i] = np.max(samples) - params[i - 1] + np.exp(value)
+            jacobian[i, i] = np.exp(value)
+            jacobian[i] -= jacobian[i - 1]
+        else:
+            params[i], jacobian[i, i] = value, 1.0
+    return params, jacobian
 
 
-class TranslationData(BaseModel):
-    entities: List[dict]
-    variables: List[dict]
-    parameters: List[dict]
+# Largest loggamma shape tried; beyond it the family is a normal in all but floating-point error
+LOGGAMMA_MAX_SHAPE = 1e4
 
 
-@app.post('/translate')
-def translate(data: TranslationData = Body(...)):
-    print("translation started")
-    entities = data.entities
-    variables = data.variables
-    parameters = data.parameters
+def fit_maximum_likelihood(samples, fit_name, start):
+    """
+    Maximum likelihood fit from a starting point with L-BFGS on the free parameters, using the
+    analytic gradient. Returns None when the fit is not finite or is no better than its start.
+    """
+    loglik = LOG_LIKELIHOODS[fit_name]
+
+    def objective(free):
+        params, jacobian = from_free_parameters(fit_name, free, samples)
+        with np.errstate(all="ignore"):
+            log_lik, gradient = loglik(params, samples)
+        if not np.isfinite(log_lik):
+            return np.inf, np.zeros_like(free)
+        return -log_lik, -jacobian.T @ np.asarray(gradient)
+
+    with np.errstate(all="ignore"):
+        free_start = to_free_parameters(fit_name, start, samples)
+    if not np.all(np.isfinite(free_start)):
+        return None
+    bounds = [(None, None)] * len(free_start)
+    if fit_name == 'loggamma':
+        bounds[0] = (None, np.log(LOGGAMMA_MAX_SHAPE))
+        free_start[0] = min(free_start[0], bounds[0][1])
+    result = optimize.minimize(objective, free_start, jac=True, method="L-BFGS-B", bounds=bounds,
+                               options={"ftol": 1e-12, "maxiter": 200})
+    fit_params = tuple(float(value) for value in from_free_parameters(fit_name, result.x, samples)[0])
+
+    # Checked with scipy's logpdf, which the metrics and the PDF curves use
+    dist = getattr(stats, fit_name)
+    with np.errstate(all="ignore"):
+        log_lik = np.sum(dist.logpdf(samples, *fit_params))
+        start_log_lik = np.sum(dist.logpdf(samples, *start))
+    if not np.isfinite(log_lik) or (np.isfinite(start_log_lik) and log_lik < start_log_lik):
+        return None
+    return fit_params
 
-    predictors = [var for var in variables if var["type"] == "predictor"]
-    response = [var for var in variables if var["type"] == "response"][0]
-    parameters_dict = {param['relatedVar']: param['name']
-                       for param in parameters}
 
-    # Bootstrapping to fit linear model and get parameter samples
-    parameter_samples = bootstrap_fit_linear_model(
-        entities, predictors, response, parameters_dict)
+# Expected seconds for a family we have not timed yet
+DEFAULT_FIT_SECONDS = 1.0
 
-    # Convert parameter samples to distributions
-    priors_results = {}
-    for param_name, samples in parameter_samples.items():
-        print("samples: ", param_name, samples)
-        fitted_dists, param_min, param_max = fit_samples_to_distributions(
-            samples)
+# Per-family running totals, used to decide which fits to start first under a time budget
+family_stats = {}
+family_stats_lock = threading.Lock()
 
-        priors_results[param_name] = fitted_dists
 
-    return {
-        "priors_results": priors_results
-    }
+def get_family_stats(fit_name):
+    # Called with family_stats_lock held
+    return family_stats.setdefault(fit_name, {"fits": 0, "seconds": 0.0, "rankings": 0, "wins": 0})
 
 
-class PredictiveCheckData(BaseModel):
-    entities: List[dict]
-    variables: List[dict]
-    priors: List[dict]
+def record_fit_time(fit_name, seconds):
+    with family_stats_lock:
+        family_stat = get_family_stats(fit_name)
+        family_stat["fits"] += 1
+        family_stat["seconds"] += seconds
 
 
-@app.post('/check')
-def update_check_results(data: PredictiveCheckData = Body(...)):
-    entities = data.entities
-    variables = data.variables
-    priors = data.priors
+def record_fit_ranking(fits):
+    # Only complete rankings count, a cut-short one would favour the fast families
+    ranking = rank_fitted_distributions(fits)
+    if not ranking:
+        return
+    with family_stats_lock:
+        for fit_name in ranking:
+            get_family_stats(fit_name)["rankings"] += 1
+        get_family_stats(ranking[0])["wins"] += 1
 
-    predictors = [var for var in variables if var["type"] == "predictor"]
-    response_var = [var for var in variables if var["type"] == "response"][0]
 
-    prior_distributions = [prior for prior in priors]
-    # check_results = prior_predictive_check(
-    #     predictors, response_var, prior_distributions)
+def fit_priority(fit_name):
+    """
+    Expected wins per second of fitting: the (smoothed) rate at which the family ranks first,
+    divided by its mean fit time so far. Higher goes first.
+    """
+    with family_stats_lock:
+        family_stat = get_family_stats(fit_name)
+        win_rate = (family_stat["wins"] + 1) / (family_stat["rankings"] + 2)
+        expected_seconds = (family_stat["seconds"] / family_stat["fits"]
+                            if family_stat["fits"] else DEFAULT_FIT_SECONDS)
+    return win_rate / max(expected_seconds, 1e-3)
 
-    check_results = new_predictive_check(entities, predictors,
-                         response_var, prior_distributions)
 
-    return {
-        "check_results": check_results
-    }
+def get_fit_deadline(time_budget):
+    return time.monotonic() + time_budget if time_budget is not None else None
 
 
-def bootstrap_fit_linear_model(entities, predictors, response, parameters_dict):
-    sorted_variables = predictors + [response]
+def timed_fit_single_distribution(samples, fit_name, initial_params=None):
+    # Runs inside the fitting pool, so queueing time is not counted against the family
+    start = time.perf_counter()
+    fit = fit_single_distribution(samples, fit_name, initial_params)
+    return fit, time.perf_counter() - start
+
+
+def get_set_distributions(distributions, name):
+    return distributions[name] if isinstance(distributions, dict) else distributions
 
-    dataset = np.array([
-        [entity[var['name']] for var in sorted_variables]
-        for entity in entities
-    ])
-    X = dataset[:, :-1]
-    y = dataset[:, -1]
 
-    num_samples = 100
-    n_records = 50
-    parameter_samples = {param_name: []
-                         # Store coefficients
-                         for param_name in parameters_dict.values()}
+def iter_fit_distributions(samples_dict, distributions=FIT_DISTRIBUTIONS, initial_params=None, deadline=None):
+    """
+    Yield (sample set name, family name, (fit_params, metrics)) as each fit finishes:
+    the closed-form families inline first, then every remaining (sample set x distribution)
+    fit in completion order from the fitting pool, started in fit_priority order.
+    distributions is a list of families for every sample set, or a dict of them per set name.
+    initial_params optionally maps sample set name -> family name -> previous params dict.
+    Past the deadline (a time.monotonic() value) no more fits are started or waited for,
+    and the pool fits still running are stopped.
+    """
+    initial_params = initial_params or {}
+    pending = []
+    for name, samples in samples_dict.items():
+        for fit_name in get_set_distributions(distributions, name):
+            with span(f"fit.{fit_name}"):
+                fit = fit_closed_form_distribution(samples, fit_name)
+            if fit is not None:
+                yield name, fit_name, fit
+            else:
+                pending.append((name, fit_name))
+
+    priorities = {fit_name: fit_priority(fit_name) for _, fit_name in pending}
+    pending.sort(key=lambda item: -priorities[item[1]])
+
+    if not use_fit_pool():
+        for name, fit_name in pending:
+            # A fit that has already started runs to completion
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            fit, seconds = timed_fit_single_distribution(
+                samples_dict[name], fit_name, initial_params.get(name, {}).get(fit_name))
+            record_fit_time(fit_name, seconds)
+            record_span(f"fit.{fit_name}", seconds)
+            yield name, fit_name, fit
+        return
+
+    futures = {fit_executor.submit(timed_fit_single_distribution, samples_dict[name], fit_name,
+                                   initial_params.get(name, {}).get(fit_name)): (name, fit_name)
+               for name, fit_name in pending}
+    app_metrics.increment("fits_pending", len(futures))
+    for future in futures:
+        future.add_done_callback(lambda _: app_metrics.increment("fits_pending", -1))
+    timeout = max(deadline - time.monotonic(), 0) if deadline is not None else None
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            name, fit_name = futures[future]
+            fit, seconds = future.result()
+            record_fit_time(fit_name, seconds)
+            # Time in the pool; fits run side by side, so these can add up to more than the request
+            record_span(f"fit.{fit_name}", seconds)
+            yield name, fit_name, fit
+    except FuturesTimeoutError:
+        return
+    finally:
+        # Stop the remaining fits when the consumer goes away early or the deadline passes,
+        # so they do not keep workers from the next request
+        fit_executor.abandon(futures)
+
+
+def fit_many_samples_to_distributions(samples_dict, distributions=FIT_DISTRIBUTIONS, on_progress=None,
+                                      initial_params=None, num_points=PDF_CURVE_POINTS):
+    """
+    Fit every sample set to every candidate family, then gather the results per sample set
+    in the same format as fit_samples_to_distributions.
+    """
+    fitted_results, _ = fit_many_samples_before_deadline(samples_dict, None, distributions,
+                                                         on_progress, initial_params, num_points)
+    return fitted_results
 
-    for _ in range(num_samples):
-        # Bootstrap sampling
-        # Sample n_records from the dataset with replacement
-        indices = np.random.choice(len(entities), n_records, replace=True)
-        X_sample = X[indices]
-        y_sample = y[indices]
 
-        # Fit linear model
-        model = LinearRegression()
-        model.fit(X_sample, y_sample)
+def fit_many_samples_before_deadline(samples_dict, deadline, distributions=FIT_DISTRIBUTIONS,
+                                     on_progress=None, initial_params=None, num_points=PDF_CURVE_POINTS):
+    """
+    Same as fit_many_samples_to_distributions, but stops at the deadline (None for no limit)
+    and ranks only the families fitted by then.
+    Returns the results and whether any fit was left out.
+    """
+    samples_dict = {name: np.asarray(samples, dtype=float)
+                    for name, samples in samples_dict.items()}
+
+    # on_progress(completed, total) is called as the fits finish
+    total = sum(len(get_set_distributions(distributions, name)) for name in samples_dict)
+    completed = 0
+    fits = {name: {} for name in samples_dict}
+    for name, fit_name, fit in iter_fit_distributions(samples_dict, distributions, initial_params, deadline):
+        fits[name][fit_name] = fit
+        completed += 1
+        if on_progress is not None:
+            on_progress(completed, total)
+
+    partial = completed < total
+    if not partial:
+        for name in samples_dict:
+            record_fit_ranking(fits[name])
+
+    return {name: summarize_fitted_distributions(samples, fits[name], num_points)
+            for name, samples in samples_dict.items()}, partial
+
+
+def stream_fitted_distributions(samples_dict, distributions=FIT_DISTRIBUTIONS, on_done=None,
+                                num_points=PDF_CURVE_POINTS, deadline=None):
+    """
+    Yield ("distribution", ...) events as soon as each family is fitted, then a final
+    ("ranking", ...) event; on_done receives the results in fit_many_samples_to_distributions format.
+    Past the deadline (None for no limit) only the families fitted by then are ranked,
+    and on_done is not called.
+    """
+    samples_dict = {name: np.asarray(samples, dtype=float)
+                    for name, samples in samples_dict.items()}
+    pdf_ranges = {name: get_pdf_range(samples) for name, samples in samples_dict.items()}
+    fits = {name: {} for name in samples_dict}
+    fit_dists = {name: {} for name in samples_dict}
+
+    total = sum(len(get_set_distributions(distributions, name)) for name in samples_dict)
+    completed = 0
+    for name, fit_name, fit in iter_fit_distributions(samples_dict, distributions, deadline=deadline):
+        fits[name][fit_name] = fit
+        completed += 1
+        fit_dist = format_fitted_distribution(pdf_ranges[name], fit_name, *fit, num_points=num_points)
+        if fit_dist is not None:
+            fit_dists[name][fit_name] = fit_dist
+            yield "distribution", {
+                "name": name,
+                "distribution": serialize_fitted_distributions([fit_dist], ResponseFormat.JSON)[0]
+            }
+
+    partial = completed < total
+    results = {}
+    for name in samples_dict:
+        if not partial:
+            record_fit_ranking(fits[name])
+        ranked = [fit_dists[name][fit_name] for fit_name in rank_fitted_distributions(fits[name])
+                  if fit_name in fit_dists[name]]
+        x_min, x_max = pdf_ranges[name]
+        results[name] = (ranked, x_min, x_max)
+    if on_done is not None and not partial:
+        on_done(results)
+
+    yield "ranking", {
+        "rankings": {name: [fit_dist['name'] for fit_dist in ranked] for name, (ranked, _, _) in results.items()},
+        "partial": partial
+    }
 
-        # Store parameter estimates
-        for i, var in enumerate(predictors):
-            parameter_samples[parameters_dict[var['name']]].append(model.coef_[
-                                                                   i])
-        parameter_samples["intercept"].append(model.intercept_)
 
-    return parameter_samples
+def fit_samples_to_distributions(samples, distributions=FIT_DISTRIBUTIONS, num_points=PDF_CURVE_POINTS):
+    return fit_many_samples_to_distributions({"samples": samples}, distributions,
+                                             num_points=num_points)["samples"]
 
 
-def fit_samples_to_distributions(samples):
+def summarize_fitted_distributions(samples, fits, num_points=PDF_CURVE_POINTS):
     fit_dists = []
+    x_range = get_pdf_range(samples)
+
+    for fit_name in rank_fitted_distributions(fits):
+        fit_dist = format_fitted_distribution(x_range, fit_name, *fits[fit_name], num_points=num_points)
+        if fit_dist is not None:
+            fit_dists.append(fit_dist)
+
+    return (fit_dists, *x_range)
 
-    distributions = ['uniform', 'norm', 't', 'gamma',
-                     'beta', 'skewnorm', 'lognorm', 'loggamma', 'expon']
-    f = Fitter(samples, distributions=distributions)
-    f.fit()
 
-    # Generate x values for plotting the PDF of the fitted distributions
+def get_pdf_range(samples):
+    # Range for plotting the PDF of the fitted distributions
     min_sample = min(samples)
     max_sample = max(samples)
 
@@ -339,49 +3200,113 @@ def fit_samples_to_distributions(samples):
     x_min = min_sample - padding
     x_max = max_sample + padding
 
-    x = np.linspace(x_min, x_max, 1000)
+    return x_min, x_max
 
-    sum = f.summary(Nbest=len(distributions), plot=False)
 
-    for dist in sum.iloc:
-        fit_name = dist.name
-        if fit_name not in f.fitted_param:
-            continue
-        fit_params = f.fitted_param[fit_name]
-        fit_distribution = getattr(stats, fit_name)
-        param_names = (fit_distribution.shapes + ", loc, scale").split(
-            ", ") if fit_distribution.shapes else ["loc", "scale"]
-
-        fit_params_dict = {}
-        for d_key, d_val in zip(param_names, fit_params):
-            if not np.isnan(d_val) and not np.isinf(d_val):
-                fit_params_dict[d_key] = float(f"{d_val:.2f}")
-            else:
-                print("invalid param: ", d_key, " = ", d_val)
+def adaptive_pdf_curve(pdf, x_min, x_max, num_points=PDF_CURVE_POINTS):
+    """
+    Evaluate pdf on [x_min, x_max] densely only where the curve bends: each round bisects the
+    intervals whose midpoint is further than the tolerance from the straight line between its ends.
+    Curves that still end up with more than num_points points are downsampled with LTTB.
+    """
+    x = np.linspace(x_min, x_max, PDF_CURVE_INITIAL_POINTS)
+    p = pdf(x)
+    active = np.ones(len(x) - 1, dtype=bool)
 
-        p = get_fit_var_pdf(x, fit_name, fit_params_dict)
+    for _ in range(PDF_CURVE_MAX_DEPTH):
+        idx = np.flatnonzero(active)
+        if len(idx) == 0:
+            break
+        mid_x = (x[idx] + x[idx + 1]) / 2
+        mid_p = pdf(mid_x)
+        peak = max(np.max(p), np.max(mid_p))
+        refine = np.abs(mid_p - (p[idx] + p[idx + 1]) / 2) > PDF_CURVE_TOLERANCE * peak
 
-        metrics = {}
-        sum_row = sum.loc[fit_name]
-        for col_label in sum.columns:
-            if not np.isnan(sum_row[col_label]) and not np.isinf(sum_row[col_label]):
-                metrics[col_label] = float(f"{sum_row[col_label]:.2f}")
+        # Both halves of a bisected interval stay active only if the midpoint was needed
+        x = np.insert(x, idx + 1, mid_x)
+        p = np.insert(p, idx + 1, mid_p)
+        active = np.insert(active, idx + 1, refine)
+        active[idx + np.arange(len(idx))] = refine
 
-        if np.isnan(p).any() or np.isinf(p).any() or np.isnan(x).any() or np.isinf(x).any():
-            print("invalid distribution: ", fit_name)
-            continue
+    return downsample_lttb(x, p, num_points)
 
-        fit_dists.append({
-            'name': fit_name,
-            'params': fit_params_dict,
-            'x': x.tolist(),
-            'p': p.tolist(),
-            'metrics': metrics
-        })
 
-        print("distribution fitted: ", fit_name)
+def downsample_lttb(x, y, num_points):
+    """
+    Largest-Triangle-Three-Buckets: keep the first and last points, and from each bucket in between
+    the point forming the largest triangle with the previous kept point and the next bucket's average.
+    """
+    n = len(x)
+    if num_points >= n or num_points < 3:
+        return x, y
+
+    edges = np.linspace(1, n - 1, num_points - 1).astype(int)
+    keep = np.empty(num_points, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(num_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = np.mean(x[next_start:next_end]), np.mean(y[next_start:next_end])
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+
+    return x[keep], y[keep]
+
+
+def rank_fitted_distributions(fits):
+    # Rank the families the same way Fitter.summary does (by sum of squared errors, nan last)
+    def sort_key(fit_name):
+        error = fits[fit_name][1]["sumsquare_error"]
+        return (np.isnan(error), error)
+
+    return sorted(fits, key=sort_key)
+
+
+def format_fitted_distribution(x_range, fit_name, fit_params, fit_metrics, num_points=PDF_CURVE_POINTS):
+    if fit_params is None:
+        app_metrics.increment("fit_failures_total", family=fit_name, reason="no_fit")
+        return None
+    param_names = get_param_names(fit_name)
+
+    fit_params_dict = {}
+    for d_key, d_val in zip(param_names, fit_params):
+        if not np.isnan(d_val) and not np.isinf(d_val):
+            fit_params_dict[d_key] = float(f"{d_val:.2f}")
+        else:
+            logger.warning("Invalid fitted parameter", extra={"family": fit_name, "param": d_key, "value": d_val})
+
+    with span(f"pdf.{fit_name}"):
+        # From the unrounded parameters: fits close to a family's normal limit have scales that round to 0
+        x, p = adaptive_pdf_curve(lambda x: get_fit_var_pdf(x, fit_name, dict(zip(param_names, fit_params))),
+                                  *x_range, num_points)
+
+    metrics = {}
+    for col_label, metric_val in fit_metrics.items():
+        if not np.isnan(metric_val) and not np.isinf(metric_val):
+            metrics[col_label] = float(f"{metric_val:.2f}")
+
+    if np.isnan(p).any() or np.isinf(p).any() or np.isnan(x).any() or np.isinf(x).any():
+        logger.warning("Invalid fitted distribution", extra={"family": fit_name})
+        app_metrics.increment("fit_failures_total", family=fit_name, reason="invalid_pdf")
+        return None
 
-    return fit_dists, x_min, x_max
+    logger.debug("Distribution fitted", extra={"family": fit_name})
+
+    return {
+        'name': fit_name,
+        'params': fit_params_dict,
+        'x': x,
+        'p': p,
+        'metrics': metrics
+    }
+
+
+def get_param_names(fit_name):
+    fit_distribution = getattr(stats, fit_name)
+    return (fit_distribution.shapes + ", loc, scale").split(
+        ", ") if fit_distribution.shapes else ["loc", "scale"]
 
 
 def get_fit_var_pdf(x, fit_name, fit_params):
@@ -394,181 +3319,243 @@ def get_fit_var_pdf(x, fit_name, fit_params):
     return p
 
 
-def new_predictive_check(entities, predictors, response_var, prior_distributions, num_checks=10, num_samples=100):
+def new_predictive_check(entities, predictors, response_var, prior_distributions, num_checks=10, num_samples=100, seed=None,
+                         levels=("distributional",)):
     """
     Prior predictive check levels -> determine the type of sampling for the predictor values
     - relational: sample from the user-constrcted dataset
     - distribution: sample from the user-constructed histogram distribution
     - uniform: sample from a uniform distribution over the range of the predictor
+    All requested levels share the same parameter draws and go through one simulation and KDE pass.
     """
-    levels = ["distributional"]
-    
     check_results = {l: {} for l in levels}
-    translation_entities = [
-        entity for entity in entities if all(entity.values())]
 
-    parameter_samples = []
-    for dist in prior_distributions:
-        samples = getattr(stats, dist['name']).rvs(
-            **dist["params"], size=num_checks)
-        parameter_samples.append(samples)
+    # Separate random streams for the predictor samples and the parameter draws
+    predictor_seed, parameter_seed = np.random.SeedSequence(seed).spawn(2)
+    rng = np.random.default_rng(predictor_seed)
+
+    # Predictor values of every entity in one pass, missing values as nan
+    predictor_values = get_entity_values(entities, [predictor['name'] for predictor in predictors])
 
-    predictor_samples = {l: {} for l in levels}
+    # predictor_samples[l]: (num_samples, num_predictors), shared by all checks of a level
+    predictor_samples = {}
     for l in levels:
         if l == "relational":
             # sample n sets of entities from the filtered dataset used for translation
-            sampled_entities = np.random.choice(translation_entities, size=num_samples)
-            for predictor in predictors:
-                predictor_samples[l][predictor['name']] = [entity[predictor['name']] for entity in sampled_entities]
+            translation_indices = np.flatnonzero(~np.isnan(predictor_values).any(axis=1))
+            sampled_indices = rng.choice(translation_indices, size=num_samples)
+            predictor_samples[l] = predictor_values[sampled_indices]
         elif l == "distributional":
             # sample n predictor values from marginal distribution for each predictor
-            for predictor in predictors:
-                marginal_dist_values = [
-                    entity[predictor['name']] for entity in entities if entity[predictor['name']] is not None]
-                predictor_samples[l][predictor['name']] = np.random.choice(
+            predictor_samples[l] = np.empty((num_samples, len(predictors)))
+            for predictor_index in range(len(predictors)):
+                marginal_dist_values = predictor_values[:, predictor_index]
+                marginal_dist_values = marginal_dist_values[~np.isnan(marginal_dist_values)]
+                predictor_samples[l][:, predictor_index] = rng.choice(
                     marginal_dist_values, size=num_samples)
         elif l == "uniform":
-            for predictor in predictors:
-                predictor_samples[l][predictor['name']] = np.random.uniform(
-                    predictor['min'], predictor['max'], size=num_samples)
+            predictor_samples[l] = np.column_stack([
+                rng.uniform(predictor['min'], predictor['max'], size=num_samples)
+                for predictor in predictors]).reshape(num_samples, len(predictors))
         else:
             raise ValueError(f"Invalid level: {l}")
 
-    for l in levels:
-        simulated_results = []
-        current_predictor_samples = predictor_samples[l]
-        min_simulated_response_val = response_var['min']
-        max_simulated_response_val = response_var['max']
-
-        for check_index in range(num_checks):
-            simu_results = {}
-            simu_results['params'] = [para_samples[check_index]
-                                      for para_samples in parameter_samples]
-            simu_results['dataset'] = []
+    # Draw the parameters and simulate the responses of every level in batches of checks
+    # parameter_samples: (num_checks, num_predictors + 1), intercept in the last column
+    stacked_predictor_samples = np.concatenate([predictor_samples[l] for l in levels])
+    with span("check.simulate"):
+        chunk_results = run_chunks(simulate_check_chunk, [
+            (prior_distributions, stacked_predictor_samples, chunk_size, seed_sequence)
+            for chunk_size, seed_sequence in spawn_chunks(parameter_seed, num_checks, CHECK_CHUNK_SIZE)
+        ])
+    parameter_samples = np.concatenate([chunk_parameters for chunk_parameters, _ in chunk_results])
+
+    # level_responses: (num_levels, num_checks, num_samples)
+    level_responses = np.concatenate([chunk_responses for _, chunk_responses in chunk_results])
+    level_responses = level_responses.reshape(num_checks, len(levels), num_samples).transpose(1, 0, 2)
+
+    x_values = np.empty((len(levels), 100))
+    for level_index, response_values in enumerate(level_responses):
+        min_simulated_response_val = min(response_var['min'], response_values.min())
+        max_simulated_response_val = max(response_var['max'], response_values.max())
 
-            response_values = []  # Store simulated response values for KDE fitting
+        padding_ratio = 0.1
+        padding = (max_simulated_response_val -
+                   min_simulated_response_val) * padding_ratio
+        x_min = min_simulated_response_val - padding
+        x_max = max_simulated_response_val + padding
+        x_values[level_index] = np.linspace(x_min, x_max, 100)
 
-            for sample_index in range(num_samples):
-                simu_data = {}
-                simu_response_val = 0
-                for predictor_index, predictor in enumerate(predictors):
-                    simu_data[predictor['name']] = current_predictor_samples[predictor['name']][sample_index]
-                    simu_response_val += simu_results['params'][predictor_index] * \
-                        current_predictor_samples[predictor['name']
-                                                  ][sample_index]
+    # Fit KDE to the simulated response values of every check of every level at once
+    with span("check.kde"):
+        density_values, _, _ = batched_gaussian_kde(
+            level_responses.reshape(len(levels) * num_checks, num_samples),
+            np.repeat(x_values, num_checks, axis=0))
+    density_values = density_values.reshape(len(levels), num_checks, -1)
 
-                simu_response_val += simu_results['params'][-1]  # Add intercept
-                simu_data[response_var['name']] = simu_response_val
-                simu_results['dataset'].append(simu_data)
+    for level_index, l in enumerate(levels):
+        # Kept as arrays; serialize_check_results builds the response format
+        results = {
+            'min_response_val': x_values[level_index, 0],
+            'max_response_val': x_values[level_index, -1],
+            'max_density_val': density_values[level_index].max(),
+            'x_values': x_values[level_index],
+            'parameter_samples': parameter_samples,
+            'predictor_samples': predictor_samples[l],
+            'response_values': level_responses[level_index],
+            'density_values': density_values[level_index],
+            'avg_kde': density_values[level_index].mean(axis=0)
+        }
+        check_results[l] = results
 
-                response_values.append(simu_response_val)
+    return check_results
 
-            min_simulated_response_val = min(
-                min_simulated_response_val, min(response_values))
-            max_simulated_response_val = max(
-                max_simulated_response_val, max(response_values))
 
-            simulated_results.append(simu_results)
+def simulate_check_chunk(prior_distributions, predictor_samples, num_checks, seed_sequence):
+    rng = np.random.default_rng(seed_sequence)
+    parameter_samples = sample_prior_parameters(prior_distributions, num_checks, rng)
+    return parameter_samples, simulate_responses(parameter_samples, predictor_samples)
 
-        padding_ratio = 0.1
-        padding = (max_simulated_response_val -
-                   min_simulated_response_val) * padding_ratio
-        x_min = min_simulated_response_val - padding
-        x_max = max_simulated_response_val + padding
-        x_values = np.linspace(x_min, x_max, 100)
 
-        max_density_val = -1
-        avg_kde = []
-        for check_index in range(num_checks):
-            simu_results = simulated_results[check_index]
-            response_values = [simu_data[response_var['name']]
-                               for simu_data in simu_results['dataset']]
+def sample_prior_parameters(prior_distributions, num_checks, rng):
+    # sample n sets of parameters values, one column per prior
+    return np.column_stack([
+        getattr(stats, dist['name']).rvs(**dist["params"], size=num_checks, random_state=rng)
+        for dist in prior_distributions
+    ])
 
-            # Fit KDE to the simulated response values
-            kde = stats.gaussian_kde(response_values)
-            density_values = kde(x_values)
-            avg_kde.append(density_values)
 
-            max_density_val = max(max_density_val, max(density_values))
+def simulate_responses(parameter_samples, predictor_samples):
+    """
+    Simulate the outcomes of the linear model for every check at once.
+    - parameter_samples: (num_checks, num_predictors + 1), intercept in the last column
+    - predictor_samples: (num_samples, num_predictors) shared by all checks,
+      or (num_checks, num_samples, num_predictors) with one set per check
+    Returns the simulated responses of shape (num_checks, num_samples).
+    """
+    coefs = parameter_samples[:, :-1]
+    intercepts = parameter_samples[:, -1]
+    if predictor_samples.ndim == 2:
+        response_values = coefs @ predictor_samples.T
+    else:
+        response_values = np.matmul(predictor_samples, coefs[:, :, None])[:, :, 0]
 
-            # Store KDE results for visualization
-            simu_results['kde'] = [
-                {'x': x_values[i], 'density': density_values[i]} for i in range(len(x_values))]
+    return response_values + intercepts[:, None]
 
-        avg_kde = np.mean(avg_kde, axis=0)
-        avg_kde_result = [
-            {'x': x_values[i], 'density': avg_kde[i]} for i in range(len(x_values))]
 
-        results = {
-            'min_response_val': x_min,
-            'max_response_val': x_max,
-            'max_density_val': max_density_val,
-            'simulated_results': simulated_results,
-            'avg_kde_result': avg_kde_result
-        }
-        check_results[l] = results
+# Above this many samples in the whole batch (checks x samples per check), KDEs are computed
+# on a binned grid with FFT convolution; the exact kernel sum costs the same per sample
+KDE_DIRECT_MAX_SAMPLES = 1000
+KDE_GRID_SIZE = 1024
 
-    return check_results
 
+def batched_gaussian_kde(samples, x_values):
+    """
+    Evaluate one Gaussian KDE per row of samples (num_checks, num_samples) at x_values,
+    using the same Scott's rule bandwidth as stats.gaussian_kde. x_values is either one grid
+    shared by all checks or (num_checks, num_points) with a grid per check.
+    Returns the per-check densities (num_checks, num_points), their average, and the max density.
+    """
+    num_samples = samples.shape[1]
+    x_values = np.broadcast_to(x_values, (samples.shape[0], np.shape(x_values)[-1]))
+    bandwidths = np.std(samples, axis=1, ddof=1) * num_samples ** (-1 / 5)
+    # A constant check has no spread; fall back to a narrow spike instead of failing
+    min_bandwidth = (x_values[:, -1] - x_values[:, 0]) / x_values.shape[1]
+    min_bandwidth = np.where(min_bandwidth > 0, min_bandwidth, 1.0)
+    bandwidths = np.where(bandwidths > 0, bandwidths, min_bandwidth)
+
+    if samples.size <= KDE_DIRECT_MAX_SAMPLES:
+        density_values = direct_gaussian_kde(samples, bandwidths, x_values)
+    else:
+        density_values = binned_gaussian_kde(samples, bandwidths, x_values)
+
+    avg_kde = density_values.mean(axis=0)
+    return density_values, avg_kde, density_values.max()
+
+
+def direct_gaussian_kde(samples, bandwidths, x_values, max_chunk_elements=4_000_000):
+    # Exact kernel sum, chunked over checks to bound the (checks, samples, x) intermediate
+    num_checks, num_samples = samples.shape
+    density_values = np.empty(x_values.shape)
+    chunk_size = max(1, max_chunk_elements // (num_samples * x_values.shape[1]))
+    for start in range(0, num_checks, chunk_size):
+        h = bandwidths[start:start + chunk_size, None, None]
+        z = (x_values[start:start + chunk_size, None, :] - samples[start:start + chunk_size, :, None]) / h
+        density_values[start:start + chunk_size] = np.exp(-0.5 * z ** 2).sum(axis=1) / (
+            num_samples * h[:, :, 0] * np.sqrt(2 * np.pi))
+
+    return density_values
+
+
+def binned_gaussian_kde(samples, bandwidths, x_values, grid_size=KDE_GRID_SIZE, max_chunk_elements=65_536):
+    # Linear binning onto a fine grid, FFT convolution with each check's kernel,
+    # then linear interpolation back onto x_values.
+    # Chunked over checks so the per-check samples and FFT buffers stay in cache
+    num_checks, num_samples = samples.shape
+    chunk_size = max(1, max_chunk_elements // (num_samples + 2 * grid_size))
+    if num_checks > chunk_size:
+        return np.concatenate([
+            binned_gaussian_kde(samples[start:start + chunk_size], bandwidths[start:start + chunk_size],
+                                x_values[start:start + chunk_size], grid_size)
+            for start in range(0, num_checks, chunk_size)])
+
+    grid_min = min(x_values.min(), samples.min())
+    grid_max = max(x_values.max(), samples.max())
+    delta = (grid_max - grid_min) / (grid_size - 1)
+
+    # Split each sample between its two neighbouring grid points
+    positions = (samples - grid_min) / delta
+    lower = np.clip(np.floor(positions).astype(int), 0, grid_size - 2)
+    upper_weight = positions - lower
+    offsets = (np.arange(num_checks) * grid_size)[:, None]
+    counts = np.bincount((lower + offsets).ravel(), weights=(1 - upper_weight).ravel(),
+                         minlength=num_checks * grid_size)
+    counts += np.bincount((lower + 1 + offsets).ravel(), weights=upper_weight.ravel(),
+                          minlength=num_checks * grid_size)
+    counts = counts.reshape(num_checks, grid_size) / num_samples
+
+    # The Gaussian kernel's spectrum is known in closed form, so only the counts are transformed;
+    # zero padding to twice the grid keeps the circular convolution linear
+    fft_size = 1 << int(np.ceil(np.log2(2 * grid_size - 1)))
+    frequencies = np.arange(fft_size // 2 + 1) / (fft_size * delta)
+    kernel_spectra = np.exp(-2 * np.pi ** 2 * (bandwidths[:, None] * frequencies[None, :]) ** 2) / delta
+
+    grid_density = np.fft.irfft(np.fft.rfft(counts, fft_size) * kernel_spectra, fft_size)[:, :grid_size]
+
+    x_positions = np.clip((x_values - grid_min) / delta, 0, grid_size - 1)
+    x_lower = np.minimum(np.floor(x_positions).astype(int), grid_size - 2)
+    x_weight = x_positions - x_lower
+    density_values = (np.take_along_axis(grid_density, x_lower, axis=1) * (1 - x_weight)
+                      + np.take_along_axis(grid_density, x_lower + 1, axis=1) * x_weight)
+
+    return np.maximum(density_values, 0)
+
+
+def prior_predictive_check(predictors, response_var, prior_distributions, num_checks=10, num_samples=100, seed=None):
+    rng = np.random.default_rng(seed)
 
-def prior_predictive_check(predictors, response_var, prior_distributions, num_checks=10, num_samples=100):
     # sample n sets of parameters values
     # parameter_samples = [
-    # [param1_val1, param1_val2, param1_val3, ...],
-    # [param2_val1, param2_val2, param2_val3, ...],
+    # [param1_val1, param2_val1, param3_val1, ...],
+    # [param1_val2, param2_val2, param3_val2, ...],
     # ...]
-    parameter_samples = []
-    for dist in prior_distributions:
-        samples = getattr(stats, dist['name']).rvs(
-            **dist["params"], size=num_checks)
-        parameter_samples.append(samples)
+    parameter_samples = sample_prior_parameters(prior_distributions, num_checks, rng)
 
     # sample m sets of predictor values for each set of parameter values
     # predictor_samples = [
-    # [[age_val1, age_val2, age_val3, ...], [edu_val1, edu_val2, edu_val3, ...]],
-    # [[age_val1, age_val2, age_val3, ...], [edu_val1, edu_val2, edu_val3, ...]],
+    # [[age_val1, edu_val1], [age_val2, edu_val2], ...],
+    # [[age_val1, edu_val1], [age_val2, edu_val2], ...],
     # ...]
-    predictor_samples = [[] for _ in range(num_checks)]
-    for check_index in range(num_checks):
-        for predictor in predictors:
-            predictor_sample = np.random.uniform(
-                predictor['min'], predictor['max'], size=num_samples)
-            predictor_samples[check_index].append(predictor_sample)
+    predictor_samples = np.stack([
+        rng.uniform(predictor['min'], predictor['max'], size=(num_checks, num_samples))
+        for predictor in predictors
+    ], axis=-1).reshape(num_checks, num_samples, len(predictors))
 
     # simulate the outcomes using each set of parameter values and the corresponding sets of predictor values
-    simulated_results = []
-    min_simulated_response_val = response_var['min']
-    max_simulated_response_val = response_var['max']
-
-    for check_index in range(num_checks):
-        simu_results = {}
-        simu_results['params'] = [para_samples[check_index]
-                                  for para_samples in parameter_samples]
-        simu_results['dataset'] = []
-
-        response_values = []  # Store simulated response values for KDE fitting
-
-        for sample_index in range(num_samples):
-            simu_data = {}
-            simu_response_val = 0
-            for predictor_index, predictor in enumerate(predictors):
-                simu_data[predictor['name']
-                          ] = predictor_samples[check_index][predictor_index][sample_index]
-                simu_response_val += simu_results['params'][predictor_index] * \
-                    predictor_samples[check_index][predictor_index][sample_index]
-
-            simu_response_val += simu_results['params'][-1]  # Add intercept
-            simu_data[response_var['name']] = simu_response_val
-            simu_results['dataset'].append(simu_data)
+    response_values = simulate_responses(parameter_samples, predictor_samples)
 
-            response_values.append(simu_response_val)
-
-        min_simulated_response_val = min(
-            min_simulated_response_val, min(response_values))
-        max_simulated_response_val = max(
-            max_simulated_response_val, max(response_values))
-
-        simulated_results.append(simu_results)
+    min_simulated_response_val = min(response_var['min'], response_values.min())
+    max_simulated_response_val = max(response_var['max'], response_values.max())
 
     # Extend min/max range for smooth kde
     padding_ratio = 0.1
@@ -578,34 +3565,19 @@ def prior_predictive_check(predictors, response_var, prior_distributions, num_ch
     x_max = max_simulated_response_val + padding
     x_values = np.linspace(x_min, x_max, 100)
 
-    max_density_val = 0
-    avg_kde = []
-    for check_index in range(num_checks):
-        simu_results = simulated_results[check_index]
-        response_values = [simu_data[response_var['name']]
-                           for simu_data in simu_results['dataset']]
-
-        # Fit KDE to the simulated response values
-        kde = stats.gaussian_kde(response_values)
-        density_values = kde(x_values)
-        avg_kde.append(density_values)
-
-        max_density_val = max(max_density_val, max(density_values))
-
-        # Store KDE results for visualization
-        simu_results['kde'] = [
-            {'x': x_values[i], 'density': density_values[i]} for i in range(len(x_values))]
-
-    avg_kde = np.mean(avg_kde, axis=0)
-    avg_kde_result = [
-        {'x': x_values[i], 'density': avg_kde[i]} for i in range(len(x_values))]
+    # Fit KDE to the simulated response values of every check at once
+    density_values, avg_kde, max_density_val = batched_gaussian_kde(response_values, x_values)
 
     results = {
         'min_response_val': x_min,
         'max_response_val': x_max,
         'max_density_val': max_density_val,
-        'simulated_results': simulated_results,
-        'avg_kde_result': avg_kde_result
+        'x_values': x_values,
+        'parameter_samples': parameter_samples,
+        'predictor_samples': predictor_samples,
+        'response_values': response_values,
+        'density_values': density_values,
+        'avg_kde': avg_kde
     }
 
     return results
@@ -636,60 +3608,819 @@ def get_r_code_from_dist(dist_name, params):
 
 class FitDistributionData(BaseModel):
     samples: List[float]
+    # Seconds to spend fitting; families not fitted by then are left out of the ranking
+    time_budget: Optional[float] = Field(None, ge=MIN_TIME_BUDGET)
+    # Maximum number of points in each fitted PDF curve
+    curve_points: int = Field(200, ge=MIN_CURVE_POINTS, le=MAX_CURVE_POINTS)
 
 
 @app.post('/fitDistribution')
-def fitDistribution(data: FitDistributionData = Body(...)):
+@profiled("fitDistribution")
+def fitDistribution(request: Request, data: FitDistributionData = Body(...),
+                    response_format: Optional[ResponseFormat] = Query(None, alias="format")):
+    deadline = get_fit_deadline(data.time_budget)
+    response_format = get_response_format(request, response_format)
     samples = np.array(data.samples)
 
     # Fit distributions to the samples
-    fitted_distributions, x_min, x_max = fit_samples_to_distributions(samples)
+    fitted_result = result_cache.get("fitDistribution", data)
+    partial = False
+    if fitted_result is None:
+        fitted_results, partial = fit_many_samples_before_deadline({"samples": samples}, deadline,
+                                                                   num_points=data.curve_points)
+        fitted_result = fitted_results["samples"]
+        if not partial:
+            result_cache.set("fitDistribution", data, fitted_result)
+    fitted_distributions, x_min, x_max = fitted_result
 
     # Return the best fitting distribution (first in the list)
     if fitted_distributions:
-        return {
-            'distributions': fitted_distributions
-        }
+        return format_response({
+            'distributions': serialize_fitted_distributions(fitted_distributions, response_format),
+            'partial': partial
+        }, response_format)
     else:
         return {
             'error': 'Could not fit any distribution to the provided data'
         }
 
 
+@app.post('/fitDistribution/stream')
+def fitDistributionStream(request: Request, data: FitDistributionData = Body(...)):
+    # Same as /fitDistribution, but each fitted distribution is sent as soon as it is ready
+    def events():
+        cached = result_cache.get("fitDistribution", data)
+        if cached is not None:
+            yield from replay_fitted_distributions({"samples": cached})
+            return
+
+        yield from stream_fitted_distributions(
+            {"samples": data.samples}, num_points=data.curve_points,
+            deadline=get_fit_deadline(data.time_budget),
+            on_done=lambda results: result_cache.set("fitDistribution", data, results["samples"]))
+
+    return event_stream_response(request, events())
+
+
+# Most sample sets accepted by one /fitDistribution/batch request
+FIT_BATCH_MAX_SETS = int(os.getenv("FIT_BATCH_MAX_SETS", 2000))
+
+
+class SampleSetData(BaseModel):
+    samples: List[float]
+    # Families to fit to this set, instead of the batch's
+    distributions: Optional[List[str]] = None
+
+    @model_validator(mode="after")
+    def check_sample_set(self):
+        if len(self.samples) < 2:
+            raise ValueError("A sample set needs at least 2 samples")
+        check_fit_distributions(self.distributions)
+        return self
+
+
+class FitDistributionBatchData(BaseModel):
+    sample_sets: Dict[str, SampleSetData]
+    # Families for sets without their own list; all of FIT_DISTRIBUTIONS by default
+    distributions: Optional[List[str]] = None
+    time_budget: Optional[float] = Field(None, ge=MIN_TIME_BUDGET)
+    curve_points: int = Field(200, ge=MIN_CURVE_POINTS, le=MAX_CURVE_POINTS)
+
+    @model_validator(mode="after")
+    def check_batch(self):
+        check_fit_distributions(self.distributions)
+        return self
+
+
+def check_fit_distributions(distributions):
+    unknown = [name for name in distributions or [] if name not in FIT_DISTRIBUTIONS]
+    if unknown:
+        raise ValueError(f"Unknown distributions {unknown}, expected some of {FIT_DISTRIBUTIONS}")
+
+
+@app.post('/fitDistribution/batch')
+@profiled("fitDistributionBatch")
+def fitDistributionBatch(request: Request, data: FitDistributionBatchData = Body(...),
+                         response_format: Optional[ResponseFormat] = Query(None, alias="format")):
+    # Many named sample sets fitted together on the fitting pool, results keyed by name
+    if len(data.sample_sets) > FIT_BATCH_MAX_SETS:
+        raise HTTPException(status_code=413, detail=f"At most {FIT_BATCH_MAX_SETS} sample sets per batch")
+    response_format = get_response_format(request, response_format)
+
+    fitted_results, partial = compute_fit_batch(data, deadline=get_fit_deadline(data.time_budget))
+    with span("serialize"):
+        response = serialize_fit_batch(fitted_results, response_format)
+    response["partial"] = partial
+    return format_response(response, response_format)
+
+
+def compute_fit_batch(data, on_progress=None, deadline=None):
+    """
+    Fit every sample set of a batch in one pass over the fitting pool. Sets the result cache
+    already has (from either fitting endpoint) are not refitted, and identical sets are fitted once.
+    Returns {name: (fitted distributions, x_min, x_max)} and whether any fit was left out.
+    """
+    families = {name: sample_set.distributions or data.distributions or FIT_DISTRIBUTIONS
+                for name, sample_set in data.sample_sets.items()}
+    results = {}
+    fitted_as = {}  # name -> name of the identical set that is fitted for it
+    first_with_content = {}
+    for name, sample_set in data.sample_sets.items():
+        cached = result_cache.get(*get_fit_cache_entry(sample_set.samples, families[name], data.curve_points))
+        if cached is not None:
+            results[name] = cached
+            continue
+        content = (tuple(sample_set.samples), tuple(families[name]))
+        fitted_as[name] = first_with_content.setdefault(content, name)
+
+    to_fit = list(first_with_content.values())
+    fitted, partial = fit_many_samples_before_deadline(
+        {name: data.sample_sets[name].samples for name in to_fit}, deadline,
+        {name: families[name] for name in to_fit}, on_progress, num_points=data.curve_points)
+    if not partial:
+        for name in to_fit:
+            result_cache.set(*get_fit_cache_entry(data.sample_sets[name].samples, families[name],
+                                                  data.curve_points), fitted[name])
+
+    results.update((name, fitted[fitted_name]) for name, fitted_name in fitted_as.items())
+    return {name: results[name] for name in data.sample_sets}, partial
+
+
+def get_fit_cache_entry(samples, distributions, curve_points):
+    # The /fitDistribution key for the default families, so either endpoint reuses the other's fits
+    data = FitDistributionData(samples=samples, curve_points=curve_points)
+    if list(distributions) == FIT_DISTRIBUTIONS:
+        return "fitDistribution", data
+    return f"fitDistribution[{','.join(distributions)}]", data
+
+
+def serialize_fit_batch(fitted_results, response_format):
+    results = {}
+    for name, (fitted_dists, _, _) in fitted_results.items():
+        results[name] = {'distributions': serialize_fitted_distributions(fitted_dists, response_format)}
+        if not fitted_dists:
+            results[name]['error'] = 'Could not fit any distribution to the provided data'
+    return {
+        'results': results
+    }
+
+
+RECORD_PAGE_SIZE = 100
+RECORD_MAX_PAGE_SIZE = 1000
+
+
 class SaveRecordData(BaseModel):
     record: dict
 
+    @model_validator(mode="after")
+    def check_history(self):
+        if self.record.get("entityHistory") is not None:
+            check_entity_history(self.record["entityHistory"])
+        return self
+
 
 @app.get('/getRecords')
-def getRecords():
-    records = collection.find()
-    records_list = []
-    for record in records:
-        records_list.append({
-            'name': record['name'],
-            'taskId': record['taskId'],
-            'space': record['space'],
-            'feedback': record['feedback']
-        })
+def getRecords(name: Optional[str] = None, taskId: Optional[str] = None, space: Optional[str] = None,
+               feedback: Optional[str] = None, cursor: Optional[str] = None,
+               limit: int = Query(RECORD_PAGE_SIZE, ge=1, le=RECORD_MAX_PAGE_SIZE)):
+    # Summaries only, one page at a time; pass next_cursor back as cursor for the next page
+    filters = {key: value for key, value in
+               {'name': name, 'taskId': taskId, 'space': space, 'feedback': feedback}.items()
+               if value is not None}
+    after = parse_record_cursor(cursor)
+    records = record_writer.list_records(filters, RECORD_SUMMARY_FIELDS, after, limit)
 
     return {
-        'records': records_list
+        'records': [{field: record.get(field) for field in RECORD_SUMMARY_FIELDS} for record in records],
+        'next_cursor': str(records[-1]['_id']) if len(records) == limit else None
     }
 
 
+def parse_record_cursor(cursor):
+    if cursor is None:
+        return None
+    try:
+        return ObjectId(cursor)
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+
+
 @app.get('/getRecord')
-def getRecord(record_name: str):
-    record = collection.find_one({'name': record_name})
+def getRecord(record_name: str, history: HistoryEncoding = HistoryEncoding.FULL,
+              fields: Optional[str] = None):
+    # The record itself as a streamed JSON document; fields is a comma-separated selection
+    selected = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    record = record_writer.find_record(record_name, selected)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Record not found")
+
+    return StreamingResponse(iter_record_json(record, history), media_type="application/json")
+
+
+@app.get('/getRecord/history')
+def getRecordHistoryStep(record_name: str, step: int):
+    # One step of a record's entity history with the entity state after it, without decoding the rest
+    record = record_writer.find_record(record_name, ['entityHistory'])
+    if record is None:
+        raise HTTPException(status_code=404, detail="Record not found")
+
+    history = record.get('entityHistory') or []
+    if not is_delta_encoded(history):
+        history = encode_entity_history(history)
+    try:
+        entry, state = entity_state_at(history, step)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
     return {
-        'record': dumps(record)
+        'step': step,
+        'num_steps': len(history['steps']),
+        'entry': {key: value for key, value in entry.items() if key not in ('state', 'diff')},
+        'entities': state
     }
 
 
 @app.post('/saveRecord')
-def saveRecord(data: SaveRecordData = Body(...)):
+async def saveRecord(data: SaveRecordData = Body(...)):
+    # Queued for the record writer; async so saves never wait for a threadpool slot
     record = data.record
-    collection.insert_one(record)
+    try:
+        record_writer.save(record)
+    except queue.Full:
+        raise HTTPException(status_code=503, detail="Too many records waiting to be saved",
+                            headers={"Retry-After": "1"})
     return {
         'message': 'Record saved successfully'
     }
+
+
+# ================================ JOB ENDPOINTS =================================
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", os.cpu_count() or 1))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", 4 * JOB_WORKERS))  # queued + running jobs
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", 600))  # seconds a finished job is kept
+
+jobs = {}  # job_id -> job record, including the result once done
+jobs_lock = threading.Lock()
+
+
+def collect_job_metrics():
+    with jobs_lock:
+        statuses = [job["status"] for job in jobs.values()]
+    return [("jobs", {"status": status.value}, statuses.count(status)) for status in JobStatus]
+
+
+app_metrics.describe("jobs", "gauge", "Jobs kept by the job API, by status")
+app_metrics.add_collector(collect_job_metrics)
+job_executor = None
+job_progress_queue = None
+
+
+@app.on_event("startup")
+def startup_job_executor():
+    global job_executor, job_progress_queue
+    context = multiprocessing.get_context()
+    job_progress_queue = context.Queue()
+    job_executor = ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=context,
+                                       initializer=init_job_worker, initargs=(job_progress_queue,))
+    threading.Thread(target=listen_job_progress, args=(job_progress_queue,), daemon=True).start()
+    logger.info("Job pool started", extra={"workers": JOB_WORKERS})
+
+
+@app.on_event("shutdown")
+def shutdown_job_executor():
+    if job_executor is not None:
+        job_executor.shutdown(cancel_futures=True)
+        job_progress_queue.put(None)
+
+
+def init_job_worker(progress_queue):
+    global fit_executor, job_progress_queue
+    # The job pool already spreads jobs over the cores, so fits inside a job run inline
+    fit_executor = None
+    job_progress_queue = progress_queue
+
+
+def run_job(kind, job_id, request_data):
+    # Runs inside the job pool
+    def on_progress(completed, total):
+        job_progress_queue.put((job_id, completed / total if total else 1.0))
+
+    on_progress(0, 1)
+    if kind == "translate":
+        fitted_results, _ = compute_translation(TranslationData(**request_data), on_progress=on_progress)
+        return fitted_results
+    if kind == "fitDistributionBatch":
+        fitted_results, _ = compute_fit_batch(FitDistributionBatchData(**request_data), on_progress=on_progress)
+        return fitted_results
+    return compute_predictive_check(PredictiveCheckData(**request_data))
+
+
+def listen_job_progress(progress_queue):
+    while True:
+        message = progress_queue.get()
+        if message is None:
+            return
+        job_id, progress = message
+        with jobs_lock:
+            job = jobs.get(job_id)
+            if job is not None and job["status"] in (JobStatus.QUEUED, JobStatus.RUNNING):
+                job["status"] = JobStatus.RUNNING
+                job["progress"] = progress
+
+
+def submit_job(kind, data):
+    if job_executor is None:
+        raise HTTPException(status_code=503, detail="Job pool is not running")
+
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "kind": kind,
+        "status": JobStatus.QUEUED,
+        "progress": 0.0,
+        "error": None,
+        "created_at": time.time(),
+        "finished_at": None,
+        "data": data,
+        "result": None
+    }
+
+    # Repeated requests are answered from the result cache without queueing
+    cached_result = result_cache.get(kind, data)
+    with jobs_lock:
+        prune_jobs()
+        if cached_result is not None:
+            job.update(status=JobStatus.DONE, progress=1.0, finished_at=time.time(), result=cached_result)
+            jobs[job_id] = job
+            return job_summary(job)
+
+        active_jobs = sum(1 for j in jobs.values() if j["status"] in (JobStatus.QUEUED, JobStatus.RUNNING))
+        if active_jobs >= JOB_QUEUE_LIMIT:
+            raise HTTPException(status_code=429, detail="Too many jobs in the queue",
+                                headers={"Retry-After": "1"})
+        jobs[job_id] = job
+
+    future = job_executor.submit(run_job, kind, job_id, jsonable_encoder(data))
+    future.add_done_callback(lambda f: finish_job(job_id, f))
+    return job_summary(job)
+
+
+def finish_job(job_id, future):
+    error = future.exception() if not future.cancelled() else "cancelled"
+    result = future.result() if error is None else None
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return
+        job["finished_at"] = time.time()
+        if error is None:
+            job.update(status=JobStatus.DONE, progress=1.0, result=result)
+        else:
+            job.update(status=JobStatus.FAILED, error=str(error))
+    if error is None:
+        result_cache.set(job["kind"], job["data"], result)
+
+
+def prune_jobs():
+    # Called with jobs_lock held
+    now = time.time()
+    expired = [job_id for job_id, job in jobs.items()
+               if job["finished_at"] is not None and now - job["finished_at"] > JOB_RETENTION]
+    for job_id in expired:
+        del jobs[job_id]
+
+
+def job_summary(job):
+    return {key: job[key] for key in ("job_id", "kind", "status", "progress", "error", "created_at", "finished_at")}
+
+
+def get_job(job_id):
+    with jobs_lock:
+        job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post('/jobs/translate', status_code=202)
+def submit_translate_job(data: TranslationData = Body(...)):
+    return submit_job("translate", data)
+
+
+@app.post('/jobs/check', status_code=202)
+def submit_check_job(data: PredictiveCheckData = Body(...)):
+    return submit_job("check", data)
+
+
+@app.post('/jobs/fitDistribution/batch', status_code=202)
+def submit_fit_batch_job(data: FitDistributionBatchData = Body(...)):
+    # For offline re-analysis: batches of any size, with progress, fitted in the job pool
+    return submit_job("fitDistributionBatch", data)
+
+
+@app.get('/jobs/{job_id}')
+def get_job_status(job_id: str):
+    return job_summary(get_job(job_id))
+
+
+@app.get('/jobs/{job_id}/result')
+def get_job_result(job_id: str, request: Request,
+                   response_format: Optional[ResponseFormat] = Query(None, alias="format")):
+    response_format = get_response_format(request, response_format)
+    job = get_job(job_id)
+    if job["status"] != JobStatus.DONE:
+        raise HTTPException(status_code=409, detail=job_summary(job))
+
+    if job["kind"] == "translate":
+        content = serialize_translation(job["result"], response_format)
+    elif job["kind"] == "fitDistributionBatch":
+        content = serialize_fit_batch(job["result"], response_format)
+    else:
+        content = serialize_predictive_check(job["result"], job["data"], response_format)
+    return format_response(content, response_format)
+
+
+@app.get('/jobs/{job_id}/events')
+async def stream_job_events(job_id: str):
+    # Server-sent events with the job status whenever it changes, until the job finishes
+    get_job(job_id)
+
+    async def events():
+        last_summary = None
+        while True:
+            with jobs_lock:
+                job = jobs.get(job_id)
+                summary = job_summary(job) if job is not None else None
+            if summary is None:
+                return
+            if summary != last_summary:
+                yield f"event: status\ndata: {json.dumps(jsonable_encoder(summary))}\n\n"
+                last_summary = summary
+            if summary["status"] in (JobStatus.DONE, JobStatus.FAILED):
+                return
+            await asyncio.sleep(0.2)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+# ================================ INCREMENTAL TRANSLATION =================================
+class IncrementalBootstrap:
+    """
+    Bootstrap replicates of the linear model kept as per-replicate sufficient statistics
+    (X^T X and X^T y, with an intercept column), so entity edits update the coefficient
+    samples without refitting from scratch.
+
+    Each replicate is n_records slots pointing at rows of the row store. Edits only touch the
+    slots and statistics of the rows involved, and keep every slot uniform over the current rows:
+    - insert: each slot moves to the new row with probability 1 / (number of rows)
+    - delete: the slots of the deleted row are redrawn from the remaining rows
+    - update: the statistics are corrected by the change of the row, weighted by its slot counts
+    """
+    # Slot changes after which the statistics are recomputed from the slots to shed rounding drift
+    REBUILD_INTERVAL = 1000000
+
+    def __init__(self, entities, predictors, response, num_samples=100, n_records=50, seed=None):
+        self.variables = [predictor['name'] for predictor in predictors] + [response['name']]
+        self.rng = np.random.default_rng(seed)
+        self.row_ids = {}  # entity id (as a string, however the client sent it) -> row index
+        self.free_rows = []
+
+        if isinstance(entities, EntityColumns):
+            # Complete rows go in all at once, with some room to grow
+            values = entities.to_array(self.variables)
+            complete = ~np.isnan(values).any(axis=1)
+            ids = entities.ids if entities.ids is not None else range(len(values))
+            self.rows = np.concatenate([values[complete], np.empty((16, len(self.variables)))])
+            self.row_ids = dict(zip((str(entity_id) for entity_id in np.asarray(ids)[complete].tolist()),
+                                    range(int(complete.sum()))))
+        else:
+            self.rows = np.empty((max(len(entities), 16), len(self.variables)))  # predictors, then response
+            for index, entity in enumerate(entities):
+                values = self._entity_values(entity)
+                if values is not None:
+                    self._store(str(entity.get('id', index)), values)
+        if not self.row_ids:
+            raise ValueError("No complete entities to translate")
+
+        rows = np.fromiter(self.row_ids.values(), dtype=np.int32)
+        self.slots = rows[self.rng.integers(0, len(rows), size=(num_samples, n_records))]
+        self._rebuild()
+
+    def apply_delta(self, upserts=(), deletes=()):
+        # Upserts must carry an id; ids are compared as strings
+        deletes = [str(entity_id) for entity_id in deletes]
+        self._check_delta(upserts, deletes)
+        for entity_id in deletes:
+            if entity_id in self.row_ids:
+                self._delete(entity_id)
+
+        for entity in upserts:
+            entity_id = str(entity['id'])
+            values = self._entity_values(entity)
+            if values is None:
+                # An entity that lost a value no longer takes part in the translation
+                if entity_id in self.row_ids:
+                    self._delete(entity_id)
+            elif entity_id in self.row_ids:
+                self._update(entity_id, values)
+            else:
+                self._insert(entity_id, values)
+
+        if self.slot_changes >= self.REBUILD_INTERVAL:
+            self._rebuild()
+
+    def parameter_samples(self, predictors, parameters_dict):
+        coefs = np.einsum('bij,bj->bi', np.linalg.pinv(self.gram, hermitian=True), self.moment)
+
+        # Same layout as bootstrap_fit_linear_model
+        parameter_samples = {param_name: None for param_name in parameters_dict.values()}
+        for i, var in enumerate(predictors):
+            parameter_samples[parameters_dict[var['name']]] = coefs[:, i]
+        parameter_samples["intercept"] = coefs[:, -1]
+
+        return parameter_samples
+
+    def _check_delta(self, upserts, deletes):
+        # Reject an edit that would remove every entity before any of it is applied
+        entity_ids = set(self.row_ids).difference(deletes)
+        for entity in upserts:
+            if not entity_ids:
+                break
+            if self._entity_values(entity) is None:
+                entity_ids.discard(str(entity['id']))
+            else:
+                entity_ids.add(str(entity['id']))
+        if not entity_ids:
+            raise ValueError("Cannot remove the last complete entity")
+
+    def _entity_values(self, entity):
+        values = [entity.get(name) for name in self.variables]
+        if any(value is None for value in values):
+            return None
+        return np.array(values, dtype=float)
+
+    def _store(self, entity_id, values):
+        if self.free_rows:
+            row = self.free_rows.pop()
+        else:
+            row = len(self.row_ids)
+            if row == len(self.rows):
+                self.rows = np.concatenate([self.rows, np.empty_like(self.rows)])
+        self.rows[row] = values
+        self.row_ids[entity_id] = row
+        return row
+
+    def _design(self, rows):
+        # Design rows with an intercept column, and the responses
+        values = self.rows[rows]
+        return np.concatenate([values[..., :-1], np.ones(values.shape[:-1] + (1,))], axis=-1), values[..., -1]
+
+    def _rebuild(self):
+        # In chunks of replicates, like bootstrap_fit_linear_model, to bound the design tensor
+        num_variables = len(self.variables)
+        self.gram = np.empty((len(self.slots), num_variables, num_variables))
+        self.moment = np.empty((len(self.slots), num_variables))
+        for start in range(0, len(self.slots), BOOTSTRAP_CHUNK_SIZE):
+            chunk = slice(start, start + BOOTSTRAP_CHUNK_SIZE)
+            X, y = self._design(self.slots[chunk])
+            self.gram[chunk] = np.einsum('bni,bnj->bij', X, X)
+            self.moment[chunk] = np.einsum('bni,bn->bi', X, y)
+        self.slot_changes = 0
+
+    def _move_slots(self, index, new_rows):
+        # index is (replicates, slots) of the slots moving to new_rows
+        replicates = index[0]
+        old_X, old_y = self._design(self.slots[index])
+        new_X, new_y = self._design(new_rows)
+        np.add.at(self.gram, replicates,
+                  np.einsum('ki,kj->kij', new_X, new_X) - np.einsum('ki,kj->kij', old_X, old_X))
+        np.add.at(self.moment, replicates, new_X * new_y[:, None] - old_X * old_y[:, None])
+        self.slots[index] = new_rows
+        self.slot_changes += len(replicates)
+
+    def _insert(self, entity_id, values):
+        num_rows = len(self.row_ids) + 1
+        row = self._store(entity_id, values)
+        # Each slot moves with probability 1 / num_rows: draw how many, then which, so no
+        # per-slot random numbers are needed
+        num_moved = self.rng.binomial(self.slots.size, 1 / num_rows)
+        moved = self.rng.choice(self.slots.size, size=num_moved, replace=False)
+        self._move_slots(np.unravel_index(moved, self.slots.shape), np.full(num_moved, row))
+
+    def _delete(self, entity_id):
+        if len(self.row_ids) == 1:
+            raise ValueError("Cannot remove the last complete entity")
+        row = self.row_ids.pop(entity_id)
+        index = np.nonzero(self.slots == row)
+        remaining_rows = np.fromiter(self.row_ids.values(), dtype=np.int32)
+        self._move_slots(index, self.rng.choice(remaining_rows, size=len(index[0])))
+        self.free_rows.append(row)
+
+    def _update(self, entity_id, values):
+        row = self.row_ids[entity_id]
+        counts = (self.slots == row).sum(axis=1)
+        replicates = np.nonzero(counts)[0]
+        (old_X, new_X), (old_y, new_y) = self._design(np.array([row, row]))
+        new_X[:-1], new_y = values[:-1], values[-1]
+        self.gram[replicates] += counts[replicates, None, None] * (np.outer(new_X, new_X) - np.outer(old_X, old_X))
+        self.moment[replicates] += counts[replicates, None] * (new_X * new_y - old_X * old_y)
+        self.rows[row] = values
+        self.slot_changes += len(replicates)
+
+
+class TranslationDeltaData(BaseModel):
+    upserts: List[dict] = []  # added or edited entities, identified by their id
+    deletes: List[Union[str, int]] = []  # ids of removed entities
+
+    @model_validator(mode="after")
+    def check_upsert_ids(self):
+        if any(entity.get("id") is None for entity in self.upserts):
+            raise ValueError("Every upserted entity needs an id")
+        return self
+
+
+TRANSLATION_SESSION_LIMIT = int(os.getenv("TRANSLATION_SESSION_LIMIT", 200))
+# Most bootstrap slots (num_bootstrap_samples x bootstrap_size) in one session. Sessions are kept
+# in the state store and written back on every edit, so they get much lower bounds than /translate
+TRANSLATION_SESSION_MAX_SLOTS = int(os.getenv("TRANSLATION_SESSION_MAX_SLOTS", 250000))
+TRANSLATION_SESSION_RETRIES = 5
+
+# Sessions live in the state store under this namespace, so any worker can continue one. Updates
+# to a session are serialized within a worker by these locks (picked by session id) and across
+# workers by writing back against the version they started from.
+TRANSLATION_SESSIONS = "translation_sessions"
+translation_session_locks = [threading.Lock() for _ in range(64)]
+
+
+def get_translation_session_lock(session_id):
+    return translation_session_locks[hash(session_id) % len(translation_session_locks)]
+
+
+@app.post('/translate/sessions')
+def create_translation_session(request: Request, data: TranslationData = Body(...),
+                               response_format: Optional[ResponseFormat] = Query(None, alias="format")):
+    response_format = get_response_format(request, response_format)
+    if data.num_bootstrap_samples * data.bootstrap_size > TRANSLATION_SESSION_MAX_SLOTS:
+        raise HTTPException(status_code=422, detail=f"A translation session takes at most "
+                                                    f"{TRANSLATION_SESSION_MAX_SLOTS} bootstrap samples x bootstrap size")
+    predictors = [var for var in data.variables if var["type"] == "predictor"]
+    response = [var for var in data.variables if var["type"] == "response"][0]
+
+    try:
+        bootstrap = IncrementalBootstrap(data.entities, predictors, response,
+                                         num_samples=data.num_bootstrap_samples, n_records=data.bootstrap_size,
+                                         seed=data.seed)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    session_id = uuid.uuid4().hex
+    session = {
+        "bootstrap": bootstrap,
+        "predictors": predictors,
+        "parameters_dict": {param['relatedVar']: param['name'] for param in data.parameters},
+        "previous_params": None,
+        "curve_points": data.curve_points
+    }
+    with get_translation_session_lock(session_id):
+        fitted_results = translate_session(session)
+        state_store.put(TRANSLATION_SESSIONS, session_id, session)
+    state_store.prune(TRANSLATION_SESSIONS, TRANSLATION_SESSION_LIMIT)
+
+    return format_response({"session_id": session_id, **serialize_translation(fitted_results, response_format)},
+                           response_format)
+
+
+@app.post('/translate/sessions/{session_id}')
+def update_translation_session(session_id: str, request: Request, data: TranslationDeltaData = Body(...),
+                               response_format: Optional[ResponseFormat] = Query(None, alias="format")):
+    response_format = get_response_format(request, response_format)
+    with get_translation_session_lock(session_id):
+        for _ in range(TRANSLATION_SESSION_RETRIES):
+            version, stored_session = state_store.get_versioned(TRANSLATION_SESSIONS, session_id)
+            if stored_session is None:
+                raise HTTPException(status_code=404, detail="Translation session not found")
+            # The edit goes to a copy: the stored session (or this worker's cached copy of it)
+            # stays as it was unless the updated session is written back
+            session = copy.deepcopy(stored_session)
+            try:
+                session["bootstrap"].apply_delta(data.upserts, data.deletes)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            fitted_results = translate_session(session)
+            # Another worker updated the session in the meantime: apply the edit to its version instead
+            if state_store.put(TRANSLATION_SESSIONS, session_id, session, expected_version=version) is not None:
+                break
+        else:
+            raise HTTPException(status_code=409, detail="Translation session is being updated elsewhere")
+
+    return format_response({"session_id": session_id, **serialize_translation(fitted_results, response_format)},
+                           response_format)
+
+
+@app.delete('/translate/sessions/{session_id}')
+def delete_translation_session(session_id: str):
+    state_store.delete(TRANSLATION_SESSIONS, session_id)
+    return {"session_id": session_id}
+
+
+def translate_session(session):
+    # Called with the session's lock held
+    parameter_samples = session["bootstrap"].parameter_samples(session["predictors"], session["parameters_dict"])
+
+    # The previous fits are good starting points for the optimizer after a small edit
+    fitted_results = fit_many_samples_to_distributions(parameter_samples, initial_params=session["previous_params"],
+                                                       num_points=session["curve_points"])
+    session["previous_params"] = {name: {fit_dist['name']: fit_dist['params'] for fit_dist in fitted_dists}
+                                  for name, (fitted_dists, _, _) in fitted_results.items()}
+    return fitted_results
+
+
+# ================================ STARTUP =================================
+startup_report = {
+    "lazy_startup": LAZY_STARTUP,
+    "module_load_seconds": None,  # importing this module
+    "ready_seconds": None,  # from the start of the import until the startup hooks finished
+    "warm_up_seconds": None
+}
+warm_up_lock = threading.Lock()
+
+
+def warm_up():
+    """
+    Load the numeric libraries, connect to the database and run every stage of the fit path
+    once (closed-form, warm-started and generic fits, the pool, the KDE), so the first
+    participant does not pay for it. Returns the seconds it took.
+    """
+    with warm_up_lock:
+        started = time.perf_counter()
+        load_fit_modules()
+        connect_db()
+
+        rng = np.random.default_rng(0)
+        samples = rng.gamma(2.0, 1.0, size=200)
+        fit_many_samples_to_distributions({"warm_up": samples})
+        fit_single_distribution(samples, "rayleigh")  # no warm start guess, goes through Fitter
+        batched_gaussian_kde(rng.normal(size=(2, 100)), np.linspace(-4, 4, 100))
+
+        startup_report["warm_up_seconds"] = time.perf_counter() - started
+        logger.info("Warm-up finished", extra={"seconds": round(startup_report["warm_up_seconds"], 2)})
+        return startup_report["warm_up_seconds"]
+
+
+@app.on_event("startup")
+def startup_report_ready():
+    # Registered last, so it runs after the other startup hooks
+    startup_report["ready_seconds"] = time.perf_counter() - module_load_started
+    logger.info("Backend is ready", extra={"seconds": round(startup_report["ready_seconds"], 2),
+                                           "module_load_seconds": round(startup_report["module_load_seconds"], 2),
+                                           "lazy_startup": LAZY_STARTUP})
+
+    # Optional warm-up in the background, so it does not hold back the first response
+    if os.getenv("WARM_UP_ON_STARTUP", "0") == "1":
+        threading.Thread(target=warm_up, daemon=True).start()
+
+
+@app.get('/admin/startup')
+def get_startup_report():
+    return startup_report
+
+
+@app.post('/admin/warmup')
+def warm_up_backend():
+    warm_up()
+    return startup_report
+
+
+startup_report["module_load_seconds"] = time.perf_counter() - module_load_started
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Prior Weaver backend tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Export stored records to Parquet or Arrow tables")
+    export_parser.add_argument("--format", choices=[f.value for f in ExportFormat], default=ExportFormat.PARQUET.value)
+    export_parser.add_argument("--full", action="store_true", help="Export all records, not only new ones")
+    export_parser.add_argument("--dir", help="Output directory (default RECORD_EXPORT_DIR)")
+    profile_parser = commands.add_parser("profile", help="Replay a saved request profile's payload offline")
+    profile_parser.add_argument("profile", help="Profile id (in PROFILE_DIR) or path to its .json file")
+    profile_parser.add_argument("--distributions", nargs="+", help="Only fit these families")
+    profile_parser.add_argument("--repeat", type=int, default=1)
+    profile_parser.add_argument("--sort", default="cumulative", help="pstats sort key")
+    profile_parser.add_argument("--limit", type=int, default=30, help="Functions shown")
+    profile_parser.add_argument("--output", help="Save the replay's profile to this .prof file")
+    args = parser.parse_args()
+
+    if args.command == "profile":
+        replay_profile(args.profile, args.distributions, args.repeat, args.sort, args.limit, args.output)
+    elif args.command == "export":
+        if args.dir:
+            record_exporter.export_dir = args.dir
+        print(json.dumps(record_exporter.export(args.format, args.full), indent=2))
@@ -9,9 +9,14 @@ import { ELICITATION_SPACE, WorkspaceContext } from '../contexts/WorkspaceContex
 import { InlineMath } from 'react-katex';
 
 const LEVELS = {
+    RELATIONAL: "relational",
     DISTRIBUTIONAL: "distributional",
+    UNIFORM: "uniform",
 };
 
+// Levels computed by each predictive check; the backend simulates them all in one pass
+const CHECK_LEVELS = [LEVELS.DISTRIBUTIONAL];
+
 export default function ResultsPanel() {
     const { space } = useContext(WorkspaceContext);
     const { variablesDict, parametersDict, updateParameter, translationTimes, setTranslationTimes, predictiveCheckResults, setPredictiveCheckResults, getDistributionNotation } = useContext(VariableContext);
@@ -88,6 +93,7 @@ export default function ResultsPanel() {
                 entities: Object.values(entities),
                 variables: Object.values(variablesDict),
                 priors: Object.values(priors),
+                levels: CHECK_LEVELS,
             })
             .then((response) => {
                 console.log("predictive check", response.data);
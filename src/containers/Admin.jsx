@@ -3,6 +3,8 @@ import { Box, FormControl, FormLabel, RadioGroup, FormControlLabel, Radio, Butto
 import { TASK_SETTINGS, ELICITATION_SPACE, FEEDBACK_MODE, WorkspaceContext } from '../contexts/WorkspaceContext';
 import axios from 'axios';
 
+const RECORDS_PAGE_SIZE = 1000;
+
 const Admin = () => {
     const { userName, taskId, space, feedback, setUserName, setTaskId, setSpace, setFeedback, loadRecord, setLoadRecord } = useContext(WorkspaceContext);
     const [notification, setNotification] = useState(null);
@@ -11,16 +13,27 @@ const Admin = () => {
 
     useEffect(() => {
         document.title = "Admin";
-        axios.get(window.BACKEND_ADDRESS + '/getRecords')
-            .then((res) => {
-                console.log(res);
-                setRecords(res.data?.records);
+        fetchRecords()
+            .then((loadedRecords) => {
+                setRecords(loadedRecords);
             })
             .catch((error) => {
                 setNotification("Error loading records: " + error.response?.data?.detail);
             });
     }, []);
 
+    // /getRecords returns one page of record summaries at a time
+    const fetchRecords = async () => {
+        const loadedRecords = [];
+        let cursor = null;
+        do {
+            const res = await axios.get(window.BACKEND_ADDRESS + '/getRecords', { params: { cursor: cursor, limit: RECORDS_PAGE_SIZE } });
+            loadedRecords.push(...res.data.records);
+            cursor = res.data.next_cursor;
+        } while (cursor);
+        return loadedRecords;
+    };
+
     useEffect(() => {
         if (selectedRecordName) {
             const record = records.find((record) => record.name === selectedRecordName);
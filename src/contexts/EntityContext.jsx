@@ -3,6 +3,7 @@ import { v4 as uuidv4 } from 'uuid';
 import { WorkspaceContext, USER_MODE } from './WorkspaceContext';
 import { VariableContext } from './VariableContext';
 import axios from 'axios';
+import { encodeEntityHistory } from '../utils/EntityHistory';
 export const EntityContext = createContext();
 
 export const EntityProvider = ({ children }) => {
@@ -256,7 +257,7 @@ export const EntityProvider = ({ children }) => {
             variablesDict: variablesDict,
             parametersDict: parametersDict,
             entities: entities,
-            entityHistory: entityHistory,
+            entityHistory: encodeEntityHistory(entityHistory),
             translationTimes: translationTimes,
             predictiveCheckResults: predictiveCheckResults,
         };
@@ -145,6 +145,9 @@ export const USER_MODE = {
     STUDY: "study"
 }
 
+// Record fields restored when a saved session is loaded
+const RECORD_REPLAY_FIELDS = ["variablesDict", "parametersDict", "entities", "entityHistory", "translationTimes", "predictiveCheckResults"];
+
 const steps = [
     {
         target: '.left-panel',
@@ -319,9 +322,9 @@ export const WorkspaceProvider = ({ children }) => {
     };
 
     const fetchRecord = (recordName) => {
-        axios.get(window.BACKEND_ADDRESS + "/getRecord?record_name=" + recordName)
+        axios.get(window.BACKEND_ADDRESS + "/getRecord", { params: { record_name: recordName, fields: RECORD_REPLAY_FIELDS.join(",") } })
             .then((res) => {
-                const record = JSON.parse(res.data.record);
+                const record = res.data;
                 console.log("Fetched record:", record);
                 setSavedEnvironment(record);
             })
@@ -0,0 +1,40 @@
+// Steps between full entity states; matches HISTORY_KEYFRAME_INTERVAL on the backend
+export const HISTORY_KEYFRAME_INTERVAL = 50;
+
+/**
+ * Delta-encodes an entity history before it is saved, so the record grows with the number of edits
+ * instead of edits x entities. Every keyframeInterval-th step keeps its full entity state, the others
+ * only the entities added or changed and the ids removed since the step before.
+ *
+ * @param history - Entity history steps, each with the full entity state in previousState.
+ * @param keyframeInterval - Steps between full entity states.
+ * @returns {Object} The encoded history; the backend rebuilds the full form in /getRecord.
+ */
+export const encodeEntityHistory = (history, keyframeInterval = HISTORY_KEYFRAME_INTERVAL) => {
+    let previousState = {};
+    const steps = history.map((entry, index) => {
+        const { previousState: entryState, ...step } = entry;
+        const state = entryState || {};
+        if (index % keyframeInterval === 0) {
+            step.state = state;
+        } else {
+            // Entity updates replace the entity object, so unchanged entities are the same object
+            const upserts = {};
+            Object.entries(state).forEach(([entityId, entity]) => {
+                if (previousState[entityId] !== entity) {
+                    upserts[entityId] = entity;
+                }
+            });
+            const deletes = Object.keys(previousState).filter(entityId => !(entityId in state));
+            step.diff = { upserts, deletes };
+        }
+        previousState = state;
+        return step;
+    });
+
+    return {
+        encoding: "delta",
+        keyframe_interval: keyframeInterval,
+        steps: steps,
+    };
+};
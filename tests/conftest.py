@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Local backends only, set before main is imported: no MongoDB, nothing written to the repo
+TEST_DIR = tempfile.mkdtemp(prefix="prior-weaver-tests-")
+os.environ.update({
+    "LAZY_STARTUP": "1",
+    "RECORD_STORE": "memory",
+    "STATE_STORE": "memory",
+    "RESULT_CACHE": "memory",
+    "FIT_WORKERS": "2",
+    "JOB_WORKERS": "1",
+    "PROFILE_DIR": os.path.join(TEST_DIR, "profiles"),
+    "RECORD_EXPORT_DIR": os.path.join(TEST_DIR, "exports"),
+    "RECORD_DEAD_LETTER_PATH": os.path.join(TEST_DIR, "dead_letter_records.jsonl"),
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    # One app for the whole run, so the fitting and job pools start once
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(autouse=True)
+def clear_result_cache():
+    if main.result_cache.backend is not None:
+        main.result_cache.backend.clear()
+    yield
+
+
+def make_variables(num_predictors=1):
+    predictors = [{"name": f"x{i}", "type": "predictor", "min": 0, "max": 10} for i in range(num_predictors)]
+    return predictors + [{"name": "y", "type": "response", "min": -50, "max": 150}]
+
+
+def make_entities(num_entities=40, num_predictors=1, seed=0):
+    # y = 3 + sum of (1 + i) * x_i plus noise
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0, 10, size=(num_entities, num_predictors))
+    y = 3 + X @ np.arange(1, num_predictors + 1) + rng.normal(0, 1, size=num_entities)
+    return [{"id": str(i), **{f"x{j}": float(v) for j, v in enumerate(row)}, "y": float(r)}
+            for i, (row, r) in enumerate(zip(X, y))]
+
+
+def make_parameters(num_predictors=1):
+    return [{"name": f"b_x{i}", "relatedVar": f"x{i}"} for i in range(num_predictors)]
+
+
+def translation_body(num_entities=40, num_predictors=1, **fields):
+    return {"entities": make_entities(num_entities, num_predictors), "variables": make_variables(num_predictors),
+            "parameters": make_parameters(num_predictors), "seed": 1, **fields}
+
+
+def check_body(num_entities=40, num_predictors=1, **fields):
+    priors = [{"name": "norm", "params": {"loc": 1, "scale": 0.5}} for _ in range(num_predictors)] + \
+        [{"name": "norm", "params": {"loc": 3, "scale": 1}}]
+    return {"entities": make_entities(num_entities, num_predictors), "variables": make_variables(num_predictors),
+            "priors": priors, "seed": 1, **fields}
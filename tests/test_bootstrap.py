@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+import main
+from conftest import make_entities, make_variables, translation_body
+
+
+def test_batched_least_squares_matches_per_replicate_lstsq():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(20, 30, 3))
+    y = X @ np.array([1.0, -2.0, 0.5]) + 4 + rng.normal(size=(20, 30))
+
+    coefs, intercepts = main.batched_least_squares(X, y)
+
+    for b in range(len(X)):
+        design = np.column_stack([X[b], np.ones(len(X[b]))])
+        expected = np.linalg.lstsq(design, y[b], rcond=None)[0]
+        np.testing.assert_allclose(coefs[b], expected[:-1], atol=1e-9)
+        np.testing.assert_allclose(intercepts[b], expected[-1], atol=1e-9)
+
+
+def test_bootstrap_recovers_linear_relationship():
+    variables = make_variables(2)
+    samples = main.bootstrap_fit_linear_model(make_entities(200, 2), variables[:-1], variables[-1],
+                                              {"x0": "b_x0", "x1": "b_x1"}, num_samples=200, seed=0)
+
+    assert set(samples) == {"b_x0", "b_x1", "intercept"}
+    assert all(len(values) == 200 for values in samples.values())
+    assert np.median(samples["b_x0"]) == pytest.approx(1, abs=0.2)
+    assert np.median(samples["b_x1"]) == pytest.approx(2, abs=0.2)
+    assert np.median(samples["intercept"]) == pytest.approx(3, abs=1.5)
+
+
+def test_bootstrap_is_reproducible_with_a_seed():
+    variables = make_variables()
+    args = (make_entities(), variables[:-1], variables[-1], {"x0": "b_x0"})
+    first = main.bootstrap_fit_linear_model(*args, seed=5)
+    assert np.array_equal(main.bootstrap_fit_linear_model(*args, seed=5)["b_x0"], first["b_x0"])
+    assert not np.array_equal(main.bootstrap_fit_linear_model(*args, seed=6)["b_x0"], first["b_x0"])
+
+
+@pytest.mark.parametrize("field, value", [
+    ("num_bootstrap_samples", 0),
+    ("num_bootstrap_samples", main.MAX_BOOTSTRAP_SAMPLES + 1),
+    ("bootstrap_size", 0),
+    ("bootstrap_size", main.MAX_BOOTSTRAP_SIZE + 1),
+])
+def test_translate_rejects_out_of_range_bootstrap(client, field, value):
+    assert client.post("/translate", json=translation_body(**{field: value})).status_code == 422
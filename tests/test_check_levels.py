@@ -0,0 +1,58 @@
+import numpy as np
+
+import main
+from conftest import check_body, make_entities, make_variables
+
+LEVELS = ("relational", "distributional", "uniform")
+
+
+def run_levels(entities, levels=LEVELS, seed=0):
+    variables = make_variables(2)
+    priors = [{"name": "norm", "params": {"loc": 1, "scale": 0.5}}] * 2 + [{"name": "norm", "params": {"loc": 3}}]
+    return main.new_predictive_check(entities, variables[:-1], variables[-1], priors,
+                                     num_checks=12, num_samples=40, seed=seed, levels=levels)
+
+
+def test_levels_share_the_parameter_draws():
+    results = run_levels(make_entities(30, 2))
+
+    assert set(results) == set(LEVELS)
+    for level in LEVELS:
+        level_results = results[level]
+        assert np.array_equal(level_results["parameter_samples"], results["relational"]["parameter_samples"])
+        np.testing.assert_allclose(level_results["response_values"],
+                                   main.simulate_responses(level_results["parameter_samples"],
+                                                           level_results["predictor_samples"]))
+        assert level_results["density_values"].shape == (12, 100)
+        assert level_results["x_values"][0] == level_results["min_response_val"]
+
+
+def test_level_samples_come_from_their_source():
+    entities = make_entities(30, 2)
+    entities[0]["x0"] = 0.0  # a zero is a value, not a missing one
+    entities[1]["x1"] = None
+    results = run_levels(entities)
+    complete_rows = {(e["x0"], e["x1"]) for e in entities if e["x1"] is not None}
+
+    assert {tuple(row) for row in results["relational"]["predictor_samples"]} <= complete_rows
+    for index, name in enumerate(["x0", "x1"]):
+        observed = {e[name] for e in entities if e[name] is not None}
+        assert set(results["distributional"]["predictor_samples"][:, index]) <= observed
+    uniform = results["uniform"]["predictor_samples"]
+    assert uniform.min() >= 0 and uniform.max() <= 10
+
+
+def test_relational_level_keeps_entities_with_zeros():
+    entities = [{"id": str(i), "x0": 0.0, "x1": float(i), "y": 1.0} for i in range(5)]
+    results = run_levels(entities, levels=("relational",))
+    assert set(results["relational"]["predictor_samples"][:, 1]) <= {0.0, 1.0, 2.0, 3.0, 4.0}
+    assert results["relational"]["predictor_samples"].shape == (40, 2)
+
+
+def test_check_endpoint_returns_each_requested_level(client):
+    response = client.post("/check", json=check_body(levels=list(LEVELS), num_checks=3, num_samples=20))
+    assert response.status_code == 200
+    assert set(response.json()["check_results"]) == set(LEVELS)
+
+    assert client.post("/check", json=check_body(levels=["sideways"])).status_code == 422
+    assert client.post("/check", json=check_body(levels=[])).status_code == 422
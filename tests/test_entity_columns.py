@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+import main
+from conftest import check_body, make_entities, translation_body
+
+
+def to_columns(entities, names=("x0", "y")):
+    return {
+        "ids": [entity["id"] for entity in entities],
+        "values": {name: [entity[name] if entity[name] is not None else 0.0 for entity in entities]
+                   for name in names},
+        "nulls": {name: [entity[name] is None for entity in entities] for name in names},
+    }
+
+
+def entities_with_gaps():
+    entities = make_entities(40)
+    entities[3]["x0"] = None
+    entities[7]["y"] = None
+    return entities
+
+
+def test_entity_values_match_for_rows_and_columns():
+    entities = entities_with_gaps()
+    columns = main.EntityColumns(**to_columns(entities))
+    rows = main.get_entity_values(entities, ["x0", "y"])
+    np.testing.assert_array_equal(main.get_entity_values(columns, ["x0", "y"]), rows)
+    assert np.isnan(rows[3, 0]) and np.isnan(rows[7, 1])
+
+
+def test_incomplete_entities_are_left_out_of_the_translation(client):
+    entities = entities_with_gaps()
+    complete = [entity for i, entity in enumerate(entities) if i not in (3, 7)]
+
+    expected = client.post("/translate", json=translation_body() | {"entities": complete}).json()
+    main.result_cache.backend.clear()
+    as_rows = client.post("/translate", json=translation_body() | {"entities": entities}).json()
+    main.result_cache.backend.clear()
+    as_columns = client.post("/translate", json=translation_body() | {"entities": to_columns(entities)}).json()
+
+    assert expected["priors_results"]["b_x0"]
+    assert as_rows == expected
+    assert as_columns == expected
+
+
+def test_columnar_check_matches_rows(client):
+    entities = entities_with_gaps()
+    as_rows = client.post("/check", json=check_body(num_checks=3, num_samples=20) | {"entities": entities}).json()
+    main.result_cache.backend.clear()
+    as_columns = client.post("/check", json=check_body(num_checks=3, num_samples=20)
+                             | {"entities": to_columns(entities)}).json()
+    assert as_columns == as_rows
+
+
+@pytest.mark.parametrize("entities", [
+    {"values": {"x0": [1.0, 2.0]}},  # no response column
+    {"values": {"x0": [1.0, 2.0], "y": [1.0]}},
+    {"ids": ["a"], "values": {"x0": [1.0, 2.0], "y": [1.0, 2.0]}},
+    {"values": {"x0": [1.0, 2.0], "y": [1.0, 2.0]}, "nulls": {"y": [True, True]}},
+    [{"id": "a", "x0": None, "y": 1.0}],
+])
+def test_translate_rejects_unusable_entities(client, entities):
+    response = client.post("/translate", json=translation_body() | {"entities": entities})
+    assert response.status_code == 422
+
+
+def test_translate_rejects_variables_without_a_response(client):
+    body = translation_body()
+    body["variables"] = [var for var in body["variables"] if var["type"] != "response"]
+    assert client.post("/translate", json=body).status_code == 422
+
+
+@pytest.mark.parametrize("entities, levels", [
+    ({"values": {"y": [1.0, 2.0]}}, ["distributional"]),
+    ([{"id": "a", "x0": None, "x1": 1.0}, {"id": "b", "x0": 1.0, "x1": None}], ["relational"]),
+    ([{"id": "a", "x0": None, "x1": 1.0}], ["distributional"]),
+])
+def test_check_rejects_unusable_entities(client, entities, levels):
+    body = check_body(num_predictors=2, levels=levels) | {"entities": entities}
+    assert client.post("/check", json=body).status_code == 422
+
+
+def test_check_accepts_rows_without_a_complete_entity_for_marginal_levels(client):
+    entities = [{"id": "a", "x0": None, "x1": 1.0}, {"id": "b", "x0": 1.0, "x1": None}]
+    body = check_body(num_predictors=2, num_checks=3, num_samples=10, levels=["distributional", "uniform"])
+    assert client.post("/check", json=body | {"entities": entities}).status_code == 200
@@ -0,0 +1,103 @@
+import json
+import uuid
+
+import pytest
+
+import main
+
+
+def make_history(num_steps=7):
+    # Step i adds entity i, changes entity 0 on every third step and drops entity 1 at step 4
+    history, state = [], {}
+    for index in range(num_steps):
+        state = dict(state)
+        state[str(index)] = {"id": str(index), "x": index}
+        if index % 3 == 0:
+            state["0"] = {"id": "0", "x": -index}
+        if index == 4:
+            del state["1"]
+        history.append({"action": f"step {index}", "previousState": state})
+    return history
+
+
+def test_encoding_matches_frontend():
+    # What encodeEntityHistory in src/utils/EntityHistory.js sends for the same history
+    history = [
+        {"action": "add", "previousState": {"a": {"x": 1}}},
+        {"action": "add", "previousState": {"a": {"x": 1}, "b": {"x": 2}}},
+        {"action": "move", "previousState": {"a": {"x": 3}, "b": {"x": 2}}},
+        {"action": "delete", "previousState": {"b": {"x": 2}}},
+        {"action": "clear"},
+    ]
+    assert main.encode_entity_history(history, keyframe_interval=2) == {
+        "encoding": "delta",
+        "keyframe_interval": 2,
+        "steps": [
+            {"action": "add", "state": {"a": {"x": 1}}},
+            {"action": "add", "diff": {"upserts": {"b": {"x": 2}}, "deletes": []}},
+            {"action": "move", "state": {"a": {"x": 3}, "b": {"x": 2}}},
+            {"action": "delete", "diff": {"upserts": {}, "deletes": ["a"]}},
+            {"action": "clear", "state": {}},
+        ],
+    }
+
+
+@pytest.mark.parametrize("keyframe_interval", [1, 3, 50])
+def test_round_trip(keyframe_interval):
+    history = make_history()
+    encoded = main.encode_entity_history(history, keyframe_interval)
+    main.check_entity_history(encoded)
+    assert main.decode_entity_history(encoded) == history
+    for index, entry in enumerate(history):
+        step, state = main.entity_state_at(encoded, index)
+        assert step["action"] == entry["action"]
+        assert state == entry["previousState"]
+
+
+def test_prepare_record_rekeys_delta_histories():
+    history = make_history()
+    record = main.prepare_record({"name": "r", "entityHistory": main.encode_entity_history(history, 2)})
+    assert record["entityHistory"]["keyframe_interval"] == main.HISTORY_KEYFRAME_INTERVAL
+    assert main.decode_entity_history(record["entityHistory"]) == history
+
+
+@pytest.mark.parametrize("history", [
+    [1, 2, 3],
+    [{"previousState": [1]}],
+    {"steps": []},
+    {"encoding": "delta", "keyframe_interval": 0, "steps": []},
+    {"encoding": "delta", "keyframe_interval": 2, "steps": [{"diff": {"upserts": {}, "deletes": []}}]},
+    {"encoding": "delta", "keyframe_interval": 2, "steps": [{"state": {}}, {"diff": {"upserts": []}}]},
+    "history",
+])
+def test_malformed_history_is_rejected(client, history):
+    response = client.post("/saveRecord", json={"record": {"name": "bad", "entityHistory": history}})
+    assert response.status_code == 422
+
+
+def test_prepare_record_keeps_history_it_cannot_encode():
+    record = {"name": "r", "entityHistory": [1, 2, 3]}
+    assert main.prepare_record(record) == record
+
+
+def saved_record(client, name, **params):
+    # Saves are queued for the writer, but unsaved records are found too
+    response = client.get("/getRecord", params={"record_name": name, **params})
+    assert response.status_code == 200
+    return json.loads(response.content)
+
+
+@pytest.mark.parametrize("encode", [False, True], ids=["legacy", "encoded"])
+def test_saved_history_round_trips(client, encode):
+    history = make_history()
+    sent = main.encode_entity_history(history, keyframe_interval=3) if encode else history
+    name = f"history-{uuid.uuid4().hex}"
+    response = client.post("/saveRecord", json={"record": {"name": name, "entityHistory": sent}})
+    assert response.status_code == 200
+
+    assert saved_record(client, name)["entityHistory"] == history
+    delta = saved_record(client, name, history="delta")["entityHistory"]
+    assert main.decode_entity_history(delta) == history
+
+    step = client.get("/getRecord/history", params={"record_name": name, "step": 4}).json()
+    assert step["entities"] == history[4]["previousState"]
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+import main
+from test_jobs import wait_for_job
+
+
+def make_samples(seed, size=60):
+    return [float(value) for value in np.random.default_rng(seed).gamma(3.0, 2.0, size)]
+
+
+@pytest.fixture
+def fitted_sets(monkeypatch):
+    # Names of the sample sets each fitting pass was given
+    calls = []
+    fit = main.fit_many_samples_before_deadline
+
+    def recording_fit(samples_by_name, *args, **kwargs):
+        calls.append(sorted(samples_by_name))
+        return fit(samples_by_name, *args, **kwargs)
+
+    monkeypatch.setattr(main, "fit_many_samples_before_deadline", recording_fit)
+    return calls
+
+
+def test_batch_matches_single_fits(client):
+    sets = {"a": make_samples(1), "b": make_samples(2)}
+    response = client.post("/fitDistribution/batch", json={"sample_sets": {
+        name: {"samples": samples} for name, samples in sets.items()}})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["partial"] is False and list(body["results"]) == ["a", "b"]
+
+    for name, samples in sets.items():
+        main.result_cache.backend.clear()
+        single = client.post("/fitDistribution", json={"samples": samples}).json()
+        assert body["results"][name]["distributions"] == single["distributions"]
+
+
+def test_families_per_set_and_per_batch(client):
+    response = client.post("/fitDistribution/batch", json={
+        "distributions": ["norm", "expon"],
+        "sample_sets": {"own": {"samples": make_samples(1), "distributions": ["gamma"]},
+                        "batch": {"samples": make_samples(1)}}})
+    results = response.json()["results"]
+    assert [d["name"] for d in results["own"]["distributions"]] == ["gamma"]
+    assert {d["name"] for d in results["batch"]["distributions"]} <= {"norm", "expon"}
+
+
+def test_identical_sets_are_fitted_once(client, fitted_sets):
+    samples = make_samples(3)
+    response = client.post("/fitDistribution/batch", json={"sample_sets": {
+        "first": {"samples": samples}, "copy": {"samples": samples}, "other": {"samples": make_samples(4)},
+        "other families": {"samples": samples, "distributions": ["norm"]}}})
+    results = response.json()["results"]
+    assert fitted_sets == [["first", "other", "other families"]]
+    assert results["copy"] == results["first"]
+
+
+def test_batch_and_single_fits_share_the_cache(client, fitted_sets):
+    cached, new = make_samples(5), make_samples(6)
+    client.post("/fitDistribution", json={"samples": cached})
+    client.post("/fitDistribution/batch", json={"sample_sets": {"cached": {"samples": cached},
+                                                                "new": {"samples": new}}})
+    client.post("/fitDistribution", json={"samples": new})
+    # The single fit of new was served from the batch's cache entry
+    assert fitted_sets == [["samples"], ["new"]]
+
+
+def test_partial_batches_are_not_cached(client, monkeypatch):
+    def cut_short(samples_by_name, *args, **kwargs):
+        return {name: ([], 0.0, 1.0) for name in samples_by_name}, True
+
+    monkeypatch.setattr(main, "fit_many_samples_before_deadline", cut_short)
+    samples = make_samples(7)
+    body = client.post("/fitDistribution/batch", json={"sample_sets": {"a": {"samples": samples}}}).json()
+    assert body["partial"] is True
+    assert "error" in body["results"]["a"]
+    assert main.result_cache.get(*main.get_fit_cache_entry(samples, main.FIT_DISTRIBUTIONS, 200)) is None
+
+
+def test_batch_size_is_capped(client, monkeypatch):
+    monkeypatch.setattr(main, "FIT_BATCH_MAX_SETS", 2)
+    sample_sets = {str(i): {"samples": [1.0, 2.0, 3.0]} for i in range(3)}
+    assert client.post("/fitDistribution/batch", json={"sample_sets": sample_sets}).status_code == 413
+
+
+@pytest.mark.parametrize("body", [
+    {"sample_sets": {"a": {"samples": [1.0]}}},
+    {"sample_sets": {"a": {"samples": [1.0, 2.0], "distributions": ["cauchy"]}}},
+    {"sample_sets": {"a": {"samples": [1.0, 2.0]}}, "distributions": ["cauchy"]},
+])
+def test_invalid_batches_are_rejected(client, body):
+    assert client.post("/fitDistribution/batch", json=body).status_code == 422
+
+
+def test_batch_job(client):
+    body = {"sample_sets": {"a": {"samples": make_samples(8)}, "b": {"samples": make_samples(9)}}}
+    response = client.post("/jobs/fitDistribution/batch", json=body)
+    assert response.status_code == 202
+    summary = wait_for_job(client, response.json()["job_id"])
+    assert summary["status"] == "done"
+
+    job_result = client.get(f"/jobs/{summary['job_id']}/result").json()
+    main.result_cache.backend.clear()
+    expected = client.post("/fitDistribution/batch", json=body).json()
+    expected.pop("partial")
+    assert job_result == expected
@@ -0,0 +1,150 @@
+import numpy as np
+import pytest
+
+import main
+
+
+def fitted_params(fitted):
+    fit_dists, _, _ = fitted
+    return {fit_dist["name"]: fit_dist["params"] for fit_dist in fit_dists}
+
+
+def test_pool_fits_match_in_process_fits(client, monkeypatch):
+    samples_dict = {"a": np.random.default_rng(0).normal(2, 1, 200),
+                    "b": np.random.default_rng(1).gamma(2, 1, 200)}
+    assert main.use_fit_pool()
+    pooled = main.fit_many_samples_to_distributions(samples_dict)
+
+    monkeypatch.setattr(main, "fit_executor", None)
+    in_process = main.fit_many_samples_to_distributions(samples_dict)
+
+    for name in samples_dict:
+        assert [d["name"] for d in pooled[name][0]] == [d["name"] for d in in_process[name][0]]
+        assert fitted_params(pooled[name]) == fitted_params(in_process[name])
+
+
+def test_fit_many_samples_reports_progress(client):
+    progress = []
+    results = main.fit_many_samples_to_distributions(
+        {"a": np.random.default_rng(0).normal(size=100), "b": np.random.default_rng(1).normal(size=100)},
+        distributions=["norm", "gamma", "t"], on_progress=lambda completed, total: progress.append((completed, total)))
+
+    assert set(results) == {"a", "b"}
+    assert progress == [(i, 6) for i in range(1, 7)]
+
+
+def test_distributions_per_sample_set(client):
+    results = main.fit_many_samples_to_distributions(
+        {"a": np.random.default_rng(0).normal(size=100), "b": np.random.default_rng(1).normal(size=100)},
+        distributions={"a": ["norm"], "b": ["gamma", "uniform"]})
+
+    assert {d["name"] for d in results["a"][0]} == {"norm"}
+    assert {d["name"] for d in results["b"][0]} == {"gamma", "uniform"}
+
+
+def test_rank_fitted_distributions_puts_failed_fits_last():
+    fits = {"a": (None, {"sumsquare_error": np.nan}), "b": ((1,), {"sumsquare_error": 2.0}),
+            "c": ((1,), {"sumsquare_error": 1.0})}
+    assert main.rank_fitted_distributions(fits) == ["c", "b", "a"]
+
+
+def test_fit_distribution_endpoint(client):
+    samples = np.random.default_rng(0).normal(5, 2, 300).tolist()
+    response = client.post("/fitDistribution", json={"samples": samples})
+
+    assert response.status_code == 200
+    distributions = response.json()["distributions"]
+    assert {d["name"] for d in distributions} <= set(main.FIT_DISTRIBUTIONS)
+    norm = next(d for d in distributions if d["name"] == "norm")
+    assert norm["params"]["loc"] == pytest.approx(np.mean(samples), abs=0.01)
+    assert len(norm["x"]) == len(norm["p"])
+
+
+def baseline_samples(seed):
+    rng = np.random.default_rng(seed)
+    return [rng.gamma(2, 1.5, 100), rng.normal(3, 1, 100), rng.lognormal(0, 0.5, 200),
+            rng.standard_t(4, 150), rng.beta(2, 5, 100)][seed % 5]
+
+
+def fit_all_families(samples):
+    return {fit_name: main.fit_closed_form_distribution(samples, fit_name)
+            or main.fit_single_distribution(samples, fit_name) for fit_name in main.FIT_DISTRIBUTIONS}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_fits_are_at_least_as_likely_as_fitter(seed):
+    from fitter import Fitter
+    samples = baseline_samples(seed)
+    baseline = Fitter(samples, distributions=main.FIT_DISTRIBUTIONS)
+    baseline.fit(max_workers=1)
+    fits = fit_all_families(samples)
+
+    for fit_name in main.FIT_DISTRIBUTIONS:
+        dist = getattr(main.stats, fit_name)
+        baseline_log_lik = np.sum(dist.logpdf(samples, *baseline.fitted_param[fit_name]))
+        log_lik = np.sum(dist.logpdf(samples, *fits[fit_name][0]))
+        assert np.isfinite(log_lik), fit_name
+        assert log_lik >= baseline_log_lik - 1e-3 * abs(baseline_log_lik), fit_name
+
+    # Fitter's best family stays at the top, up to a near tie with a family that nests it
+    baseline_ranking = list(baseline.df_errors.sort_values("sumsquare_error").index)
+    ranking = main.rank_fitted_distributions(fits)
+    assert baseline_ranking[0] in ranking[:2]
+    assert fits[ranking[0]][1]["sumsquare_error"] <= \
+        baseline.df_errors.loc[baseline_ranking[0], "sumsquare_error"] * 1.01
+
+
+def test_gamma_guess_starts_below_the_samples():
+    samples = np.random.default_rng(0).gamma(2, 1.5, 100)
+    a, loc, scale = main.guess_gamma(samples)
+    assert loc < samples.min()
+    assert a * scale + loc == pytest.approx(samples.mean())
+    assert np.isfinite(np.sum(main.stats.gamma.logpdf(samples, a, loc, scale)))
+
+
+@pytest.mark.parametrize("fit_name", sorted(main.LOG_LIKELIHOODS))
+def test_log_likelihood_gradients(fit_name):
+    samples = np.random.default_rng(3).gamma(2, 1, 50)
+    params = np.array(main.WARM_START_GUESSES[fit_name](samples))
+    free = main.to_free_parameters(fit_name, params, samples)
+    np.testing.assert_allclose(main.from_free_parameters(fit_name, free, samples)[0], params)
+
+    log_lik, gradient = main.LOG_LIKELIHOODS[fit_name](params, samples)
+    assert log_lik == pytest.approx(np.sum(getattr(main.stats, fit_name).logpdf(samples, *params)))
+
+    def free_log_lik(free):
+        return main.LOG_LIKELIHOODS[fit_name](main.from_free_parameters(fit_name, free, samples)[0], samples)[0]
+
+    steps = np.eye(len(free)) * 1e-6
+    numeric = [(free_log_lik(free + step) - free_log_lik(free - step)) / 2e-6 for step in steps]
+    _, jacobian = main.from_free_parameters(fit_name, free, samples)
+    np.testing.assert_allclose(jacobian.T @ np.asarray(gradient), numeric, rtol=1e-5, atol=1e-5)
+
+
+def test_fit_worse_than_its_start_falls_back_to_fitter(monkeypatch):
+    from types import SimpleNamespace
+    from fitter import Fitter
+    samples = np.random.default_rng(0).gamma(2, 1.5, 100)
+    start = main.guess_gamma(samples)
+    # An optimizer that wanders off to a much worse point than where it started
+    worse = main.to_free_parameters("gamma", (start[0] * 20, start[1], start[2]), samples)
+    monkeypatch.setattr(main, "optimize", SimpleNamespace(minimize=lambda *args, **kwargs: SimpleNamespace(x=worse)))
+    assert main.fit_maximum_likelihood(samples, "gamma", start) is None
+
+    baseline = Fitter(samples, distributions=["gamma"])
+    baseline.fit(max_workers=1)
+    fit_params, _ = main.fit_single_distribution(samples, "gamma")
+    np.testing.assert_allclose(fit_params, baseline.fitted_param["gamma"])
+
+
+def test_fit_metrics_match_scipy():
+    samples = np.random.default_rng(1).gamma(2, 1, 300)
+    fit_params = main.stats.gamma.fit(samples)
+    metrics = main.get_fit_metrics(samples, "gamma", fit_params)
+
+    ks_statistic, ks_pvalue = main.stats.kstest(samples, main.stats.gamma(*fit_params).cdf)
+    y, edges = np.histogram(samples, bins=100, density=True)
+    pdf_fitted = main.stats.gamma.pdf((edges[:-1] + edges[1:]) / 2, *fit_params)
+    assert metrics["ks_statistic"] == pytest.approx(ks_statistic)
+    assert metrics["ks_pvalue"] == pytest.approx(ks_pvalue)
+    assert metrics["kl_div"] == pytest.approx(main.stats.entropy(pdf_fitted + 1e-10, y + 1e-10))
@@ -0,0 +1,176 @@
+import numpy as np
+import pytest
+
+import main
+from conftest import make_entities, make_variables, translation_body
+
+
+def make_bootstrap(entities=None, **kwargs):
+    variables = make_variables(2)
+    if entities is None:
+        entities = make_entities(30, 2)
+    return main.IncrementalBootstrap(entities, variables[:-1], variables[-1], num_samples=50, n_records=20,
+                                     seed=0, **kwargs)
+
+
+def assert_statistics_match_slots(bootstrap):
+    live_rows = set(bootstrap.row_ids.values())
+    assert set(np.unique(bootstrap.slots)) <= live_rows
+    gram, moment = bootstrap.gram.copy(), bootstrap.moment.copy()
+    bootstrap._rebuild()
+    np.testing.assert_allclose(gram, bootstrap.gram, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(moment, bootstrap.moment, rtol=1e-9, atol=1e-9)
+
+
+def test_edits_keep_statistics_consistent_with_slots():
+    bootstrap = make_bootstrap()
+    rng = np.random.default_rng(1)
+    new_entities = make_entities(20, 2, seed=5)
+    for i, entity in enumerate(new_entities):
+        ids = list(bootstrap.row_ids)
+        bootstrap.apply_delta(
+            upserts=[{**entity, "id": f"new{i}"}, {**entity, "id": ids[rng.integers(len(ids))]}],
+            deletes=[ids[rng.integers(len(ids))]])
+    assert_statistics_match_slots(bootstrap)
+
+
+def test_coefficients_match_a_direct_fit_of_the_slots():
+    bootstrap = make_bootstrap()
+    bootstrap.apply_delta(upserts=[{"id": "extra", "x0": 5, "x1": 5, "y": 18}], deletes=["3"])
+    samples = bootstrap.parameter_samples(make_variables(2)[:-1], {"x0": "b_x0", "x1": "b_x1"})
+
+    X, y = bootstrap._design(bootstrap.slots)
+    for b in range(len(X)):
+        expected = np.linalg.lstsq(X[b], y[b], rcond=None)[0]
+        assert samples["b_x0"][b] == pytest.approx(expected[0])
+        assert samples["b_x1"][b] == pytest.approx(expected[1])
+        assert samples["intercept"][b] == pytest.approx(expected[2])
+
+
+def test_deleted_rows_leave_every_slot():
+    bootstrap = make_bootstrap()
+    row = bootstrap.row_ids["0"]
+    bootstrap.apply_delta(deletes=["0"])
+    assert "0" not in bootstrap.row_ids
+    assert not np.any(bootstrap.slots == row)
+
+
+def test_entity_missing_a_value_is_dropped():
+    entities = make_entities(30, 2)
+    bootstrap = make_bootstrap(entities)
+    bootstrap.apply_delta(upserts=[{"id": "1", "x0": 1.0, "x1": None, "y": 2.0}])
+    assert "1" not in bootstrap.row_ids
+    assert_statistics_match_slots(bootstrap)
+
+
+def test_removing_the_last_entity_is_rejected():
+    bootstrap = make_bootstrap([{"id": "only", "x0": 1, "x1": 2, "y": 3}])
+    with pytest.raises(ValueError):
+        bootstrap.apply_delta(deletes=["only"])
+
+
+def test_columnar_entities_skip_incomplete_rows():
+    columns = main.EntityColumns(ids=["a", "b", "c"], values={"x0": [1, 2, 0], "x1": [1, 0, 3], "y": [1, 2, 3]},
+                                 nulls={"x0": [False, False, True], "x1": [False, True, False]})
+    bootstrap = make_bootstrap(columns)
+    assert list(bootstrap.row_ids) == ["a"]
+
+
+def test_session_lifecycle(client):
+    created = client.post("/translate/sessions", json=translation_body())
+    assert created.status_code == 200
+    session_id = created.json()["session_id"]
+    assert set(created.json()["priors_results"]) == {"b_x0", "intercept"}
+
+    updated = client.post(f"/translate/sessions/{session_id}",
+                          json={"upserts": [{"id": "new", "x0": 4.0, "y": 7.0}], "deletes": ["0", "1"]})
+    assert updated.status_code == 200
+    assert set(updated.json()["priors_results"]) == {"b_x0", "intercept"}
+
+    assert client.delete(f"/translate/sessions/{session_id}").status_code == 200
+    assert client.post(f"/translate/sessions/{session_id}", json={}).status_code == 404
+
+
+def test_session_rejects_removing_every_entity(client):
+    session_id = client.post("/translate/sessions", json=translation_body()).json()["session_id"]
+    response = client.post(f"/translate/sessions/{session_id}", json={"deletes": [str(i) for i in range(40)]})
+    assert response.status_code == 422
+
+    # The session is still usable afterwards
+    assert client.post(f"/translate/sessions/{session_id}", json={}).status_code == 200
+
+
+def test_rejected_edit_changes_nothing():
+    bootstrap = make_bootstrap(make_entities(3, 2))
+    slots = bootstrap.slots.copy()
+    with pytest.raises(ValueError):
+        bootstrap.apply_delta(upserts=[{"id": "new", "x0": 1, "x1": 2, "y": 3}], deletes=["0", "1", "2"])
+    assert list(bootstrap.row_ids) == ["0", "1", "2"]
+    assert np.array_equal(bootstrap.slots, slots)
+
+
+@pytest.mark.parametrize("entities", [
+    [{**entity, "id": int(entity["id"])} for entity in make_entities(30, 2)],
+    [{key: value for key, value in entity.items() if key != "id"} for entity in make_entities(30, 2)],
+    main.EntityColumns(values={name: [entity[name] for entity in make_entities(30, 2)] for name in ("x0", "x1", "y")}),
+], ids=["int ids", "no ids", "columns without ids"])
+def test_ids_are_matched_as_strings(entities):
+    # Entities without ids are known by their index
+    bootstrap = make_bootstrap(entities)
+    bootstrap.apply_delta(upserts=[{"id": 1, "x0": 1.0, "x1": 1.0, "y": 9.0}], deletes=[0, "2"])
+    assert "0" not in bootstrap.row_ids and "2" not in bootstrap.row_ids
+    assert bootstrap.rows[bootstrap.row_ids["1"]][-1] == 9.0
+    assert len(bootstrap.row_ids) == 28
+
+
+def test_session_with_int_ids_deletes_entities(client):
+    body = translation_body()
+    body["entities"] = [{**entity, "id": int(entity["id"])} for entity in body["entities"]]
+    session_id = client.post("/translate/sessions", json=body).json()["session_id"]
+    assert client.post(f"/translate/sessions/{session_id}", json={"deletes": ["0", 1]}).status_code == 200
+    bootstrap = main.state_store.get(main.TRANSLATION_SESSIONS, session_id)["bootstrap"]
+    assert len(bootstrap.row_ids) == 38
+
+
+def test_session_rejects_upserts_without_id(client):
+    session_id = client.post("/translate/sessions", json=translation_body()).json()["session_id"]
+    response = client.post(f"/translate/sessions/{session_id}", json={"upserts": [{"x0": 4.0, "y": 7.0}]})
+    assert response.status_code == 422
+
+
+def test_rebuild_in_chunks_matches_one_pass(monkeypatch):
+    bootstrap = make_bootstrap()
+    X, y = bootstrap._design(bootstrap.slots)
+    monkeypatch.setattr(main, "BOOTSTRAP_CHUNK_SIZE", 7)
+    bootstrap._rebuild()
+    np.testing.assert_allclose(bootstrap.gram, np.einsum('bni,bnj->bij', X, X))
+    np.testing.assert_allclose(bootstrap.moment, np.einsum('bni,bn->bi', X, y))
+
+
+def test_inserted_row_takes_its_share_of_slots():
+    bootstrap = main.IncrementalBootstrap(make_entities(9, 2), make_variables(2)[:-1], make_variables(2)[-1],
+                                          num_samples=400, n_records=50, seed=0)
+    bootstrap.apply_delta(upserts=[{"id": "new", "x0": 1.0, "x1": 1.0, "y": 5.0}])
+    share = np.mean(bootstrap.slots == bootstrap.row_ids["new"])
+    assert share == pytest.approx(1 / 10, abs=0.01)
+    assert_statistics_match_slots(bootstrap)
+
+
+def test_session_size_is_bounded(client, monkeypatch):
+    monkeypatch.setattr(main, "TRANSLATION_SESSION_MAX_SLOTS", 1000)
+    body = translation_body(num_bootstrap_samples=100, bootstrap_size=11)
+    assert client.post("/translate/sessions", json=body).status_code == 422
+    assert client.post("/translate", json=body).status_code == 200
+
+
+def test_failed_update_leaves_the_stored_session_unchanged(client, monkeypatch):
+    session_id = client.post("/translate/sessions", json=translation_body()).json()["session_id"]
+
+    def failing_translate(session):
+        raise RuntimeError("fit failed")
+
+    monkeypatch.setattr(main, "translate_session", failing_translate)
+    with pytest.raises(RuntimeError):
+        client.post(f"/translate/sessions/{session_id}", json={"deletes": ["0"]})
+    bootstrap = main.state_store.get(main.TRANSLATION_SESSIONS, session_id)["bootstrap"]
+    assert "0" in bootstrap.row_ids and len(bootstrap.row_ids) == 40
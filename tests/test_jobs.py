@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+import main
+from conftest import check_body, translation_body
+
+
+def wait_for_job(client, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        summary = client.get(f"/jobs/{job_id}").json()
+        if summary["status"] in ("done", "failed"):
+            return summary
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+@pytest.mark.parametrize("path, job_path, body", [
+    ("/translate", "/jobs/translate", translation_body()),
+    ("/check", "/jobs/check", check_body(num_checks=4, num_samples=20)),
+])
+def test_job_result_matches_synchronous_endpoint(client, path, job_path, body):
+    response = client.post(job_path, json=body)
+    assert response.status_code == 202
+    summary = wait_for_job(client, response.json()["job_id"])
+    assert summary["status"] == "done"
+    assert summary["progress"] == 1.0
+
+    job_result = client.get(f"/jobs/{summary['job_id']}/result").json()
+    main.result_cache.backend.clear()
+    expected = client.post(path, json=body).json()
+    expected.pop("partial", None)
+    assert job_result == expected
+
+
+def test_finished_job_fills_the_result_cache(client):
+    body = translation_body(seed=3)
+    first = client.post("/jobs/translate", json=body).json()
+    wait_for_job(client, first["job_id"])
+
+    # The repeat is answered from the cache without queueing
+    repeat = client.post("/jobs/translate", json=body).json()
+    assert repeat["status"] == "done"
+    assert client.get(f"/jobs/{repeat['job_id']}/result").status_code == 200
+
+
+def test_failed_job_reports_its_error(client):
+    body = check_body()
+    body["priors"][0] = {"name": "not-a-distribution", "params": {}}
+    summary = wait_for_job(client, client.post("/jobs/check", json=body).json()["job_id"])
+
+    assert summary["status"] == "failed"
+    assert summary["error"]
+    assert client.get(f"/jobs/{summary['job_id']}/result").status_code == 409
+
+
+def test_unfinished_job_result_is_a_conflict(client, monkeypatch):
+    job = {"job_id": "queued-job", "kind": "check", "status": main.JobStatus.QUEUED, "progress": 0.0,
+           "error": None, "created_at": time.time(), "finished_at": None, "data": None, "result": None}
+    monkeypatch.setitem(main.jobs, "queued-job", job)
+
+    response = client.get("/jobs/queued-job/result")
+    assert response.status_code == 409
+    assert response.json()["detail"]["status"] == "queued"
+
+
+def test_unknown_job_is_not_found(client):
+    assert client.get("/jobs/missing").status_code == 404
+    assert client.get("/jobs/missing/result").status_code == 404
+
+
+def test_full_queue_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(main, "JOB_QUEUE_LIMIT", 0)
+    response = client.post("/jobs/check", json=check_body())
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+
+
+def test_finished_jobs_are_pruned_after_retention(client, monkeypatch):
+    job = {"job_id": "old-job", "kind": "check", "status": main.JobStatus.DONE, "progress": 1.0,
+           "error": None, "created_at": 0, "finished_at": time.time() - main.JOB_RETENTION - 1,
+           "data": None, "result": None}
+    monkeypatch.setitem(main.jobs, "old-job", job)
+    with main.jobs_lock:
+        main.prune_jobs()
+    assert "old-job" not in main.jobs
+
+
+def test_events_stream_until_the_job_finishes(client):
+    job_id = client.post("/jobs/check", json=check_body(seed=9)).json()["job_id"]
+    with client.stream("GET", f"/jobs/{job_id}/events") as response:
+        events = [line for line in response.iter_lines() if line.startswith("data: ")]
+
+    assert events
+    assert '"status": "done"' in events[-1]
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+import main
+
+
+def scipy_kdes(samples, x_values):
+    return np.array([stats.gaussian_kde(row)(x_values) for row in samples])
+
+
+@pytest.mark.parametrize("num_checks, num_samples", [(5, 40), (30, 200)])
+def test_batched_kde_matches_scipy(num_checks, num_samples):
+    rng = np.random.default_rng(0)
+    samples = rng.normal(loc=rng.normal(size=(num_checks, 1)), scale=2, size=(num_checks, num_samples))
+    x_values = np.linspace(samples.min(), samples.max(), 100)
+
+    density_values, avg_kde, max_density = main.batched_gaussian_kde(samples, x_values)
+
+    expected = scipy_kdes(samples, x_values)
+    # The binned path (large batches) is an approximation; the direct path is exact
+    tolerance = 1e-10 if samples.size <= main.KDE_DIRECT_MAX_SAMPLES else 1e-3
+    np.testing.assert_allclose(density_values, expected, atol=tolerance * expected.max())
+    np.testing.assert_allclose(avg_kde, expected.mean(axis=0), atol=tolerance * expected.max())
+    assert max_density == pytest.approx(density_values.max())
+
+
+def test_binned_kde_matches_direct_kde_with_per_check_grids():
+    rng = np.random.default_rng(1)
+    samples = rng.gamma(2, size=(8, 500))
+    x_values = np.stack([np.linspace(row.min(), row.max(), 100) for row in samples])
+    bandwidths = np.std(samples, axis=1, ddof=1) * samples.shape[1] ** (-1 / 5)
+
+    direct = main.direct_gaussian_kde(samples, bandwidths, x_values)
+    binned = main.binned_gaussian_kde(samples, bandwidths, x_values)
+    chunked = main.binned_gaussian_kde(samples, bandwidths, x_values, max_chunk_elements=1)
+
+    np.testing.assert_allclose(binned, direct, atol=1e-3 * direct.max())
+    # Each chunk bins onto its own grid, so chunking only moves the binning error around
+    np.testing.assert_allclose(chunked, direct, atol=1e-3 * direct.max())
+
+
+def test_constant_check_gets_a_finite_density():
+    samples = np.vstack([np.full(20, 3.0), np.linspace(0, 6, 20)])
+    density_values, _, max_density = main.batched_gaussian_kde(samples, np.linspace(0, 6, 50))
+    assert np.all(np.isfinite(density_values))
+    assert np.isfinite(max_density)
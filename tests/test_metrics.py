@@ -0,0 +1,101 @@
+import json
+import logging
+import re
+
+import main
+from conftest import check_body, translation_body
+
+
+def parse_server_timing(header):
+    # {"name": milliseconds} from "name;dur=1.0, ..."
+    return {name: float(duration) for name, duration in re.findall(r"([\w.]+);dur=([\d.]+)", header)}
+
+
+def test_render_histograms_counters_and_collectors():
+    metrics = main.Metrics(prefix="test")
+    metrics.describe("latency", "histogram", "Latency")
+    metrics.describe("errors_total", "counter", "Errors")
+    metrics.increment("errors_total", kind="a")
+    metrics.increment("errors_total", 2, kind="a")
+    metrics.increment("errors_total", kind='say "hi"\n')
+    for seconds in (0.001, 0.02, 0.02, 100):
+        metrics.observe("latency", seconds, route="/x")
+    metrics.add_collector(lambda: [("queue_depth", {}, 7)])
+
+    lines = metrics.render().splitlines()
+    assert "# TYPE test_latency histogram" in lines
+    assert 'test_errors_total{kind="a"} 3' in lines
+    assert 'test_errors_total{kind="say \\"hi\\"\\n"} 1' in lines
+    assert "test_queue_depth 7" in lines
+    # Buckets are cumulative and the last one counts everything
+    assert 'test_latency_bucket{route="/x",le="0.005"} 1' in lines
+    assert 'test_latency_bucket{route="/x",le="0.025"} 3' in lines
+    assert 'test_latency_bucket{route="/x",le="60.0"} 3' in lines
+    assert 'test_latency_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'test_latency_count{route="/x"} 4' in lines
+    sum_line = next(line for line in lines if line.startswith("test_latency_sum"))
+    assert abs(float(sum_line.split()[-1]) - 100.041) < 1e-9
+
+
+def test_server_timing_sums_spans_with_the_same_name():
+    header = main.format_server_timing([("fit.norm", 0.001), ("fit.norm", 0.002), ("bootstrap", 0.5)], 1.0)
+    assert parse_server_timing(header) == {"fit.norm": 3.0, "bootstrap": 500.0, "total": 1000.0}
+
+
+def test_spans_go_to_the_request_and_the_metrics():
+    spans = []
+    token = main.request_spans.set(spans)
+    try:
+        with main.span("test.stage"):
+            pass
+    finally:
+        main.request_spans.reset(token)
+    assert [name for name, _ in spans] == ["test.stage"]
+    assert 'stage="test.stage"' in main.app_metrics.render()
+
+    # Outside a request only the metrics see it
+    with main.span("test.stage"):
+        pass
+
+
+def test_translate_sends_server_timing(client):
+    response = client.post("/translate", json=translation_body(num_entities=20))
+    assert response.status_code == 200
+    timing = parse_server_timing(response.headers["Server-Timing"])
+    assert {"bootstrap", "serialize", "total"} <= set(timing)
+    assert any(name.startswith("fit.") for name in timing)
+    assert timing["bootstrap"] <= timing["total"]
+    assert response.headers["Timing-Allow-Origin"] == "*"
+
+
+def test_check_sends_server_timing(client):
+    response = client.post("/check", json=check_body())
+    assert response.status_code == 200
+    assert {"check.simulate", "total"} <= set(parse_server_timing(response.headers["Server-Timing"]))
+
+
+def test_metrics_endpoint(client):
+    client.post("/fitDistribution", json={"samples": [1.0, 2.0, 2.5, 3.0, 4.0, 4.5, 5.0, 6.0]})
+    client.get("/jobs/unknown-job")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert re.search(r'prior_weaver_http_request_duration_seconds_count\{method="POST",'
+                     r'route="/fitDistribution",status="200"\} [1-9]', text)
+    # Routes are labelled by template, so ids do not make new series
+    assert 'route="/jobs/{job_id}"' in text and "unknown-job" not in text
+    for name in ("result_cache_hits_total", "record_queue_depth", "fits_pending"):
+        assert f"prior_weaver_{name}" in text
+
+
+def test_json_log_lines_carry_extra_fields():
+    formatter = main.StructuredLogFormatter(json_output=True)
+    record = logging.LogRecord("prior_weaver", logging.WARNING, __file__, 1, "Fit failed", None, None)
+    record.family = "beta"
+    line = json.loads(formatter.format(record))
+    assert line["severity"] == "WARNING" and line["message"] == "Fit failed" and line["family"] == "beta"
+
+    text = main.StructuredLogFormatter().format(record)
+    assert text.endswith("WARNING Fit failed family=beta")
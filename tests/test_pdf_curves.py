@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+import main
+from conftest import translation_body
+
+
+@pytest.mark.parametrize("dist", [stats.norm(0, 1), stats.gamma(1.5), stats.beta(0.5, 0.5, loc=-0.01, scale=1.02),
+                                  stats.t(2)])
+def test_adaptive_curve_is_within_tolerance_of_the_pdf(dist):
+    x_min, x_max = dist.ppf(0.001), dist.ppf(0.999)
+    x, p = main.adaptive_pdf_curve(dist.pdf, x_min, x_max, num_points=100000)
+
+    assert x[0] == x_min and x[-1] == x_max
+    assert np.all(np.diff(x) > 0)
+    np.testing.assert_allclose(p, dist.pdf(x))
+
+    # Linear interpolation between the points is off by little more than the tolerance,
+    # except near the endpoints where a singular density may be left unresolved
+    dense_x = np.linspace(x_min, x_max, 20001)[100:-100]
+    error = np.abs(np.interp(dense_x, x, p) - dist.pdf(dense_x))
+    assert error.max() <= 4 * main.PDF_CURVE_TOLERANCE * p.max()
+
+
+def test_smooth_curve_needs_fewer_points_than_a_sharp_one():
+    wide, _ = main.adaptive_pdf_curve(stats.norm(0, 10).pdf, -30, 30)
+    sharp, _ = main.adaptive_pdf_curve(stats.norm(0, 0.3).pdf, -30, 30)
+    assert len(wide) < len(sharp)
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.linspace(0, 10, 1000)
+    y = np.sin(x)
+    y[537] = 5.0
+
+    sampled_x, sampled_y = main.downsample_lttb(x, y, 50)
+
+    assert len(sampled_x) == 50
+    assert sampled_x[0] == 0 and sampled_x[-1] == 10
+    assert np.all(np.diff(sampled_x) > 0)
+    assert 5.0 in sampled_y
+    np.testing.assert_allclose(sampled_y, np.where(sampled_x == x[537], 5.0, np.sin(sampled_x)))
+
+
+@pytest.mark.parametrize("num_points", [2, 1000, 5000])
+def test_lttb_leaves_short_curves_alone(num_points):
+    x = np.linspace(0, 1, 1000)
+    sampled_x, sampled_y = main.downsample_lttb(x, x ** 2, num_points)
+    assert np.array_equal(sampled_x, x)
+
+
+def test_fitted_curves_respect_curve_points(client):
+    samples = np.random.default_rng(0).gamma(2, size=300).tolist()
+    response = client.post("/fitDistribution", json={"samples": samples, "curve_points": 40}).json()
+    for dist in response["distributions"]:
+        assert 3 <= len(dist["x"]) <= 40
+        assert len(dist["x"]) == len(dist["p"])
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/fitDistribution", {"samples": [1.0, 2.0, 3.0]}),
+    ("/fitDistribution/stream", {"samples": [1.0, 2.0, 3.0]}),
+    ("/fitDistribution/batch", {"sample_sets": {"a": {"samples": [1.0, 2.0, 3.0]}}}),
+    ("/translate", translation_body()),
+])
+@pytest.mark.parametrize("curve_points", [-1, 2, main.MAX_CURVE_POINTS + 1])
+def test_curve_points_out_of_bounds_are_rejected(client, path, body, curve_points):
+    assert client.post(path, json={**body, "curve_points": curve_points}).status_code == 422
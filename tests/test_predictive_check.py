@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import main
+from conftest import check_body, make_entities, make_variables
+
+
+def run_check(num_checks=20, num_samples=50, levels=("distributional",), seed=0, num_predictors=2):
+    variables = make_variables(num_predictors)
+    priors = [{"name": "norm", "params": {"loc": 1, "scale": 0.5}}] * num_predictors + \
+        [{"name": "norm", "params": {"loc": 3, "scale": 1}}]
+    return main.new_predictive_check(make_entities(40, num_predictors), variables[:-1], variables[-1], priors,
+                                     num_checks=num_checks, num_samples=num_samples, seed=seed, levels=levels)
+
+
+def test_simulate_responses_matches_per_check_loop():
+    rng = np.random.default_rng(0)
+    parameter_samples = rng.normal(size=(7, 3))
+    shared = rng.normal(size=(11, 2))
+    per_check = rng.normal(size=(7, 11, 2))
+
+    expected_shared = [shared @ params[:-1] + params[-1] for params in parameter_samples]
+    expected_per_check = [X @ params[:-1] + params[-1] for X, params in zip(per_check, parameter_samples)]
+    np.testing.assert_allclose(main.simulate_responses(parameter_samples, shared), expected_shared)
+    np.testing.assert_allclose(main.simulate_responses(parameter_samples, per_check), expected_per_check)
+
+
+def test_predictive_check_shapes_and_responses():
+    results = run_check()["distributional"]
+
+    assert results["parameter_samples"].shape == (20, 3)
+    assert results["predictor_samples"].shape == (50, 2)
+    assert results["response_values"].shape == (20, 50)
+    assert results["density_values"].shape == (20, 100)
+    np.testing.assert_allclose(results["response_values"],
+                               main.simulate_responses(results["parameter_samples"], results["predictor_samples"]))
+    assert results["min_response_val"] <= results["response_values"].min()
+    assert results["max_response_val"] >= results["response_values"].max()
+
+
+def test_predictive_check_spans_more_than_one_chunk(monkeypatch):
+    monkeypatch.setattr(main, "CHECK_CHUNK_SIZE", 7)
+    results = run_check(num_checks=20)["distributional"]
+    assert results["parameter_samples"].shape == (20, 3)
+    assert np.unique(results["parameter_samples"][:, 0]).size == 20
+
+
+def test_check_endpoint(client):
+    response = client.post("/check", json=check_body(num_checks=5, num_samples=30))
+    assert response.status_code == 200
+    results = response.json()["check_results"]["distributional"]
+    assert len(results["simulated_results"]) == 5
+
+
+@pytest.mark.parametrize("field, value", [
+    ("num_checks", 0),
+    ("num_checks", main.MAX_PREDICTIVE_CHECKS + 1),
+    ("num_samples", 0),
+    ("num_samples", main.MAX_CHECK_SAMPLES + 1),
+])
+def test_check_rejects_out_of_range_sizes(client, field, value):
+    assert client.post("/check", json=check_body(**{field: value})).status_code == 422
+    assert client.post("/jobs/check", json=check_body(**{field: value})).status_code == 422
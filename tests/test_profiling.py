@@ -0,0 +1,102 @@
+import json
+import os
+
+import pytest
+
+import main
+from conftest import check_body, translation_body
+
+SAMPLES = [1.0, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0, 6.0, 7.5]
+
+
+@pytest.fixture
+def profile_store(tmp_path, monkeypatch):
+    store = main.ProfileStore(str(tmp_path / "profiles"), max_profiles=3)
+    monkeypatch.setattr(main, "profile_store", store)
+    monkeypatch.setattr(main, "PROFILE_TOKEN", "secret")
+    return store
+
+
+def profiled_post(client, path, body, token="secret"):
+    return client.post(path, json=body, headers={"X-Profile-Token": token})
+
+
+def test_token_profiles_the_request(client, profile_store):
+    body = translation_body(num_entities=20, seed=3)
+    plain = client.post("/translate", json=body)
+    response = profiled_post(client, "/translate", body)
+    assert "X-Profile-Id" not in plain.headers
+    # Profiled requests fit in the request thread and skip the cache, with the same result
+    assert response.json() == plain.json()
+
+    profile_id = response.headers["X-Profile-Id"]
+    metadata = profile_store.load_metadata(profile_id)
+    assert metadata["kind"] == "translate" and metadata["reason"] == "header" and metadata["status"] == "ok"
+    assert metadata["payload"]["seed"] == 3
+    assert os.path.exists(profile_store.stats_path(profile_id))
+
+    text = client.get(f"/admin/profiles/{profile_id}", params={"sort": "tottime", "limit": 500}).text
+    assert "fit_single_distribution" in text
+
+
+@pytest.mark.parametrize("token", ["wrong", ""])
+def test_other_tokens_are_not_profiled(client, profile_store, token):
+    response = profiled_post(client, "/fitDistribution", {"samples": SAMPLES}, token)
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert profile_store.list_profiles() == []
+
+
+def test_sampled_requests_are_profiled(client, profile_store, monkeypatch):
+    monkeypatch.setattr(main, "PROFILE_SAMPLE_RATE", 1.0)
+    response = client.post("/check", json=check_body())
+    assert profile_store.load_metadata(response.headers["X-Profile-Id"])["reason"] == "sampled"
+
+
+def test_one_profile_at_a_time(client, profile_store):
+    with main.profile_lock:
+        response = profiled_post(client, "/fitDistribution", {"samples": SAMPLES})
+    assert response.status_code == 200 and "X-Profile-Id" not in response.headers
+
+
+def test_failed_requests_are_saved(client, profile_store, monkeypatch):
+    def failing_fit(*args, **kwargs):
+        raise RuntimeError("fit failed")
+
+    monkeypatch.setattr(main, "fit_many_samples_before_deadline", failing_fit)
+    with pytest.raises(RuntimeError):
+        profiled_post(client, "/fitDistribution", {"samples": SAMPLES})
+    assert [profile["status"] for profile in profile_store.list_profiles()] == ["error"]
+    assert not main.profile_lock.locked()
+
+
+def test_profile_listing_is_newest_first_and_pruned(client, profile_store):
+    ids = [profiled_post(client, "/fitDistribution", {"samples": SAMPLES[:-i]}).headers["X-Profile-Id"]
+           for i in range(1, 5)]
+    profiles = client.get("/admin/profiles").json()["profiles"]
+    assert [profile["id"] for profile in profiles] == ids[:0:-1]
+    assert all("payload" not in profile for profile in profiles)
+    assert not os.path.exists(profile_store.stats_path(ids[0]))
+    assert client.get(f"/admin/profiles/{ids[0]}").status_code == 404
+    # Ids are file names in the store, never paths
+    assert client.get("/admin/profiles/..%2F..%2Fetc%2Fpasswd").status_code == 404
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/fitDistribution", {"samples": SAMPLES}),
+    ("/translate", translation_body(num_entities=20)),
+    ("/check", check_body(num_checks=2)),
+])
+def test_replay_profile(client, profile_store, capsys, tmp_path, path, body):
+    profile_id = profiled_post(client, path, body).headers["X-Profile-Id"]
+    output = str(tmp_path / "replay.prof")
+    main.replay_profile(profile_id, distributions=["norm"], limit=5, output=output)
+    assert f"profile {profile_id} 1x" in capsys.readouterr().out
+    assert os.path.getsize(output) > 0
+
+
+def test_replay_rejects_unknown_kinds(tmp_path):
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps({"id": "x", "kind": "getRecords", "payload": {}, "seconds": 0}))
+    with pytest.raises(ValueError):
+        main.replay_profile(str(path))
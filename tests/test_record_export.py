@@ -0,0 +1,166 @@
+import pytest
+from bson import ObjectId
+
+import main
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+ds = pytest.importorskip("pyarrow.dataset")
+
+
+def make_record(name, task_id="task"):
+    history = [
+        {"operation": "add", "entitiesAffected": ["1"], "previousState": {"1": {"id": "1", "x": 1.0, "y": 2.0}}},
+        {"operation": "add", "entitiesAffected": ["2"],
+         "previousState": {"1": {"id": "1", "x": 1.0, "y": 2.0}, "2": {"id": "2", "x": 3.0, "y": 5.0}}},
+        {"operation": "delete", "entitiesAffected": ["1"], "previousState": {"2": {"id": "2", "x": 3.0, "y": 5.0}}},
+    ]
+    return {
+        "_id": ObjectId(),
+        "name": name,
+        "taskId": task_id,
+        "space": "parameter",
+        "translationTimes": "2",
+        "entities": {"2": {"id": "2", "x": 3.0, "y": 5.0}},
+        "entityHistory": main.encode_entity_history(history, keyframe_interval=2),
+        "parametersDict": {"b_x0": {"selectedDistributionIdx": 1, "distributions": [
+            {"name": "norm", "params": {"loc": 1.0, "scale": 2.0}, "metrics": {"aic": 10.0}},
+            {"name": "t", "params": {"df": 3, "loc": 1.0, "scale": 2.0}, "metrics": {"aic": "n/a"}},
+        ]}},
+        # One legacy result without levels, one per level
+        "predictiveCheckResults": [
+            {"min_response_val": 0, "max_response_val": 10, "max_density_val": 0.5,
+             "simulated_results": [{"params": [1, 2], "dataset": [{"x": 1, "y": 2}, {"x": 2, "y": 4}]}]},
+            {"distributional": {"min_response_val": 0, "max_response_val": 10, "max_density_val": 0.5,
+                                "simulated_results": [{"params": [1], "dataset": [{"y": 3}]}]}},
+        ],
+    }
+
+
+def test_flatten_record():
+    record = make_record("r")
+    tables = main.flatten_record(record)
+    key = {"record_id": str(record["_id"]), "name": "r"}
+
+    assert tables["records"] == [{**key, "taskId": "task", "space": "parameter", "feedback": None, "model": None,
+                                  "startTimeStamp": None, "finishTimeStamp": None, "translationTimes": 2,
+                                  "num_entities": 1, "num_history_steps": 3}]
+    assert tables["entities"] == [{**key, "entity_id": "2", "variable": "x", "value": 3.0},
+                                  {**key, "entity_id": "2", "variable": "y", "value": 5.0}]
+    history = [(row["operation"], row["num_upserts"], row["num_deletes"], row["num_entities"])
+               for row in tables["entity_history"]]
+    # The keyframe at step 2 still counts the change from step 1
+    assert history == [("add", 1, 0, 1), ("add", 1, 0, 2), ("delete", 0, 1, 1)]
+    assert [(row["distribution"], row["selected"]) for row in tables["fitted_distributions"]] == \
+        [("norm", False), ("t", True)]
+    assert tables["fitted_distributions"][1]["metrics"] == {"aic": None}
+    assert [(row["translation"], row["level"]) for row in tables["predictive_checks"]] == \
+        [(0, "distributional"), (1, "distributional")]
+    assert len(tables["predictive_check_samples"]) == 5
+    assert set(tables) == set(main.get_export_schemas())
+
+
+def test_flatten_legacy_record():
+    # Full histories and missing sections flatten too
+    record = {"_id": ObjectId(), "name": "legacy",
+              "entityHistory": [{"operation": "add", "previousState": {"1": {"id": "1", "x": 1}}}]}
+    tables = main.flatten_record(record)
+    assert tables["records"][0]["num_history_steps"] == 1
+    assert tables["entity_history"][0]["num_upserts"] == 1
+    assert not tables["fitted_distributions"] and not tables["predictive_checks"]
+
+
+def make_exporter(tmp_path, records, **kwargs):
+    repository = main.MemoryRecordRepository()
+    repository.insert_many(records)
+    return main.RecordExporter(repository, str(tmp_path / "exports"), **{"batch_size": 2, "settle_seconds": 0, **kwargs})
+
+
+def read_table(exporter, name, file_format):
+    return ds.dataset(f"{exporter.export_dir}/{name}", format="ipc" if file_format == "arrow" else "parquet",
+                      schema=main.get_export_schemas()[name]).to_table()
+
+
+@pytest.mark.parametrize("file_format", ["parquet", "arrow"])
+def test_export_round_trip(tmp_path, file_format):
+    records = [make_record(f"r{i}") for i in range(5)]
+    exporter = make_exporter(tmp_path, records)
+    run = exporter.export(file_format)
+
+    assert run["records"] == 5
+    expected = {name: [] for name in main.get_export_schemas()}
+    for record in records:
+        for name, rows in main.flatten_record(record).items():
+            expected[name].extend(rows)
+    for name, rows in expected.items():
+        assert run["rows"][name] == len(rows)
+        assert read_table(exporter, name, file_format).to_pylist() == \
+            pa.Table.from_pylist(rows, schema=main.get_export_schemas()[name]).to_pylist()
+
+    # One row group per batch of records
+    if file_format == "parquet":
+        assert pq.ParquetFile(exporter.export_dir + "/records/" + f"part-{run['run']}.parquet").num_row_groups == 3
+
+
+def test_export_is_incremental(tmp_path):
+    exporter = make_exporter(tmp_path, [make_record("r0"), make_record("r1")])
+    assert exporter.export()["records"] == 2
+    assert exporter.export()["records"] == 0
+
+    record = make_record("r2")
+    exporter.repository.insert_many([record])
+    run = exporter.export()
+    assert run["records"] == 1
+    state = exporter.load_state()
+    assert state["last_id"] == str(record["_id"])
+    assert [r["records"] for r in state["runs"]] == [2, 1]
+
+    assert exporter.export(full=True)["records"] == 3
+    assert read_table(exporter, "records", "parquet").num_rows == 6
+
+
+def test_export_waits_for_records_to_settle(tmp_path):
+    exporter = make_exporter(tmp_path, [make_record("r0")], settle_seconds=3600)
+    run = exporter.export()
+    assert run["records"] == 0 and run["files"] == []
+    assert exporter.load_state()["last_id"] is None
+
+
+def test_failed_export_leaves_no_files(tmp_path, monkeypatch):
+    exporter = make_exporter(tmp_path, [make_record(f"r{i}") for i in range(4)])
+    flatten = main.flatten_record
+
+    def failing_flatten(record):
+        if record["name"] == "r3":
+            raise ValueError("bad record")
+        return flatten(record)
+
+    monkeypatch.setattr(main, "flatten_record", failing_flatten)
+    with pytest.raises(ValueError):
+        exporter.export()
+    assert not any(path.is_file() for path in (tmp_path / "exports").rglob("*"))
+
+
+def test_one_export_at_a_time(tmp_path):
+    exporter = make_exporter(tmp_path, [])
+    exporter.lock.acquire()
+    try:
+        with pytest.raises(RuntimeError):
+            exporter.export()
+    finally:
+        exporter.lock.release()
+
+
+def test_export_endpoints(client, tmp_path, monkeypatch):
+    exporter = make_exporter(tmp_path, [make_record("r0")])
+    monkeypatch.setattr(main, "record_exporter", exporter)
+    run = client.post("/admin/records/export", params={"format": "arrow"}).json()
+    assert run["records"] == 1 and run["format"] == "arrow"
+    assert client.get("/admin/records/export").json()["runs"] == [run]
+
+    exporter.lock.acquire()
+    try:
+        assert client.post("/admin/records/export").status_code == 409
+    finally:
+        exporter.lock.release()
+    assert client.post("/admin/records/export", params={"format": "csv"}).status_code == 422
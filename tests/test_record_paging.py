@@ -0,0 +1,104 @@
+import json
+import uuid
+
+import pytest
+from bson import ObjectId
+
+import main
+
+
+def make_records(num_records, task_id="task"):
+    return [{"_id": ObjectId(), "name": f"record-{i}", "taskId": task_id, "space": "parameter",
+             "feedback": None, "entityHistory": [{"previousState": {"a": {"x": i}}}]}
+            for i in range(num_records)]
+
+
+def all_pages(list_page, limit):
+    # Follow the cursor until a short page, as the Admin page does
+    records, after = [], None
+    while True:
+        page = list_page(after, limit)
+        records.extend(page)
+        if len(page) < limit:
+            return records
+        after = page[-1]["_id"]
+
+
+@pytest.mark.parametrize("limit", [1, 3, 10, 11])
+def test_page_records_visits_each_record_once(limit):
+    records = make_records(10)
+    shuffled = records[::2] + records[1::2]
+    paged = all_pages(lambda after, limit: main.page_records(shuffled, after=after, limit=limit), limit)
+    assert [record["_id"] for record in paged] == [record["_id"] for record in records]
+
+
+def test_page_records_filters_and_projects():
+    records = make_records(4, "a") + make_records(3, "b")
+    page = main.page_records(records, filters={"taskId": "b"}, fields=["name"])
+    assert page == [{"_id": record["_id"], "name": record["name"]} for record in records[4:]]
+
+
+@pytest.mark.parametrize("fields", [main.RECORD_SUMMARY_FIELDS, None])
+def test_disk_repository_pages(tmp_path, fields):
+    # Summary pages come from the index, others from reading the file
+    repository = main.DiskRecordRepository(str(tmp_path / "records.jsonl"))
+    records = make_records(5, "a") + make_records(4, "b")
+    repository.insert_many(records[:6])
+    repository.insert_many(records[6:])
+
+    for repository in (repository, main.DiskRecordRepository(repository.path)):
+        paged = all_pages(lambda after, limit: repository.list_records({"taskId": "b"}, fields, after, limit), 2)
+        assert [record["_id"] for record in paged] == [record["_id"] for record in records[5:]]
+        assert repository.find_record("record-2", ["taskId"])["taskId"] == "a"
+
+
+def test_writer_pages_stored_and_unsaved_records():
+    writer = main.RecordWriter(main.MemoryRecordRepository())
+    records = make_records(6)
+    writer.repository.insert_many(records[::2])
+    for record in records[1::2]:
+        writer.save(dict(record))
+
+    paged = all_pages(lambda after, limit: writer.list_records(None, ["name"], after, limit), 4)
+    assert [record["name"] for record in paged] == [record["name"] for record in records]
+
+
+def test_get_records_pages_by_cursor(client):
+    task_id = uuid.uuid4().hex
+    names = [f"{task_id}-{i}" for i in range(5)]
+    for name in names:
+        response = client.post("/saveRecord", json={"record": {"name": name, "taskId": task_id}})
+        assert response.status_code == 200
+
+    pages, cursor = [], None
+    while True:
+        params = {"taskId": task_id, "limit": 2, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/getRecords", params=params).json()
+        pages.append([record["name"] for record in body["records"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == [names[:2], names[2:4], names[4:]]
+    assert set(body["records"][0]) == set(main.RECORD_SUMMARY_FIELDS)
+
+
+def test_get_records_rejects_bad_cursors_and_limits(client):
+    assert client.get("/getRecords", params={"cursor": "not-an-id"}).status_code == 400
+    assert client.get("/getRecords", params={"limit": 0}).status_code == 422
+    assert client.get("/getRecords", params={"limit": main.RECORD_MAX_PAGE_SIZE + 1}).status_code == 422
+
+
+def test_get_record_selects_fields(client):
+    name = uuid.uuid4().hex
+    client.post("/saveRecord", json={"record": {"name": name, "taskId": "t", "feedback": "ok"}})
+    record = json.loads(client.get("/getRecord", params={"record_name": name, "fields": "feedback"}).content)
+    assert set(record) == {"_id", "feedback"}
+    assert client.get("/getRecord", params={"record_name": uuid.uuid4().hex}).status_code == 404
+
+
+def test_record_json_is_chunked():
+    record = {"name": "r", "entityHistory": main.encode_entity_history(
+        [{"previousState": {str(i): {"x": i} for i in range(step)}} for step in range(20)], 5)}
+    chunks = list(main.iter_record_json(record, chunk_size=100))
+    assert len(chunks) > 1
+    assert json.loads("".join(chunks))["entityHistory"] == main.decode_entity_history(record["entityHistory"])
@@ -0,0 +1,117 @@
+import time
+
+import pytest
+from bson.json_util import loads
+
+import main
+
+
+class RejectingRepository(main.MemoryRecordRepository):
+    """Fails every batch that holds a record named "poison", and the first `outages` batches."""
+
+    def __init__(self, outages=0):
+        super().__init__()
+        self.outages = outages
+        self.attempts = 0
+
+    def insert_many(self, records):
+        self.attempts += 1
+        if self.outages:
+            self.outages -= 1
+            raise ConnectionError("repository is down")
+        if any(record.get("name") == "poison" for record in records):
+            raise ValueError("rejected record")
+        super().insert_many(records)
+
+
+def prepare(record):
+    if record.get("name") == "unpreparable":
+        raise AttributeError("bad history")
+    return {**record, "prepared": True}
+
+
+@pytest.fixture
+def make_writer(tmp_path):
+    writers = []
+
+    def make_writer(repository, **kwargs):
+        writer = main.RecordWriter(repository, batch_size=10, max_backoff=0.001, prepare=prepare,
+                                   max_attempts=3, dead_letter_path=str(tmp_path / "dead.jsonl"), **kwargs)
+        writers.append(writer)
+        return writer
+
+    yield make_writer
+    for writer in writers:
+        writer.stop(timeout=5)
+
+
+def save_all(writer, names):
+    for name in names:
+        writer.save({"name": name})
+
+
+def dead_letters(writer):
+    with open(writer.dead_letter_path) as f:
+        return [loads(line) for line in f]
+
+
+def wait_until_saved(writer, count, timeout=10):
+    deadline = time.time() + timeout
+    while writer.saved + writer.dead_lettered < count and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_unpreparable_record_is_dead_lettered_and_later_records_are_stored(make_writer):
+    repository = main.MemoryRecordRepository()
+    writer = make_writer(repository)
+    save_all(writer, ["a", "unpreparable", "b"])
+    writer.start()
+    wait_until_saved(writer, 3)
+    save_all(writer, ["c"])
+    writer.stop(timeout=5)
+
+    assert [record["name"] for record in repository.records] == ["a", "b", "c"]
+    assert all(record["prepared"] for record in repository.records)
+    assert writer.stats()["dead_lettered"] == 1
+    [entry] = dead_letters(writer)
+    assert entry["stage"] == "prepare"
+    assert entry["record"]["name"] == "unpreparable"
+    assert "bad history" in entry["error"]
+
+
+def test_rejected_record_is_isolated_from_its_batch(make_writer):
+    repository = RejectingRepository()
+    writer = make_writer(repository)
+    names = [f"r{i}" for i in range(7)]
+    save_all(writer, names[:3] + ["poison"] + names[3:])
+    writer.start()
+    wait_until_saved(writer, 8)
+    save_all(writer, ["after"])
+    writer.stop(timeout=5)
+
+    assert sorted(record["name"] for record in repository.records) == sorted(names + ["after"])
+    [entry] = dead_letters(writer)
+    assert entry["stage"] == "insert"
+    assert entry["record"]["name"] == "poison"
+    assert entry["record"]["prepared"] is True
+
+
+def test_outage_shorter_than_the_retries_loses_nothing(make_writer):
+    repository = RejectingRepository(outages=2)
+    writer = make_writer(repository)
+    save_all(writer, ["a", "b"])
+    writer.start()
+    writer.stop(timeout=5)
+
+    assert [record["name"] for record in repository.records] == ["a", "b"]
+    assert writer.failed_attempts == 2
+    assert writer.dead_lettered == 0
+
+
+def test_dead_letters_are_counted_in_metrics(make_writer):
+    writer = make_writer(main.MemoryRecordRepository())
+    before = main.app_metrics.values.get(("records_dead_lettered_total", (("stage", "prepare"),)), 0)
+    save_all(writer, ["unpreparable"])
+    writer.start()
+    writer.stop(timeout=5)
+    assert main.app_metrics.values[("records_dead_lettered_total", (("stage", "prepare"),))] == before + 1
@@ -0,0 +1,97 @@
+import msgpack
+import numpy as np
+import pytest
+
+from conftest import check_body, translation_body
+
+FORMATS = ["columnar", "msgpack"]
+
+
+def decode(value):
+    # Undo encode_array: float32 blobs become arrays, lists stay lists
+    if isinstance(value, dict) and set(value) == {"dtype", "shape", "data"}:
+        return np.frombuffer(value["data"], dtype=value["dtype"]).reshape(value["shape"])
+    if isinstance(value, dict):
+        return {key: decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    return value
+
+
+def post(client, path, body, response_format):
+    response = client.post(path, params={"format": response_format}, json=body)
+    assert response.status_code == 200
+    if response_format == "msgpack":
+        assert response.headers["content-type"] == "application/msgpack"
+        return decode(msgpack.unpackb(response.content, raw=False))
+    return response.json()
+
+
+def assert_same_distributions(decoded, expected):
+    assert isinstance(decoded, list)
+    assert [dist["name"] for dist in decoded] == [dist["name"] for dist in expected]
+    for dist, expected_dist in zip(decoded, expected):
+        assert dist["params"] == expected_dist["params"]
+        assert dist["metrics"] == expected_dist["metrics"]
+        np.testing.assert_allclose(dist["x"], expected_dist["x"], rtol=1e-6)
+        np.testing.assert_allclose(dist["p"], expected_dist["p"], rtol=1e-6, atol=1e-30)
+
+
+@pytest.mark.parametrize("response_format", FORMATS)
+def test_fit_distribution_formats_match_json(client, response_format):
+    body = {"samples": np.random.default_rng(0).normal(5, 2, 200).tolist()}
+    expected = post(client, "/fitDistribution", body, "json")
+    decoded = post(client, "/fitDistribution", body, response_format)
+
+    assert set(decoded) == set(expected) == {"distributions", "partial"}
+    assert_same_distributions(decoded["distributions"], expected["distributions"])
+
+
+@pytest.mark.parametrize("response_format", FORMATS)
+def test_fit_batch_formats_match_json(client, response_format):
+    rng = np.random.default_rng(1)
+    body = {"sample_sets": {"a": {"samples": rng.normal(size=100).tolist()},
+                            "b": {"samples": rng.gamma(2, size=100).tolist()}}}
+    expected = post(client, "/fitDistribution/batch", body, "json")
+    decoded = post(client, "/fitDistribution/batch", body, response_format)
+
+    assert set(decoded["results"]) == {"a", "b"}
+    for name, result in decoded["results"].items():
+        assert_same_distributions(result["distributions"], expected["results"][name]["distributions"])
+
+
+@pytest.mark.parametrize("response_format", FORMATS)
+def test_translate_formats_match_json(client, response_format):
+    expected = post(client, "/translate", translation_body(), "json")
+    decoded = post(client, "/translate", translation_body(), response_format)
+
+    assert set(decoded["priors_results"]) == set(expected["priors_results"])
+    for name, distributions in decoded["priors_results"].items():
+        assert_same_distributions(distributions, expected["priors_results"][name])
+
+
+@pytest.mark.parametrize("response_format", FORMATS)
+def test_check_formats_match_json(client, response_format):
+    body = check_body(num_checks=4, num_samples=25)
+    expected = post(client, "/check", body, "json")["check_results"]["distributional"]
+    decoded = post(client, "/check", body, response_format)["check_results"]["distributional"]
+
+    assert decoded["max_density_val"] == expected["max_density_val"]
+    np.testing.assert_allclose(decoded["x_values"], [point["x"] for point in expected["avg_kde_result"]], rtol=1e-6)
+    # float32 flushes the far tails of the density to zero
+    np.testing.assert_allclose(decoded["avg_kde"], [point["density"] for point in expected["avg_kde_result"]],
+                               rtol=1e-6, atol=1e-30)
+    np.testing.assert_allclose(decoded["params"], [check["params"] for check in expected["simulated_results"]],
+                               rtol=1e-6)
+    np.testing.assert_allclose(decoded["dataset"]["y"],
+                               [[row["y"] for row in check["dataset"]] for check in expected["simulated_results"]],
+                               rtol=1e-5)
+
+
+def test_accept_header_selects_format(client):
+    body = {"samples": np.random.default_rng(2).normal(size=100).tolist()}
+    response = client.post("/fitDistribution", json=body, headers={"Accept": "application/x-msgpack"})
+    assert response.headers["content-type"] == "application/msgpack"
+    response = client.post("/fitDistribution", json=body,
+                           headers={"Accept": "application/vnd.prior-weaver.columnar+json"})
+    assert response.headers["content-type"].startswith("application/vnd.prior-weaver.columnar+json")
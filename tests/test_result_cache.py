@@ -0,0 +1,105 @@
+import pickle
+import time
+
+import numpy as np
+import pytest
+
+import main
+from conftest import check_body, translation_body
+
+
+def entry(size):
+    return np.zeros(size // 8)
+
+
+def stored_size(backend, value):
+    # The disk backend bounds the pickled files, the memory backend the estimated value size
+    if isinstance(backend, main.DiskCacheBackend):
+        return len(pickle.dumps((None, value), protocol=pickle.HIGHEST_PROTOCOL))
+    return main.estimate_size(value)
+
+
+@pytest.fixture(params=["memory", "disk"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return main.MemoryCacheBackend(max_bytes=1000)
+    return main.DiskCacheBackend(str(tmp_path), max_bytes=1000)
+
+
+def test_backend_round_trip_and_clear(backend):
+    backend.set("a", {"value": 1}, None)
+    assert backend.get("a") == {"value": 1}
+    assert backend.get("missing") is None
+    backend.clear()
+    assert backend.get("a") is None
+
+
+def test_backend_evicts_least_recently_used(backend):
+    # Room for three entries, not four
+    backend.max_bytes = int(3.5 * stored_size(backend, entry(300)))
+    for key in "abc":
+        backend.set(key, entry(300), None)
+        time.sleep(0.01)  # distinct mtimes for the disk backend
+    backend.get("a")
+    time.sleep(0.01)
+    backend.set("d", entry(300), None)
+
+    assert backend.get("b") is None
+    for key in "acd":
+        assert backend.get(key) is not None
+
+
+def test_backend_expires_entries(backend):
+    backend.set("old", 1, time.time() - 1)
+    backend.set("new", 2, time.time() + 60)
+    assert backend.get("old") is None
+    assert backend.get("new") == 2
+
+
+def test_memory_backend_skips_values_larger_than_the_bound():
+    backend = main.MemoryCacheBackend(max_bytes=100)
+    backend.set("big", entry(1000), None)
+    assert backend.get("big") is None
+    assert backend.total_bytes == 0
+
+
+def test_keys_ignore_time_budget_but_not_seed():
+    cache = main.ResultCache(main.MemoryCacheBackend(1000))
+    data = main.FitDistributionData(samples=[1, 2, 3])
+    assert cache.make_key("fit", data) == cache.make_key("fit", data.model_copy(update={"time_budget": 1.0}))
+    assert cache.make_key("fit", data) != cache.make_key("other", data)
+
+    translation = main.TranslationData(**translation_body())
+    assert cache.make_key("translate", translation) != \
+        cache.make_key("translate", translation.model_copy(update={"seed": 2}))
+
+
+def test_ttl_applies_to_cached_results():
+    cache = main.ResultCache(main.MemoryCacheBackend(1000), ttl=0.05)
+    cache.set("fit", {"samples": [1]}, "result")
+    assert cache.get("fit", {"samples": [1]}) == "result"
+    time.sleep(0.1)
+    assert cache.get("fit", {"samples": [1]}) is None
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/translate", translation_body()),
+    ("/check", check_body(num_checks=4, num_samples=20)),
+    ("/fitDistribution", {"samples": np.random.default_rng(0).normal(size=100).tolist()}),
+])
+def test_repeated_request_is_served_from_cache(client, monkeypatch, path, body):
+    hits = main.result_cache.hits
+    first = client.post(path, json=body)
+    assert main.result_cache.hits == hits
+
+    # A second identical request must not recompute anything
+    def fail(*args, **kwargs):
+        raise AssertionError("recomputed a cached result")
+    monkeypatch.setattr(main, "fit_many_samples_before_deadline", fail)
+    monkeypatch.setattr(main, "compute_predictive_check", fail)
+    monkeypatch.setattr(main, "compute_translation", fail)
+
+    second = client.post(path, json=body)
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert main.result_cache.hits == hits + 1
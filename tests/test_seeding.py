@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import main
+from conftest import check_body, make_entities, make_variables, translation_body
+
+
+def test_spawn_chunks_depends_only_on_sizes():
+    chunks = main.spawn_chunks(np.random.SeedSequence(3), 25, 10)
+    assert [size for size, _ in chunks] == [10, 10, 5]
+
+    again = main.spawn_chunks(np.random.SeedSequence(3), 25, 10)
+    for (_, first), (_, second) in zip(chunks, again):
+        assert np.array_equal(np.random.default_rng(first).random(4), np.random.default_rng(second).random(4))
+
+
+def bootstrap(seed):
+    variables = make_variables(2)
+    return main.bootstrap_fit_linear_model(make_entities(60, 2), variables[:-1], variables[-1],
+                                           {"x0": "b_x0", "x1": "b_x1"}, num_samples=250, seed=seed)
+
+
+def predictive_check(seed):
+    variables = make_variables(2)
+    priors = [{"name": "norm", "params": {"loc": 1, "scale": 0.5}}] * 2 + [{"name": "t", "params": {"df": 3}}]
+    return main.new_predictive_check(make_entities(40, 2), variables[:-1], variables[-1], priors,
+                                     num_checks=30, num_samples=20, seed=seed)["distributional"]
+
+
+@pytest.mark.parametrize("run, chunk_setting, key", [(bootstrap, "BOOTSTRAP_CHUNK_SIZE", "b_x0"),
+                                                     (predictive_check, "CHECK_CHUNK_SIZE", "parameter_samples")])
+def test_seeded_chunks_are_identical_on_the_pool_and_serially(client, monkeypatch, run, chunk_setting, key):
+    monkeypatch.setattr(main, chunk_setting, 7)
+    assert main.use_fit_pool()
+    pooled = run(seed=11)
+
+    monkeypatch.setattr(main, "fit_executor", None)
+    serial = run(seed=11)
+
+    for key, value in pooled.items():
+        if isinstance(value, np.ndarray):
+            assert np.array_equal(value, serial[key]), key
+    assert not np.array_equal(run(seed=12)[key], serial[key])
+
+
+def test_seeded_endpoints_are_reproducible(client):
+    for path, body in [("/translate", translation_body(seed=4)),
+                       ("/check", check_body(seed=4, num_checks=5, num_samples=20))]:
+        first = client.post(path, json=body).json()
+        main.result_cache.backend.clear()
+        assert client.post(path, json=body).json() == first
+
+
+def test_unseeded_checks_differ(client):
+    body = check_body(num_checks=5, num_samples=20)
+    body.pop("seed")
+    first = client.post("/check", json=body).json()
+    main.result_cache.backend.clear()
+    assert client.post("/check", json=body).json() != first
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+import main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_defers_heavy_modules():
+    # A fresh interpreter: the test session has long since loaded everything
+    script = ("import sys, main; "
+              "print(sorted(m for m in ('scipy.stats', 'fitter', 'pandas', 'sklearn', 'pymongo', 'matplotlib') "
+              "if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True,
+                            env={**os.environ, "LAZY_STARTUP": "1"})
+    assert result.stdout.strip() == "[]"
+
+
+COLD_START_SCRIPT = """
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import main
+from fastapi.testclient import TestClient
+
+samples = [float(v) for v in np.random.default_rng(0).gamma(3, 2, 80)]
+with TestClient(main.app, raise_server_exceptions=False) as client, ThreadPoolExecutor(6) as pool:
+    print(list(pool.map(lambda i: client.post("/fitDistribution", json={"samples": samples[i:]}).status_code,
+                        range(6))))
+"""
+
+
+def test_concurrent_first_requests():
+    # The first requests of a fresh process race to load scipy on the request threads and
+    # fork the fitting pool workers while it loads
+    result = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], cwd=ROOT, capture_output=True, text=True,
+                            check=True, timeout=120,
+                            env={**os.environ, "LAZY_STARTUP": "1", "RESULT_CACHE": "none", "FIT_WORKERS": "2"})
+    assert result.stdout.strip().splitlines()[-1] == str([200] * 6)
+
+
+def test_startup_report(client):
+    report = client.get("/admin/startup").json()
+    assert report["lazy_startup"] is True
+    assert 0 < report["module_load_seconds"] <= report["ready_seconds"]
+    assert report == main.startup_report
@@ -0,0 +1,166 @@
+import threading
+
+import pytest
+
+import main
+from conftest import translation_body
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return main.MemoryStateBackend()
+    return main.SQLiteStateBackend(str(tmp_path / "state.sqlite3"))
+
+
+@pytest.fixture
+def workers(backend):
+    # Two workers sharing one backend, each with its own cache
+    return main.StateStore(backend), main.StateStore(backend)
+
+
+def test_compare_and_set(backend):
+    created = backend.put("ns", "k", 1, expected_version=None)
+    assert created is not None
+    # Creating only succeeds while the key is missing
+    assert backend.put("ns", "k", 2, expected_version=None) is None
+
+    updated = backend.put("ns", "k", 3, expected_version=created)
+    assert updated not in (None, created)
+    assert backend.put("ns", "k", 4, expected_version=created) is None
+    assert backend.get("ns", "k") == (updated, 3)
+
+    assert backend.put("ns", "k", 5) is not None
+    assert backend.get("ns", "k")[1] == 5
+    backend.delete("ns", "k")
+    assert backend.get("ns", "k") is None and backend.version("ns", "k") is None
+
+
+def test_prune_keeps_the_latest_writes(backend):
+    for key in "abcd":
+        backend.put("ns", key, key)
+    backend.put("ns", "a", "again")
+    backend.put("other", "x", 1)
+    backend.prune("ns", 2)
+    assert [key for key in "abcd" if backend.get("ns", key) is not None] == ["a", "d"]
+    assert backend.get("other", "x") is not None
+
+
+def test_workers_see_each_others_writes(workers):
+    first, second = workers
+    first.put("ns", "k", {"value": 1})
+    assert second.get("ns", "k") == {"value": 1}
+    second.put("ns", "k", {"value": 2})
+    assert first.get("ns", "k") == {"value": 2}
+    first.delete("ns", "k")
+    assert second.get("ns", "k", "missing") == "missing"
+
+
+def test_stale_writes_are_rejected(workers):
+    first, second = workers
+    version = first.put("ns", "k", 1)
+    assert second.put("ns", "k", 2, expected_version=version) is not None
+    assert first.put("ns", "k", 3, expected_version=version) is None
+    # The rejected write dropped the stale copy
+    assert first.get("ns", "k") == 2
+
+
+def test_concurrent_updates_are_not_lost(workers):
+    def increment(store):
+        for _ in range(25):
+            store.update("ns", "counter", lambda count: count + 1, default=0, retries=1000)
+
+    threads = [threading.Thread(target=increment, args=(store,)) for store in workers * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert workers[0].get("ns", "counter") == 100
+
+
+def test_update_gives_up_when_the_value_keeps_changing(workers):
+    first, second = workers
+    first.put("ns", "k", 0)
+
+    def interfering(value):
+        second.put("ns", "k", value + 100)
+        return value + 1
+
+    with pytest.raises(RuntimeError):
+        first.update("ns", "k", interfering, retries=3)
+
+
+def test_cached_values_are_served_within_max_staleness(backend):
+    writer, reader = main.StateStore(backend), main.StateStore(backend, max_staleness=3600)
+    writer.put("ns", "k", 1)
+    assert reader.get("ns", "k") == 1
+    writer.put("ns", "k", 2)
+    assert reader.get("ns", "k") == 1
+    reader.invalidate("ns", "k")
+    assert reader.get("ns", "k") == 2
+
+
+def test_listeners_see_each_new_version_once(workers):
+    first, second = workers
+    seen = []
+    second.subscribe("ns", lambda key, value: seen.append((key, value)))
+    first.put("ns", "k", 1)
+    second.get("ns", "k")
+    second.get("ns", "k")
+    first.put("ns", "k", 2)
+    second.get("ns", "k")
+    assert seen == [("k", 1), ("k", 2)]
+
+
+def test_cache_is_bounded(backend):
+    store = main.StateStore(backend, max_cached=2)
+    for key in "abc":
+        store.put("ns", key, key)
+    assert list(store.cache) == [("ns", "b"), ("ns", "c")]
+    assert store.get("ns", "a") == "a"
+
+
+@pytest.fixture
+def shared_state(tmp_path, monkeypatch):
+    # The app and a second worker on one sqlite file
+    backend = main.SQLiteStateBackend(str(tmp_path / "state.sqlite3"))
+    monkeypatch.setattr(main, "state_store", main.StateStore(backend))
+    return main.StateStore(backend)
+
+
+def test_study_settings_are_shared(client, shared_state):
+    assert client.get("/study-settings").json()["task_id"] == "income"
+    changes = dict.fromkeys(["user_name", "task_id", "elicitation_space", "feedback_mode", "load_record",
+                             "record_name"])
+    response = client.post("/admin/study-settings", json={**changes, "task_id": "score"})
+    assert response.json()["task_id"] == "score" and response.json()["user_name"] == "admin"
+
+    shared_state.update("study_settings", "current", lambda settings: {**settings, "feedback_mode": "no_feedback"})
+    settings = client.get("/study-settings").json()
+    assert (settings["task_id"], settings["feedback_mode"]) == ("score", "no_feedback")
+
+
+def test_session_update_is_reapplied_after_a_conflict(client, shared_state, monkeypatch):
+    session_id = client.post("/translate/sessions", json=translation_body()).json()["session_id"]
+    store = main.state_store
+    put = store.put
+    conflicts = []
+
+    def conflicting_put(namespace, key, value, expected_version=main.ANY_VERSION):
+        # Another worker writes the session between this worker's read and write, once
+        if namespace == main.TRANSLATION_SESSIONS and not conflicts:
+            conflicts.append(key)
+            shared_state.put(namespace, key, shared_state.get(namespace, key))
+        return put(namespace, key, value, expected_version)
+
+    monkeypatch.setattr(store, "put", conflicting_put)
+    response = client.post(f"/translate/sessions/{session_id}", json={"deletes": ["0"]})
+    assert response.status_code == 200 and conflicts == [session_id]
+    assert "0" not in shared_state.get(main.TRANSLATION_SESSIONS, session_id)["bootstrap"].row_ids
+
+
+def test_session_update_gives_up_after_repeated_conflicts(client, shared_state, monkeypatch):
+    session_id = client.post("/translate/sessions", json=translation_body()).json()["session_id"]
+    monkeypatch.setattr(main.state_store, "put", lambda *args, **kwargs: None)
+    response = client.post(f"/translate/sessions/{session_id}", json={"deletes": ["0"]})
+    assert response.status_code == 409
@@ -0,0 +1,68 @@
+import json
+
+import numpy as np
+
+import main
+from conftest import translation_body
+
+
+def ndjson_events(response):
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def sse_events(response):
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append({"event": lines["event"], **json.loads(lines["data"])})
+    return events
+
+
+def fit_body():
+    return {"samples": np.random.default_rng(0).normal(5, 2, 200).tolist()}
+
+
+def test_fit_stream_matches_blocking_endpoint(client):
+    events = ndjson_events(client.post("/fitDistribution/stream", json=fit_body()))
+    main.result_cache.backend.clear()
+    expected = client.post("/fitDistribution", json=fit_body()).json()["distributions"]
+
+    distributions = [event for event in events if event["event"] == "distribution"]
+    assert events[-1]["event"] == "ranking"
+    assert events[-1]["rankings"] == {"samples": [dist["name"] for dist in expected]}
+    streamed = {event["distribution"]["name"]: event["distribution"] for event in distributions}
+    assert streamed == {dist["name"]: dist for dist in expected}
+
+
+def test_translate_stream_sends_every_parameter(client):
+    events = sse_events(client.post("/translate/stream", json=translation_body(),
+                                    headers={"Accept": "text/event-stream"}))
+    expected = client.post("/translate", json=translation_body()).json()["priors_results"]
+
+    assert events[-1]["event"] == "ranking"
+    assert events[-1]["rankings"] == {name: [dist["name"] for dist in dists] for name, dists in expected.items()}
+    assert sum(event["event"] == "distribution" for event in events) == \
+        sum(len(dists) for dists in expected.values())
+
+
+def test_cached_results_are_replayed_in_the_same_format(client):
+    client.post("/fitDistribution", json=fit_body())
+    replayed = ndjson_events(client.post("/fitDistribution/stream", json=fit_body()))
+    main.result_cache.backend.clear()
+    streamed = ndjson_events(client.post("/fitDistribution/stream", json=fit_body()))
+
+    def by_name(events):
+        return {event["distribution"]["name"]: event for event in events if event["event"] == "distribution"}
+    assert by_name(replayed) == by_name(streamed)
+    assert replayed[-1] == streamed[-1]
+
+
+def test_stream_fills_the_result_cache(client, monkeypatch):
+    ndjson_events(client.post("/fitDistribution/stream", json=fit_body()))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("refitted a streamed result")
+    monkeypatch.setattr(main, "fit_many_samples_before_deadline", fail)
+    assert client.post("/fitDistribution", json=fit_body()).status_code == 200
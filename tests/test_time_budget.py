@@ -0,0 +1,97 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+import main
+from conftest import translation_body
+
+# Samples starting with this value make every pool fit hang
+OVERRUN_MARKER = 12345.0
+
+
+def normal_samples(seed=0):
+    return np.random.default_rng(seed).normal(5, 2, 200).tolist()
+
+
+def test_overrunning_fit_does_not_hold_up_the_next_request(client, monkeypatch):
+    original = main.fit_single_distribution
+
+    def fit_single_distribution(samples, fit_name, initial_params=None):
+        if samples[0] == OVERRUN_MARKER:
+            time.sleep(120)
+        return original(samples, fit_name, initial_params)
+
+    # Patched before the pool forks, so its workers see the hanging fit too
+    monkeypatch.setattr(main, "fit_single_distribution", fit_single_distribution)
+    pool = main.FitPool(2)
+    monkeypatch.setattr(main, "fit_executor", pool)
+    try:
+        pool.submit(abs, -1).result()
+        first_workers = list(pool.executor._processes.values())
+
+        overrun = client.post("/fitDistribution",
+                              json={"samples": [OVERRUN_MARKER] + normal_samples()[1:], "time_budget": 0.5})
+        assert overrun.status_code == 200
+        assert overrun.json()["partial"] is True
+
+        started = time.monotonic()
+        response = client.post("/fitDistribution", json={"samples": normal_samples(), "time_budget": 20})
+        assert response.json()["partial"] is False
+        assert time.monotonic() - started < 20
+
+        # The workers stuck on the abandoned fits were stopped
+        for process in first_workers:
+            process.join(timeout=5)
+            assert not process.is_alive()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def test_partial_results_are_not_cached(client, monkeypatch):
+    monkeypatch.setattr(main, "get_fit_deadline", lambda time_budget: time.monotonic())
+    partial = client.post("/fitDistribution", json={"samples": normal_samples(), "time_budget": 1})
+    assert partial.json()["partial"] is True
+    # The closed-form families are fitted even without a budget left
+    assert set(main.CLOSED_FORM_FITTERS) <= {dist["name"] for dist in partial.json()["distributions"]}
+
+    monkeypatch.undo()
+    full = client.post("/fitDistribution", json={"samples": normal_samples(), "time_budget": 30})
+    assert full.json()["partial"] is False
+    assert len(full.json()["distributions"]) > len(partial.json()["distributions"])
+
+
+def test_budgeted_request_is_answered_by_a_cached_full_result(client):
+    full = client.post("/fitDistribution", json={"samples": normal_samples()}).json()
+    budgeted = client.post("/fitDistribution", json={"samples": normal_samples(), "time_budget": 0.5}).json()
+    assert budgeted == full
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/fitDistribution", {"samples": normal_samples()}),
+    ("/fitDistribution/stream", {"samples": normal_samples()}),
+    ("/fitDistribution/batch", {"sample_sets": {"a": {"samples": normal_samples()}}}),
+    ("/translate", translation_body()),
+    ("/translate/stream", translation_body()),
+])
+@pytest.mark.parametrize("time_budget", [-1, 0, main.MIN_TIME_BUDGET / 2])
+def test_budgets_below_the_minimum_are_rejected(client, path, body, time_budget):
+    assert client.post(path, json={**body, "time_budget": time_budget}).status_code == 422
+
+
+def test_stream_stops_at_the_deadline(client, monkeypatch):
+    monkeypatch.setattr(main, "get_fit_deadline", lambda time_budget: time.monotonic())
+    response = client.post("/fitDistribution/stream", json={"samples": normal_samples(1), "time_budget": 1})
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+    assert events[-1]["event"] == "ranking" and events[-1]["partial"] is True
+    streamed = {event["distribution"]["name"] for event in events if event["event"] == "distribution"}
+    assert set(events[-1]["rankings"]["samples"]) == streamed
+    # The cut-short ranking is not cached
+    assert main.result_cache.get("fitDistribution", main.FitDistributionData(samples=normal_samples(1))) is None
+
+    monkeypatch.undo()
+    response = client.post("/fitDistribution/stream", json={"samples": normal_samples(1), "time_budget": 30})
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+    assert events[-1]["partial"] is False
+    assert len(events[-1]["rankings"]["samples"]) > len(streamed)